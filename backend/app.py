@@ -1,10 +1,12 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
 import os
-import base64
-import io
 from PIL import Image
 import json
+import re
+import threading
+import hashlib
+import importlib.util
 from datetime import datetime
 from dotenv import load_dotenv
 from flask import send_from_directory
@@ -13,46 +15,86 @@ from flask import send_from_directory
 # Load environment variables from .env file
 load_dotenv()
 
-from models.pose_estimation import PoseEstimator
-from models.virtual_fitting import VirtualFitting
-from models.chatbot import BatikChatbot
-from utils.image_processing import decode_base64_image, encode_image_base64
+from models.registry import ModelRegistry
+from models.groq_models import get_local_model, get_routing_stats
+from models.garment_templates import PERSON_SIZE
+from utils.image_processing import decode_base64_image, open_image_stream
+from utils.image_codec import OUTPUT_FORMATS, encode_image_cached, resolve_profile, to_data_url
+from utils.tiered_pipeline import analysis_frame, composite, upsample_mask
+from utils.pattern_catalog import PatternCatalog, parse_fields
+from utils.pattern_cache import PatternCache
+from utils.job_queue import JobQueue, QueueFullError
+from utils.ttl_cache import TTLCache
+from utils.procedural_patterns import render_pattern, cache_stats as procedural_cache_stats
 import numpy as np
 import cv2
 
 app = Flask(__name__)
 CORS(app)
 
-# Initialize models
-pose_estimator = PoseEstimator()
-virtual_fitting = VirtualFitting()
-chatbot = BatikChatbot()
+import logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
-# Conditional import for IDM-VTON
-try:
-    import logging
-    logging.basicConfig(level=logging.INFO)
-    logger = logging.getLogger(__name__)
+# IDM-VTON needs the diffusion stack; checked without importing it so startup stays fast
+IDM_VTON_AVAILABLE = all(importlib.util.find_spec(name) for name in ('torch', 'diffusers'))
+if not IDM_VTON_AVAILABLE:
+    print("IDM-VTON not available: torch/diffusers not installed")
+
+def load_pose_estimator():
+    from models.pose_estimation import PoseEstimator
+    return PoseEstimator()
+
+def load_virtual_fitting():
+    from models.virtual_fitting import VirtualFitting
+    return VirtualFitting()
+
+def load_chatbot():
+    from models.chatbot import get_chatbot
+    return get_chatbot()
+
+def load_idm_vton():
     from models.idm_vton import get_idm_vton_model
-    IDM_VTON_AVAILABLE = True
-    logger.info("✅ IDM-VTON wrapper available")
-except ImportError as e:
-    print(f"IDM-VTON not available: {e}")
-    IDM_VTON_AVAILABLE = False
-    
-    class DummyIDMVTON:
-        def create_garment_from_pattern(self, *args, **kwargs):
-            raise Exception("IDM-VTON not available")
-        def apply_garment(self, *args, **kwargs):
-            raise Exception("IDM-VTON not available")
-    
-    def get_idm_vton_model():
-        return DummyIDMVTON()
-    
+    return get_idm_vton_model()
+
+def load_local_llm():
+    local_llm = model_registry.get('chatbot').load_local_llm()
+    if local_llm is None:
+        raise RuntimeError("Local LLM could not be loaded (needs transformers and torch)")
+    return local_llm
+
+# Models are built lazily (or by the background warm-up), never at import time
+model_registry = ModelRegistry()
+model_registry.register('chatbot', load_chatbot)
+if IDM_VTON_AVAILABLE:
+    model_registry.register('idm_vton', load_idm_vton)
+model_registry.register('pose_estimator', load_pose_estimator, required=False)
+model_registry.register('virtual_fitting', load_virtual_fitting, required=False)
+if get_local_model() is not None:
+    model_registry.register('local_llm', load_local_llm, required=False)
+
+# Comma separated list of models to load in the background at startup
+model_registry.warm_up([
+    name.strip() for name in os.getenv("MODEL_WARMUP", "chatbot,idm_vton,local_llm").split(',') if name.strip()
+])
+
 # Create necessary directories
 os.makedirs('data/batik_patterns', exist_ok=True)
 os.makedirs('saved_photos', exist_ok=True)
 
+# Pattern catalog is indexed once at startup and refreshed incrementally
+pattern_catalog = PatternCatalog()
+
+# Decoded patterns shared by every try-on request
+pattern_cache = PatternCache(
+    catalog=pattern_catalog,
+    max_bytes=int(os.getenv("PATTERN_CACHE_MAX_MB", "256")) * 1024 * 1024
+)
+if os.getenv("PATTERN_CACHE_WARM", "0") == "1":
+    threading.Thread(
+        target=pattern_cache.warm, args=(pattern_catalog.ids(),), daemon=True
+    ).start()
+
 @app.route('/')
 def serve_frontend():
     return send_file('../frontend/index.html')
@@ -68,103 +110,277 @@ def serve_static(filename):
 def health_check():
     return jsonify({"status": "healthy"}), 200
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Per-model readiness; 503 until every required model is loaded"""
+    ready = model_registry.all_required_ready()
+    return jsonify({
+        "status": "ready" if ready else "loading",
+        "models": model_registry.status()
+    }), 200 if ready else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Cache and queue counters for monitoring"""
+    body = {
+        "pattern_cache": pattern_cache.stats(),
+        "procedural_patterns": procedural_cache_stats(),
+        "tryon_queue": fitting_queue.stats(),
+        "tryon_results": fitting_results.stats()
+    }
+    # Only report on the chatbot once it has been loaded
+    if model_registry.is_ready('chatbot'):
+        chatbot = model_registry.get('chatbot')
+        if chatbot.response_cache is not None:
+            body["chatbot_cache"] = chatbot.response_cache.stats()
+        body["chatbot_sessions"] = chatbot.sessions.stats()
+        if chatbot.client is not None:
+            body["groq_gateway"] = chatbot.client.stats()
+            body["groq_routing"] = get_routing_stats()
+        if chatbot.hedger is not None:
+            body["groq_hedging"] = chatbot.hedger.stats()
+    return jsonify(body), 200
+
 @app.route('/get_batik_patterns', methods=['GET'])
 def get_batik_patterns():
-    """Get list of available batik patterns from organized folders"""
-    patterns = []
-    pattern_dir = 'data/batik_patterns/organized'
+    """Get list of available batik patterns from the in-memory catalog"""
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        page = request.args.get('page', type=int)
+        per_page = request.args.get('per_page', type=int)
+        if (page is not None and page < 1) or (per_page is not None and not 1 <= per_page <= 100):
+            raise ValueError("page must be >= 1 and per_page between 1 and 100")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Catalog version plus the query string identifies the exact response body
+    etag = f"{pattern_catalog.version}-{request.query_string.decode('utf-8', 'ignore')}"
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    patterns, total = pattern_catalog.query(page=page, per_page=per_page, fields=fields)
+    body = {"patterns": patterns, "total": total}
+    if page is not None:
+        body["page"] = page
+        body["per_page"] = per_page or 20
+
+    response = jsonify(body)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response, 200
+
+class VirtualFittingError(Exception):
+    """Try-on failure carrying the JSON body and status code for the client"""
     
-    for folder in os.listdir(pattern_dir):
-        folder_path = os.path.join(pattern_dir, folder)
-        if os.path.isdir(folder_path):
-            image_path = os.path.join(folder_path, f"{folder}.jpg")
-            if os.path.exists(image_path):
-                patterns.append({
-                    'id': folder,
-                    'name': folder.replace('_', ' ').title(),
-                    'filename': f"{folder}.jpg"
-                })
+    def __init__(self, body, status_code):
+        super().__init__(body.get("error"))
+        self.body = body
+        self.status_code = status_code
+
+def run_virtual_fitting(user_image, pattern_id):
+    """Run IDM-VTON for one request; returns (result_image, method_used)"""
+    # Load batik pattern (decoded once, shared through the pattern cache)
+    pattern_array, pattern_version = pattern_cache.get_versioned(pattern_id)
+    
+    try:
+        # Use IDM-VTON only - no fallback
+        if pattern_array is not None:
+            pattern_image = Image.fromarray(pattern_array)
+        else:
+            pattern_image = Image.fromarray(render_pattern(pattern_id))
+        idm_vton = model_registry.get('idm_vton')
+        
+        # Create garment template from batik pattern
+        garment_template = idm_vton.create_garment_from_pattern(
+            pattern_image, pattern_id=pattern_id, pattern_version=pattern_version
+        )
+        
+        # Apply virtual try-on using IDM-VTON API only
+        result_image = idm_vton.apply_garment(user_image, garment_template)
+        return result_image, "IDM-VTON API"
+        
+    except Exception as vton_error:
+        error_message = str(vton_error)
+        print(f"IDM-VTON failed: {error_message}")
+        
+        # Check if it's an SSL error
+        if "SSL" in error_message or "EOF occurred in violation of protocol" in error_message:
+            raise VirtualFittingError({
+                "error": "IDM-VTON API connection failed due to network/SSL issues. Please try again later or check your internet connection.",
+                "details": error_message,
+                "suggestion": "The Hugging Face API may be temporarily unavailable. Please retry in a few minutes."
+            }, 503)
+        elif "not available" in error_message or "no token" in error_message:
+            raise VirtualFittingError({
+                "error": "IDM-VTON API not properly configured.",
+                "details": error_message,
+                "suggestion": "Please ensure HUGGING_FACE_TOKEN is set correctly in your .env file."
+            }, 500)
+        else:
+            raise VirtualFittingError({
+                "error": "IDM-VTON processing failed.",
+                "details": error_message,
+                "suggestion": "Please try again with a different image or pattern."
+            }, 500)
+
+def process_fitting_job(payload):
+    """Job queue handler for try-on requests"""
+    result_image, method_used = run_virtual_fitting(payload['user_image'], payload['pattern_id'])
+    result = {"image": result_image, "method_used": method_used}
+    fitting_results.set(payload['key'], result)
+    return result
+
+def fitting_request_key(user_image, pattern_id):
+    """
+    Identify a try-on by the decoded image bytes and pattern, the only
+    inputs of run_virtual_fitting (the pipeline is always IDM-VTON, so
+    flags like force_idm_vton do not change the result)
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{user_image.mode}:{user_image.size}".encode('utf-8'))
+    digest.update(user_image.tobytes())
+    return (digest.hexdigest(), pattern_id)
+
+def submit_fitting_job(payload):
+    """Serve from the result cache, attach to an identical in-flight job, or queue a new one"""
+    cached = fitting_results.get(payload['key'])
+    if cached is not None:
+        return fitting_queue.complete(cached)
+    return fitting_queue.submit(payload, key=payload['key'])
+
+# Finished try-ons, so retries and double taps are answered without rerunning IDM-VTON
+fitting_results = TTLCache(
+    max_entries=int(os.getenv("TRYON_RESULT_CACHE_SIZE", "32")),
+    ttl=int(os.getenv("TRYON_RESULT_TTL", "600"))
+)
+
+# Try-on runs on a bounded worker pool so slow diffusion never exhausts request threads
+fitting_queue = JobQueue(
+    process_fitting_job,
+    workers=int(os.getenv("TRYON_WORKERS", "1")),
+    max_queue=int(os.getenv("TRYON_QUEUE_SIZE", "8")),
+    name="tryon"
+)
+
+# Longest /virtual_fitting waits for its job before handing back the job id
+TRYON_WAIT_TIMEOUT = float(os.getenv("TRYON_WAIT_TIMEOUT", "120"))
+
+# Largest /chatbot/batch request accepted
+CHATBOT_BATCH_MAX = int(os.getenv("CHATBOT_BATCH_MAX", "50"))
 
-    return jsonify({"patterns": patterns}), 200
+# Chat session ids key server-side memory: short opaque tokens only (UUIDs, hex)
+SESSION_ID_PATTERN = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+def read_session_id(data):
+    """Validated session_id from a chatbot request; returns (session_id, None) or (None, error response)"""
+    session_id = data.get('session_id') or None
+    if session_id is None:
+        return None, None
+    if not isinstance(session_id, str) or not SESSION_ID_PATTERN.fullmatch(session_id):
+        return None, (jsonify({
+            'error': 'session_id must be 1-64 characters of letters, digits, "-" or "_"'
+        }), 400)
+    return session_id, None
+
+def read_fitting_request():
+    """Parse a try-on request; returns (payload, None) or (None, error response)"""
+    # Decode user image with proper validation (JSON base64, multipart or raw body)
+    try:
+        user_image, fields = read_request_image('user_image', PERSON_SIZE)
+    except Exception as img_error:
+        print(f"Image processing error: {img_error}")
+        return None, (jsonify({"error": f"Invalid image data: {str(img_error)}"}), 400)
+    
+    pattern_id = fields.get('pattern_id')
+    
+    if user_image is None or not pattern_id:
+        return None, (jsonify({"error": "Missing user_image or pattern_id"}), 400)
+    
+    try:
+        profile = request_encode_profile(fields)
+    except ValueError as e:
+        return None, (jsonify({"error": str(e)}), 400)
+    
+    # Check if IDM-VTON is available
+    if not IDM_VTON_AVAILABLE:
+        return None, (jsonify({"error": "IDM-VTON not available. Please install: pip install diffusers transformers accelerate"}), 500)
+    
+    return {
+        "user_image": user_image,
+        "pattern_id": pattern_id,
+        "profile": profile,
+        "key": fitting_request_key(user_image, pattern_id)
+    }, None
+
+def queue_full_response(error):
+    """429 with Retry-After when the try-on queue is saturated"""
+    response = jsonify({
+        "error": "Virtual fitting is busy. Please retry shortly.",
+        "retry_after": error.retry_after
+    })
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
+
+def fitting_job_body(job, profile=None):
+    """Public JSON view of a try-on job, with the result encoded for profile"""
+    body = {
+        "job_id": job['id'],
+        "status": job['status'],
+        "submitted_at": job['submitted_at'],
+        "started_at": job['started_at'],
+        "finished_at": job['finished_at'],
+    }
+    if job['status'] == 'queued':
+        body["position"] = fitting_queue.position(job['id'])
+    elif job['status'] == 'done':
+        result = job['result']
+        # Encoded once per profile and kept with the result for later polls
+        body["result_image"] = to_data_url(*encode_result(result, profile))
+        body["method_used"] = result["method_used"]
+        body["pose_detected"] = True
+    elif job['status'] == 'failed':
+        body.update(job['error'])
+    return body
 
 @app.route('/virtual_fitting', methods=['POST'])
 def apply_virtual_fitting():
     """Apply batik pattern to user image using IDM-VTON only"""
     try:
-        data = request.json
-        user_image_base64 = data.get('user_image')
-        pattern_id = data.get('pattern_id')
-        
-        if not user_image_base64 or not pattern_id:
-            return jsonify({"error": "Missing user_image or pattern_id"}), 400
-        
-        # Check if IDM-VTON is available
-        if not IDM_VTON_AVAILABLE:
-            return jsonify({"error": "IDM-VTON not available. Please install: pip install diffusers transformers accelerate"}), 500
-        
-        # Decode user image with proper validation
-        try:
-            if ',' in user_image_base64:
-                user_image_base64 = user_image_base64.split(',')[1]
-            
-            user_image = decode_base64_image(user_image_base64)
-            
-            if user_image.mode != 'RGB':
-                user_image = user_image.convert('RGB')
-                
-        except Exception as img_error:
-            print(f"Image processing error: {img_error}")
-            return jsonify({"error": f"Invalid image data: {str(img_error)}"}), 400
-        
-        # Load batik pattern
-        pattern_path = None
-        for ext in ['.jpg', '.jpeg', '.png']:
-            test_path = f'data/batik_patterns/{pattern_id}{ext}'
-            if os.path.exists(test_path):
-                pattern_path = test_path
-                break
-        
-        if not pattern_path:
-            pattern_path = create_procedural_pattern(pattern_id)
+        payload, error_response = read_fitting_request()
+        if error_response:
+            return error_response
         
+        # Runs on the worker pool; this request only waits for the result
         try:
-            # Use IDM-VTON only - no fallback
-            pattern_image = Image.open(pattern_path)
-            idm_vton = get_idm_vton_model()
-            
-            # Create garment template from batik pattern
-            garment_template = idm_vton.create_garment_from_pattern(pattern_image)
-            
-            # Apply virtual try-on using IDM-VTON API only
-            result_image = idm_vton.apply_garment(user_image, garment_template)
-            method_used = "IDM-VTON API"
-            
-        except Exception as vton_error:
-            error_message = str(vton_error)
-            print(f"IDM-VTON failed: {error_message}")
-            
-            # Check if it's an SSL error
-            if "SSL" in error_message or "EOF occurred in violation of protocol" in error_message:
-                return jsonify({
-                    "error": "IDM-VTON API connection failed due to network/SSL issues. Please try again later or check your internet connection.",
-                    "details": error_message,
-                    "suggestion": "The Hugging Face API may be temporarily unavailable. Please retry in a few minutes."
-                }), 503
-            elif "not available" in error_message or "no token" in error_message:
-                return jsonify({
-                    "error": "IDM-VTON API not properly configured.",
-                    "details": error_message,
-                    "suggestion": "Please ensure HUGGING_FACE_TOKEN is set correctly in your .env file."
-                }), 500
-            else:
-                return jsonify({
-                    "error": "IDM-VTON processing failed.",
-                    "details": error_message,
-                    "suggestion": "Please try again with a different image or pattern."
-                }), 500
+            job_id = submit_fitting_job(payload)
+        except QueueFullError as e:
+            return queue_full_response(e)
+        
+        # Bounded wait: a hung worker must not pin this request thread
+        job = fitting_queue.wait(job_id, timeout=TRYON_WAIT_TIMEOUT)
+        if job is None:
+            # Evicted from the queue's history; the client has to submit it again
+            return jsonify({
+                "error": "Try-on job expired before its result was collected. Please submit it again.",
+                "job_id": job_id
+            }), 410
+        if job['status'] not in JobQueue.FINISHED:
+            # Still queued or running; the client follows up on the job instead
+            return job_accepted_response(job_id, job['status'])
+        if job['status'] == 'failed':
+            return jsonify(job['error']), job['status_code']
+        
+        result = job['result']
+        method_used = result['method_used']
+        
+        # Binary image for clients that prefer it, base64 JSON otherwise
+        if wants_binary_image():
+            return send_binary_image(result, payload['profile'], {"X-Method-Used": method_used})
         
         # Convert to base64
-        result_base64 = encode_image_base64(result_image)
+        result_base64 = to_data_url(*encode_result(result, payload['profile']))
         
         return jsonify({
             "result_image": result_base64,
@@ -176,6 +392,141 @@ def apply_virtual_fitting():
         print(f"Virtual fitting error: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/virtual_fitting/jobs', methods=['POST'])
+def submit_virtual_fitting_job():
+    """Queue a try-on and return its job id immediately"""
+    payload, error_response = read_fitting_request()
+    if error_response:
+        return error_response
+    
+    try:
+        job_id = submit_fitting_job(payload)
+    except QueueFullError as e:
+        return queue_full_response(e)
+    
+    return job_accepted_response(job_id)
+
+def job_accepted_response(job_id, status="queued"):
+    """202 with the URLs to poll or stream a try-on job"""
+    return jsonify({
+        "job_id": job_id,
+        "status": status,
+        "status_url": f"/virtual_fitting/jobs/{job_id}",
+        "events_url": f"/virtual_fitting/jobs/{job_id}/events"
+    }), 202
+
+@app.route('/virtual_fitting/jobs/<job_id>', methods=['GET'])
+def get_virtual_fitting_job(job_id):
+    """Poll the status (and result) of a try-on job"""
+    job = fitting_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    
+    try:
+        profile = request_encode_profile()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    if job['status'] == 'done' and wants_binary_image():
+        return send_binary_image(job['result'], profile, {"X-Method-Used": job['result']['method_used']})
+    
+    return jsonify(fitting_job_body(job, profile)), 200
+
+@app.route('/virtual_fitting/jobs/<job_id>/events', methods=['GET'])
+def stream_virtual_fitting_job(job_id):
+    """Server-sent events with every status change of a try-on job"""
+    if fitting_queue.get(job_id) is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    
+    try:
+        profile = request_encode_profile()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    def events():
+        last_status = None
+        while True:
+            job = fitting_queue.wait(job_id, last_status=last_status, timeout=15)
+            if job is None:
+                yield 'event: error\ndata: {"error": "Unknown or expired job"}\n\n'
+                return
+            if job['status'] == last_status:
+                # Keep-alive comment so proxies do not drop the connection
+                yield ': keep-alive\n\n'
+                continue
+            last_status = job['status']
+            yield f"event: {last_status}\ndata: {json.dumps(fitting_job_body(job, profile))}\n\n"
+            if last_status in JobQueue.FINISHED:
+                return
+    
+    response = app.response_class(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def read_request_image(image_field, target_size=None):
+    """
+    Read the uploaded image and form fields from the current request.
+    
+    Accepts multipart/form-data (file part named image_field or 'image'),
+    a raw image/* body (fields from the query string or X-Pattern-Id header)
+    or the original JSON body with a base64 data URL. With target_size the
+    image is decoded near that working size instead of full resolution.
+    Returns (PIL image or None, fields).
+    """
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get(image_field) or request.files.get('image')
+        image = open_image_stream(upload.stream, target_size) if upload else None
+        return image, request.form
+    
+    if request.mimetype.startswith('image/'):
+        fields = request.args.to_dict()
+        if 'pattern_id' not in fields and request.headers.get('X-Pattern-Id'):
+            fields['pattern_id'] = request.headers['X-Pattern-Id']
+        image = open_image_stream(request.stream, target_size) if request.content_length != 0 else None
+        return image, fields
+    
+    data = request.get_json(silent=True) or {}
+    image_base64 = data.get(image_field)
+    image = decode_base64_image(image_base64, target_size) if image_base64 else None
+    return image, data
+
+def request_encode_profile(fields=None):
+    """
+    Output encoding for this request: the image_profile field or
+    X-Client-Profile header names a profile, and image_format,
+    image_quality and image_max_dim override parts of it.
+    Raises ValueError for unknown or malformed values.
+    """
+    fields = request.args if fields is None else fields
+    return resolve_profile(
+        fields.get('image_profile') or request.headers.get('X-Client-Profile'),
+        fields.get('image_format'),
+        fields.get('image_quality'),
+        fields.get('image_max_dim')
+    )
+
+def encode_result(result, profile):
+    """Encoded (bytes, mime) of a try-on result, cached on the result"""
+    return encode_image_cached(result.setdefault('encoded', {}), result['image'], profile)
+
+def wants_binary_image():
+    """True when the Accept header prefers an image over JSON"""
+    best = request.accept_mimetypes.best_match(['application/json', 'image/jpeg', 'image/webp'])
+    return best in ('image/jpeg', 'image/webp')
+
+def send_binary_image(result, profile, headers=None):
+    """Send a try-on result as an image response body"""
+    # Clients that cannot take the profile's format get a JPEG instead
+    if not request.accept_mimetypes[OUTPUT_FORMATS[profile.format][0]]:
+        profile = profile._replace(format='jpeg')
+    data, mime = encode_result(result, profile)
+    response = app.response_class(data, mimetype=mime)
+    response.headers['Vary'] = 'Accept, X-Client-Profile'
+    for name, value in (headers or {}).items():
+        response.headers[name] = value
+    return response, 200
+
 def apply_intelligent_batik_overlay(user_image, pattern_path, pattern_id):
     """Apply intelligent batik overlay with body detection - overlay mode (no blending)"""
     try:
@@ -186,15 +537,15 @@ def apply_intelligent_batik_overlay(user_image, pattern_path, pattern_id):
         mp_pose = mp.solutions.pose
         
         # Load pattern
-        pattern = cv2.imread(pattern_path)
-        if pattern is None:
-            pattern = create_procedural_pattern_cv(pattern_id)
+        pattern = load_pattern_bgr(pattern_path, pattern_id)
         
-        h, w = user_image.shape[:2]
+        # Masks are built on a fixed-size analysis copy; only the final one is upsampled
+        frame = analysis_frame(user_image)
+        h, w = frame.image.shape[:2]
         
         # Get person segmentation
         with mp_selfie_segmentation.SelfieSegmentation(model_selection=1) as selfie_segmentation:
-            img_rgb = cv2.cvtColor(user_image, cv2.COLOR_BGR2RGB)
+            img_rgb = cv2.cvtColor(frame.image, cv2.COLOR_BGR2RGB)
             segmentation_results = selfie_segmentation.process(img_rgb)
             person_mask = segmentation_results.segmentation_mask
         
@@ -214,14 +565,17 @@ def apply_intelligent_batik_overlay(user_image, pattern_path, pattern_id):
                 left_hip = (int(landmarks[23].x * w), int(landmarks[23].y * h))
                 right_hip = (int(landmarks[24].x * w), int(landmarks[24].y * h))
                 
+                # Offsets were tuned on 640px webcam frames; rescale to this frame
+                px = frame.px
+                
                 # Create clothing area polygon (shirt area)
                 shirt_points = np.array([
-                    [left_shoulder[0] - 30, left_shoulder[1] - 20],  # Left shoulder extended
-                    [right_shoulder[0] + 30, right_shoulder[1] - 20],  # Right shoulder extended
-                    [right_shoulder[0] + 40, right_shoulder[1] + 80],  # Right side extended
-                    [right_hip[0] + 20, right_hip[1]],  # Right hip
-                    [left_hip[0] - 20, left_hip[1]],   # Left hip
-                    [left_shoulder[0] - 40, left_shoulder[1] + 80]   # Left side extended
+                    [left_shoulder[0] - px(30), left_shoulder[1] - px(20)],  # Left shoulder extended
+                    [right_shoulder[0] + px(30), right_shoulder[1] - px(20)],  # Right shoulder extended
+                    [right_shoulder[0] + px(40), right_shoulder[1] + px(80)],  # Right side extended
+                    [right_hip[0] + px(20), right_hip[1]],  # Right hip
+                    [left_hip[0] - px(20), left_hip[1]],   # Left hip
+                    [left_shoulder[0] - px(40), left_shoulder[1] + px(80)]   # Left side extended
                 ], dtype=np.int32)
                 
                 # Create clothing mask
@@ -229,17 +583,17 @@ def apply_intelligent_batik_overlay(user_image, pattern_path, pattern_id):
                 
                 # Add sleeves
                 sleeve_left = np.array([
-                    [left_shoulder[0] - 80, left_shoulder[1] - 10],
-                    [left_shoulder[0] - 30, left_shoulder[1] - 20],
-                    [left_shoulder[0] - 40, left_shoulder[1] + 80],
-                    [left_shoulder[0] - 120, left_shoulder[1] + 60]
+                    [left_shoulder[0] - px(80), left_shoulder[1] - px(10)],
+                    [left_shoulder[0] - px(30), left_shoulder[1] - px(20)],
+                    [left_shoulder[0] - px(40), left_shoulder[1] + px(80)],
+                    [left_shoulder[0] - px(120), left_shoulder[1] + px(60)]
                 ], dtype=np.int32)
                 
                 sleeve_right = np.array([
-                    [right_shoulder[0] + 30, right_shoulder[1] - 20],
-                    [right_shoulder[0] + 80, right_shoulder[1] - 10],
-                    [right_shoulder[0] + 120, right_shoulder[1] + 60],
-                    [right_shoulder[0] + 40, right_shoulder[1] + 80]
+                    [right_shoulder[0] + px(30), right_shoulder[1] - px(20)],
+                    [right_shoulder[0] + px(80), right_shoulder[1] - px(10)],
+                    [right_shoulder[0] + px(120), right_shoulder[1] + px(60)],
+                    [right_shoulder[0] + px(40), right_shoulder[1] + px(80)]
                 ], dtype=np.int32)
                 
                 cv2.fillPoly(clothing_mask, [sleeve_left], 1.0)
@@ -265,7 +619,12 @@ def apply_intelligent_batik_overlay(user_image, pattern_path, pattern_id):
         final_mask = clothing_mask * person_mask_binary
         
         # Smooth the mask edges for better blending at boundaries only
-        final_mask = cv2.GaussianBlur(final_mask, (5, 5), 1)
+        blur = frame.ksize(5)
+        final_mask = cv2.GaussianBlur(final_mask, (blur, blur), 0)
+        
+        # Edge-aware upsampling to the output resolution
+        final_mask = upsample_mask(final_mask, user_image, bgr=True)
+        h, w = user_image.shape[:2]
         
         # Prepare pattern - create seamless tiled pattern
         pattern_tile_size = min(w, h) // 6  # Smaller tiles for more detailed pattern
@@ -278,31 +637,17 @@ def apply_intelligent_batik_overlay(user_image, pattern_path, pattern_id):
         else:
             pattern_resized = cv2.resize(pattern, (w, h))
         
-        # Create result image - DIRECT OVERLAY (no blending with original clothing)
-        result = user_image.copy().astype(np.float32)
-        pattern_f = pattern_resized.astype(np.float32)
-        
-        # Create 3D mask
-        final_mask_3d = np.stack([final_mask, final_mask, final_mask], axis=2)
-        
-        # Apply pattern directly where mask is active (complete replacement)
+        # DIRECT OVERLAY (no blending with original clothing)
         # Only blend at the very edges of the mask for smooth transitions
         mask_threshold = 0.8  # High threshold for direct replacement
-        
-        # Areas with high mask value get full pattern replacement
-        strong_mask = (final_mask_3d > mask_threshold).astype(np.float32)
-        weak_mask = ((final_mask_3d > 0.1) & (final_mask_3d <= mask_threshold)).astype(np.float32)
-        
-        # Direct replacement for strong mask areas
-        result = result * (1 - strong_mask) + pattern_f * strong_mask
-        
-        # Gentle blending only at edges for smooth transition
         blend_factor = 0.7
-        result = result * (1 - weak_mask * blend_factor) + pattern_f * weak_mask * blend_factor
         
-        result = np.clip(result, 0, 255).astype(np.uint8)
+        # Full pattern replacement where the mask is strong, gentle blend at the edges
+        alpha = np.zeros_like(final_mask)
+        alpha[final_mask > 0.1] = blend_factor
+        alpha[final_mask > mask_threshold] = 1.0
         
-        return result
+        return composite(user_image, pattern_resized, alpha)
         
     except Exception as e:
         print(f"Intelligent overlay error: {e}")
@@ -313,9 +658,7 @@ def apply_simple_batik_overlay(user_image, pattern_path, pattern_id):
     """Apply simple batik overlay - direct replacement mode"""
     try:
         # Load pattern
-        pattern = cv2.imread(pattern_path)
-        if pattern is None:
-            pattern = create_procedural_pattern_cv(pattern_id)
+        pattern = load_pattern_bgr(pattern_path, pattern_id)
         
         # Resize pattern to match user image
         h, w = user_image.shape[:2]
@@ -387,97 +730,29 @@ def apply_simple_batik_overlay(user_image, pattern_path, pattern_id):
         print(f"Simple overlay error: {e}")
         return user_image
 
-def create_procedural_pattern_cv(pattern_id):
-    """Create a procedural batik pattern using OpenCV"""
-    width, height = 512, 512
-    pattern = np.zeros((height, width, 3), dtype=np.uint8)
-    
-    # Generate different patterns based on pattern_id
-    if 'kawung' in pattern_id:
-        # Create circular pattern
-        for y in range(0, height, 100):
-            for x in range(0, width, 100):
-                cv2.circle(pattern, (x + 50, y + 50), 40, (139, 69, 19), -1)
-                cv2.circle(pattern, (x + 50, y + 50), 30, (205, 133, 63), -1)
-    elif 'ceplok' in pattern_id:
-        # Create square pattern
-        for y in range(0, height, 80):
-            for x in range(0, width, 80):
-                cv2.rectangle(pattern, (x + 10, y + 10), (x + 70, y + 70), (160, 82, 45), -1)
-                cv2.rectangle(pattern, (x + 20, y + 20), (x + 60, y + 60), (210, 105, 30), -1)
-    elif 'sekar' in pattern_id:
-        # Create flower-like pattern
-        for y in range(0, height, 120):
-            for x in range(0, width, 120):
-                # Draw petals
-                for angle in range(0, 360, 45):
-                    end_x = int(x + 60 + 40 * np.cos(np.radians(angle)))
-                    end_y = int(y + 60 + 40 * np.sin(np.radians(angle)))
-                    cv2.ellipse(pattern, ((x + 60 + end_x) // 2, (y + 60 + end_y) // 2), 
-                               (20, 10), angle, 0, 360, (184, 134, 11), -1)
-                cv2.circle(pattern, (x + 60, y + 60), 15, (255, 215, 0), -1)
-    else:
-        # Default geometric pattern
-        for y in range(0, height, 60):
-            for x in range(0, width, 60):
-                if (x // 60 + y // 60) % 2 == 0:
-                    cv2.rectangle(pattern, (x, y), (x + 60, y + 60), (139, 90, 43), -1)
-                else:
-                    cv2.circle(pattern, (x + 30, y + 30), 25, (184, 134, 11), -1)
+def load_pattern_bgr(pattern_path, pattern_id):
+    """Load a pattern as a BGR array, preferring the shared pattern cache"""
+    pattern = pattern_cache.get(pattern_id)
+    if pattern is not None:
+        return cv2.cvtColor(pattern, cv2.COLOR_RGB2BGR)
     
+    pattern = cv2.imread(pattern_path) if pattern_path else None
+    if pattern is None:
+        pattern = cv2.cvtColor(render_pattern(pattern_id), cv2.COLOR_RGB2BGR)
     return pattern
 
-def decode_base64_image(base64_string):
-    """Decode base64 string to PIL Image with validation"""
-    try:
-        # Remove data URL prefix if present
-        if 'data:image' in base64_string and ',' in base64_string:
-            base64_string = base64_string.split(',')[1]
-        
-        # Decode base64
-        image_data = base64.b64decode(base64_string)
-        
-        if len(image_data) == 0:
-            raise ValueError("Empty image data")
-        
-        # Create PIL Image
-        image = Image.open(io.BytesIO(image_data))
-        
-        # Validate image
-        if image.size[0] == 0 or image.size[1] == 0:
-            raise ValueError("Invalid image dimensions")
-        
-        # Convert to RGB if necessary
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-            
-        return image
-        
-    except Exception as e:
-        raise ValueError(f"Error decoding base64 image: {e}")
-
-def encode_image_base64(image):
-    """Encode PIL Image to base64 string"""
-    import base64
-    from io import BytesIO
-    buffer = BytesIO()
-    image.save(buffer, format='JPEG')
-    img_str = base64.b64encode(buffer.getvalue()).decode()
-    return f"data:image/jpeg;base64,{img_str}"
-
 @app.route('/save_photo', methods=['POST'])
 def save_photo():
     """Save the virtual fitting result"""
     try:
-        data = request.json
-        image_base64 = data.get('image')
-        pattern_id = data.get('pattern_id')
+        # Accepts JSON base64, multipart or a raw image body
+        image, fields = read_request_image('image')
+        pattern_id = fields.get('pattern_id')
         
-        if not image_base64:
+        if image is None:
             return jsonify({"error": "Missing image data"}), 400
         
-        # Decode and save image
-        image = decode_base64_image(image_base64)
+        # Save decoded image
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f'batik_{pattern_id}_{timestamp}.jpg'
         filepath = os.path.join('saved_photos', filename)
@@ -496,10 +771,8 @@ def save_photo():
 def test_api():
     """Test API endpoints and connections"""
     try:
-        from models.chatbot import BatikChatbot
-        
-        # Test chatbot initialization
-        chatbot = BatikChatbot()
+        # Shared chatbot instance (built once per worker)
+        chatbot = model_registry.get('chatbot')
         
         # Test simple query
         test_response = chatbot.get_response("Apa itu Batik Nitik?")
@@ -523,44 +796,94 @@ def chatbot():
         data = request.get_json()
         query = data.get('query', '')
         pattern_id = data.get('pattern_id', None)
+        session_id, error_response = read_session_id(data)
+        if error_response:
+            return error_response
         
         if not query:
             return jsonify({'error': 'Query is required'}), 400
         
-        from models.chatbot import BatikChatbot
-        chatbot = BatikChatbot()
+        chatbot = model_registry.get('chatbot')
         
-        response = chatbot.get_response(query, pattern_id)
+        response, source = chatbot.answer(query, pattern_id, session_id)
         
-        return jsonify({
+        body = {
             'response': response,
             'pattern_id': pattern_id,
-            'api_used': 'groq' if chatbot.client else 'fallback'
-        })
+            'api_used': source
+        }
+        if session_id:
+            body['session_id'] = session_id
+        return jsonify(body)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/chatbot', methods=['POST'])
-def chatbot_endpoint():
-    """Handle chatbot queries about batik"""
+@app.route('/chatbot/batch', methods=['POST'])
+def chatbot_batch():
+    """Answer many (query, pattern_id) items in one round trip, in input order"""
     try:
-        data = request.json
-        query = data.get('query')
-        pattern_id = data.get('pattern_id', None)
+        data = request.get_json(silent=True) or {}
+        items = data.get('items')
         
-        if not query:
-            return jsonify({"error": "Missing query"}), 400
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'items must be a non-empty list'}), 400
+        if len(items) > CHATBOT_BATCH_MAX:
+            return jsonify({'error': f'At most {CHATBOT_BATCH_MAX} items per batch'}), 413
         
-        response = chatbot.get_response(query, pattern_id)
+        parsed = []
+        for item in items:
+            item = item if isinstance(item, dict) else {}
+            parsed.append((str(item.get('query') or ''), item.get('pattern_id') or None))
         
-        return jsonify({
-            "response": response,
-            "pattern_id": pattern_id
-        }), 200
+        chatbot = model_registry.get('chatbot')
+        
+        answerable = [item for item in parsed if item[0]]
+        answers = iter(chatbot.answer_batch(answerable))
+        results = []
+        for query, pattern_id in parsed:
+            if not query:
+                results.append({'error': 'Query is required', 'pattern_id': pattern_id})
+                continue
+            response, source = next(answers)
+            results.append({'response': response, 'pattern_id': pattern_id, 'api_used': source})
+        
+        return jsonify({'results': results, 'count': len(results)})
         
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/chatbot/stream', methods=['GET', 'POST'])
+def chatbot_stream():
+    """Stream the chatbot answer token by token as server-sent events"""
+    data = (request.get_json(silent=True) or {}) if request.method == 'POST' else request.args
+    query = data.get('query', '')
+    pattern_id = data.get('pattern_id', None)
+    session_id, error_response = read_session_id(data)
+    if error_response:
+        return error_response
+    
+    if not query:
+        return jsonify({'error': 'Query is required'}), 400
+    
+    chatbot = model_registry.get('chatbot')
+    
+    def events():
+        try:
+            for kind, value in chatbot.stream_answer(query, pattern_id, session_id):
+                if kind == 'token':
+                    yield f"data: {json.dumps({'token': value})}\n\n"
+                elif kind == 'reset':
+                    yield "event: reset\ndata: {}\n\n"
+                else:
+                    yield f"event: done\ndata: {json.dumps({'pattern_id': pattern_id, 'api_used': value})}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+    
+    response = app.response_class(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @app.route('/get_saved_photos', methods=['GET'])
 def get_saved_photos():
@@ -591,49 +914,5 @@ def serve_pattern_image(folder, filename):
     return send_from_directory(f"data/batik_patterns/organized/{folder}", filename)
 
 
-def create_procedural_pattern(pattern_id):
-    """Create a procedural batik pattern if file doesn't exist"""
-    # Create a simple procedural pattern based on pattern_id
-    width, height = 512, 512
-    pattern = np.zeros((height, width, 3), dtype=np.uint8)
-    
-    # Generate different patterns based on pattern_id
-    if 'kawung' in pattern_id:
-        # Create circular pattern
-        for y in range(0, height, 100):
-            for x in range(0, width, 100):
-                cv2.circle(pattern, (x + 50, y + 50), 40, (139, 69, 19), -1)
-                cv2.circle(pattern, (x + 50, y + 50), 30, (205, 133, 63), -1)
-    elif 'ceplok' in pattern_id:
-        # Create square pattern
-        for y in range(0, height, 80):
-            for x in range(0, width, 80):
-                cv2.rectangle(pattern, (x + 10, y + 10), (x + 70, y + 70), (160, 82, 45), -1)
-                cv2.rectangle(pattern, (x + 20, y + 20), (x + 60, y + 60), (210, 105, 30), -1)
-    elif 'sekar' in pattern_id:
-        # Create flower-like pattern
-        for y in range(0, height, 120):
-            for x in range(0, width, 120):
-                # Draw petals
-                for angle in range(0, 360, 45):
-                    end_x = int(x + 60 + 40 * np.cos(np.radians(angle)))
-                    end_y = int(y + 60 + 40 * np.sin(np.radians(angle)))
-                    cv2.ellipse(pattern, ((x + 60 + end_x) // 2, (y + 60 + end_y) // 2), 
-                               (20, 10), angle, 0, 360, (184, 134, 11), -1)
-                cv2.circle(pattern, (x + 60, y + 60), 15, (255, 215, 0), -1)
-    else:
-        # Default geometric pattern
-        for y in range(0, height, 60):
-            for x in range(0, width, 60):
-                if (x // 60 + y // 60) % 2 == 0:
-                    cv2.rectangle(pattern, (x, y), (x + 60, y + 60), (139, 90, 43), -1)
-                else:
-                    cv2.circle(pattern, (x + 30, y + 30), 25, (184, 134, 11), -1)
-    
-    # Save the pattern temporarily
-    temp_path = f'data/batik_patterns/temp_{pattern_id}.jpg'
-    cv2.imwrite(temp_path, pattern)
-    return temp_path
-
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
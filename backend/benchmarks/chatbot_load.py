@@ -0,0 +1,182 @@
+"""
+Load benchmark for /chatbot against the local fake Groq server.
+
+Runs the Flask app in-process on a real HTTP port, points the Groq client
+at benchmarks.fake_groq and drives /chatbot at increasing concurrency.
+Prints (or writes) a JSON report with p50/p95/p99 latency, throughput and
+the share of answers that came from each source, fallback included.
+
+    cd backend
+    python -m benchmarks.chatbot_load --concurrency 1,4,16 --requests 100 --latency 0.4 --rpm 120
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from benchmarks.fake_groq import FakeGroqConfig, start_fake_groq
+
+# Questions the curated Q/A pairs answer locally, and ones that need Groq
+LOCAL_TEMPLATES = [
+    "Apa makna motif {name}?",
+    "Apa itu motif {name}?",
+    "Bagaimana bentuk visual motif {name}?",
+]
+GROQ_TEMPLATES = [
+    "Bagaimana cara merawat kain batik motif {name}?",
+    "Apakah motif {name} cocok dipakai untuk acara pernikahan?",
+    "Warna apa yang cocok dipadukan dengan motif {name}?",
+]
+
+
+def build_queries(metadata, groq_share, count, seed=0):
+    """Random mix of local and Groq-bound questions about known motifs"""
+    rng = random.Random(seed)
+    names = [info['name'] for info in metadata.values()]
+    queries = []
+    for _ in range(count):
+        templates = GROQ_TEMPLATES if rng.random() < groq_share else LOCAL_TEMPLATES
+        queries.append(rng.choice(templates).format(name=rng.choice(names)))
+    return queries
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_level(url, queries, concurrency, timeout):
+    """Send every query to /chatbot with `concurrency` parallel clients"""
+    local = threading.local()
+
+    def send(query):
+        if not hasattr(local, 'client'):
+            local.client = httpx.Client(timeout=timeout)
+        started = time.perf_counter()
+        try:
+            response = local.client.post(f"{url}/chatbot", json={'query': query})
+            elapsed = time.perf_counter() - started
+            source = response.json().get('api_used') if response.status_code == 200 else None
+            return elapsed, response.status_code, source
+        except httpx.HTTPError:
+            return time.perf_counter() - started, None, None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(send, queries))
+    wall_time = time.perf_counter() - started
+
+    latencies = [elapsed for elapsed, status, _ in results if status == 200]
+    sources = Counter(source for _, status, source in results if status == 200)
+    errors = sum(1 for _, status, _ in results if status != 200)
+    answered = len(latencies)
+    return {
+        'concurrency': concurrency,
+        'requests': len(results),
+        'errors': errors,
+        'wall_time_s': round(wall_time, 3),
+        'throughput_rps': round(answered / wall_time, 2) if wall_time else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50) * 1000, 1),
+            'p95': round(percentile(latencies, 95) * 1000, 1),
+            'p99': round(percentile(latencies, 99) * 1000, 1),
+            'max': round(max(latencies) * 1000, 1) if latencies else 0.0,
+        },
+        'fallback_rate': round(sources['fallback'] / answered, 4) if answered else 0.0,
+        'sources': dict(sources),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /chatbot against a fake Groq API")
+    parser.add_argument('--concurrency', default='1,4,8,16', help="comma-separated concurrency levels")
+    parser.add_argument('--requests', type=int, default=100, help="requests per concurrency level")
+    parser.add_argument('--groq-share', type=float, default=0.5, help="share of questions that need Groq")
+    parser.add_argument('--latency', type=float, default=0.3)
+    parser.add_argument('--jitter', type=float, default=0.1)
+    parser.add_argument('--stall-rate', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--rpm', type=int, default=0, help="fake server requests per minute, 0 = unlimited")
+    parser.add_argument('--model-limits', default=None,
+                        help="override every model's RPM,TPM in AVAILABLE_MODELS, e.g. 600,600000")
+    parser.add_argument('--no-cache', action='store_true', help="disable the chatbot response cache")
+    parser.add_argument('--no-local', action='store_true', help="disable local Q/A answers")
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--output', default=None, help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    fake = start_fake_groq(config=FakeGroqConfig(
+        latency=args.latency, jitter=args.jitter, stall_rate=args.stall_rate,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, rpm=args.rpm
+    ))
+
+    # The app reads its configuration at import time
+    os.environ.update({
+        'GROQ_API_KEY': 'fake-benchmark-key',
+        'GROQ_BASE_URL': fake.base_url,
+        'MODEL_WARMUP': '',
+        'CHATBOT_RESPONSE_CACHE': '0' if args.no_cache else '1',
+        'CHATBOT_LOCAL_QA': '0' if args.no_local else '1',
+    })
+    import app as backend_app
+    from models import groq_models
+    from models.chatbot import load_batik_metadata
+
+    if args.model_limits:
+        requests_per_minute, tokens_per_minute = (int(v) for v in args.model_limits.split(','))
+        for config in groq_models.AVAILABLE_MODELS.values():
+            config['requests_per_minute'] = requests_per_minute
+            config['tokens_per_minute'] = tokens_per_minute
+
+    # Build the chatbot before timing anything
+    chatbot = backend_app.model_registry.get('chatbot')
+
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, backend_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="benchmark-app", daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+
+    metadata = load_batik_metadata()
+    levels = [int(level) for level in args.concurrency.split(',') if level.strip()]
+    report = {
+        'config': {k: v for k, v in vars(args).items() if k != 'output'},
+        'levels': [],
+    }
+    for index, concurrency in enumerate(levels):
+        queries = build_queries(metadata, args.groq_share, args.requests, seed=index)
+        result = run_level(url, queries, concurrency, args.timeout)
+        report['levels'].append(result)
+        print(f"📊 c={concurrency}: {result['throughput_rps']} req/s, "
+              f"p95 {result['latency_ms']['p95']} ms, fallback {result['fallback_rate']:.1%}",
+              file=sys.stderr)
+
+    report['fake_groq'] = fake.stats()
+    if chatbot.client is not None:
+        report['groq_gateway'] = chatbot.client.stats()
+        report['groq_routing'] = groq_models.get_routing_stats()
+
+    server.shutdown()
+    fake.shutdown()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(f"✅ Report written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Local stand-in for the Groq chat completions API.
+
+Speaks the OpenAI-compatible wire format the `groq` client uses (JSON and
+server-sent event streams) with configurable latency, server errors and
+429 rate limiting, so the chatbot can be load tested without Groq quota.
+
+    python -m benchmarks.fake_groq --port 8808 --latency 0.4 --error-rate 0.02 --rpm 120
+"""
+
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeGroqConfig:
+    """Behaviour of the fake server; attributes may be changed while it runs"""
+
+    def __init__(self, latency=0.3, jitter=0.1, stall_rate=0.0, stall_latency=3.0,
+                 error_rate=0.0, rate_limit_rate=0.0, rpm=0, retry_after=1.0, tokens_per_second=200):
+        self.latency = latency                  # seconds before the first byte
+        self.jitter = jitter                    # +/- uniform jitter on latency
+        self.stall_rate = stall_rate            # share of requests that stall
+        self.stall_latency = stall_latency
+        self.error_rate = error_rate            # share of requests answered with a 500
+        self.rate_limit_rate = rate_limit_rate  # share of requests answered with a 429
+        self.rpm = rpm                          # sliding-window requests per minute, 0 = unlimited
+        self.retry_after = retry_after          # Retry-After seconds sent with 429s
+        self.tokens_per_second = tokens_per_second  # streaming speed
+
+
+class FakeGroqServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config):
+        super().__init__(address, _Handler)
+        self.config = config
+        self.lock = threading.Lock()
+        self.window = deque()
+        self.ids = itertools.count(1)
+        self.counters = {'requests': 0, 'completions': 0, 'streams': 0, 'errors': 0, 'rate_limited': 0}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def over_rate_limit(self):
+        """Sliding one-minute window check for the configured rpm"""
+        if not self.config.rpm:
+            return False
+        now = time.monotonic()
+        with self.lock:
+            while self.window and now - self.window[0] > 60:
+                self.window.popleft()
+            if len(self.window) >= self.config.rpm:
+                return True
+            self.window.append(now)
+            return False
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        config = server.config
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        server.count('requests')
+
+        if not self.path.endswith('/chat/completions'):
+            return self._send_json(404, {'error': {'message': f'Unknown path {self.path}', 'type': 'not_found'}})
+
+        if server.over_rate_limit() or random.random() < config.rate_limit_rate:
+            server.count('rate_limited')
+            return self._send_json(429, {'error': {
+                'message': 'Rate limit reached', 'type': 'tokens', 'code': 'rate_limit_exceeded'
+            }}, {'retry-after': str(config.retry_after)})
+
+        delay = config.stall_latency if random.random() < config.stall_rate else config.latency
+        time.sleep(max(0.0, delay + random.uniform(-config.jitter, config.jitter)))
+
+        if random.random() < config.error_rate:
+            server.count('errors')
+            return self._send_json(500, {'error': {'message': 'Internal server error', 'type': 'internal_server_error'}})
+
+        model = body.get('model', 'fake-model')
+        text = _answer_text(body)
+        completion_id = f"chatcmpl-fake-{next(server.ids)}"
+
+        if body.get('stream'):
+            server.count('streams')
+            return self._send_stream(completion_id, model, text, config.tokens_per_second)
+
+        server.count('completions')
+        self._send_json(200, {
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': text},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': sum(len(m.get('content', '')) // 4 for m in body.get('messages', [])),
+                'completion_tokens': len(text) // 4,
+                'total_tokens': 0,
+            },
+        })
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, completion_id, model, text, tokens_per_second):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        words = text.split(' ')
+        for index, word in enumerate(words):
+            chunk = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'delta': {'content': word if index == 0 else ' ' + word},
+                    'finish_reason': None,
+                }],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+            if tokens_per_second:
+                time.sleep(1.0 / tokens_per_second)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def _answer_text(body):
+    question = next((m.get('content', '') for m in reversed(body.get('messages', []))
+                     if m.get('role') == 'user'), '')
+    return f"Jawaban uji untuk pertanyaan: {question[:120]}"
+
+
+def start_fake_groq(host='127.0.0.1', port=0, config=None):
+    """Start the fake server on a background thread and return it"""
+    server = FakeGroqServer((host, port), config or FakeGroqConfig())
+    threading.Thread(target=server.serve_forever, name="fake-groq", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local fake Groq API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8808)
+    parser.add_argument('--latency', type=float, default=0.3)
+    parser.add_argument('--jitter', type=float, default=0.1)
+    parser.add_argument('--stall-rate', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--rpm', type=int, default=0)
+    parser.add_argument('--retry-after', type=float, default=1.0)
+    args = parser.parse_args()
+
+    server = FakeGroqServer((args.host, args.port), FakeGroqConfig(
+        latency=args.latency, jitter=args.jitter, stall_rate=args.stall_rate,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+        rpm=args.rpm, retry_after=args.retry_after
+    ))
+    print(f"🧪 Fake Groq API on {server.base_url} (set GROQ_BASE_URL to this)")
+    server.serve_forever()
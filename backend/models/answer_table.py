@@ -0,0 +1,179 @@
+"""
+Pre-generated answers for every motif × intent combination.
+
+The table is built offline (python -m models.answer_table) through the
+chatbot's rate-limited Groq gateway and stored in data/batik_answers.json.
+Every entry records a hash of the motif metadata and the question it
+answers; a rebuild only regenerates entries whose hash changed, and at
+runtime stale entries are ignored.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+# Bump when the question wording or entry format changes
+TABLE_VERSION = 1
+ANSWER_TABLE_PATH = 'data/batik_answers.json'
+
+# Intent -> canonical question used to generate the answer
+INTENT_QUESTIONS = {
+    'definition': "Apa itu motif {name}?",
+    'meaning': "Apa makna filosofis motif {name}?",
+    'visual': "Bagaimana bentuk visual motif {name}?",
+    'history': "Bagaimana sejarah dan asal usul motif {name}?",
+}
+
+
+def entry_hash(motif_id, info, intent):
+    """Hash of everything an entry's answer depends on"""
+    payload = json.dumps({
+        'version': TABLE_VERSION,
+        'motif_id': motif_id,
+        'metadata': dict(info),
+        'question': INTENT_QUESTIONS[intent],
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+class AnswerTable:
+    """Runtime lookup of pre-generated answers by (motif id, intent)"""
+
+    def __init__(self, entries):
+        self._answers = entries     # (motif_id, intent) -> answer
+
+    @classmethod
+    def load(cls, batik_data, path=ANSWER_TABLE_PATH):
+        """Load the table, keeping only entries that match the current metadata"""
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            table = json.load(f)
+        if table.get('version') != TABLE_VERSION:
+            print(f"⚠ Ignoring answer table {path}: version {table.get('version')} != {TABLE_VERSION}")
+            return None
+
+        entries = {}
+        stale = 0
+        for motif_id, intents in table.get('entries', {}).items():
+            info = batik_data.get(motif_id)
+            for intent, entry in intents.items():
+                if info is None or intent not in INTENT_QUESTIONS or \
+                        entry.get('hash') != entry_hash(motif_id, info, intent):
+                    stale += 1
+                    continue
+                entries[(motif_id, intent)] = entry['answer']
+        if stale:
+            print(f"⚠ {stale} answer table entries are stale; rebuild with python -m models.answer_table")
+        return cls(entries)
+
+    def __len__(self):
+        return len(self._answers)
+
+    def lookup(self, match, pattern_id=None):
+        """
+        Answer for a MotifMatch with exactly one table intent and one motif
+        (named exactly in the query, or the selected pattern), otherwise None
+        """
+        if match.fuzzy:
+            return None
+        intents = [intent for intent in match.intents if intent in INTENT_QUESTIONS]
+        if len(intents) != 1:
+            return None
+        if len(match.motif_ids) > 1:
+            return None
+        motif_id = match.motif_ids[0] if match.motif_ids else pattern_id
+        return self._answers.get((motif_id, intents[0]))
+
+
+def build_answer_table(chatbot, path=ANSWER_TABLE_PATH, force=False, limit=None):
+    """
+    Generate missing and stale entries through Groq and write the table.
+    Without Groq, entries the metadata can answer directly are filled from
+    the chatbot's templates. Returns (generated, kept) entry counts.
+    """
+    from .groq_models import choose_model
+
+    existing = {}
+    if os.path.exists(path) and not force:
+        with open(path, 'r', encoding='utf-8') as f:
+            table = json.load(f)
+        if table.get('version') == TABLE_VERSION:
+            existing = table.get('entries', {})
+
+    entries = {}
+    todo = []
+    for motif_id, info in chatbot.batik_data.items():
+        for intent, question in INTENT_QUESTIONS.items():
+            digest = entry_hash(motif_id, info, intent)
+            entry = existing.get(motif_id, {}).get(intent)
+            if entry is not None and entry.get('hash') == digest:
+                entries.setdefault(motif_id, {})[intent] = entry
+            else:
+                todo.append((motif_id, intent, question.format(name=info['name']), digest))
+    kept = sum(len(intents) for intents in entries.values())
+    if limit is not None:
+        todo = todo[:limit]
+
+    # Submit everything; the gateway's buckets pace the calls to the model limits
+    futures = []
+    for motif_id, intent, question, digest in todo:
+        model = choose_model() if chatbot.client else None
+        future = None
+        if model:
+            future = chatbot.client.submit(
+                model, chatbot._build_messages(question, motif_id, model),
+                temperature=0.3, max_tokens=chatbot._completion_tokens(model)
+            )
+        futures.append((motif_id, intent, question, digest, model, future))
+
+    generated = 0
+    for motif_id, intent, question, digest, model, future in futures:
+        answer, source = None, None
+        if future is not None:
+            try:
+                answer, source = future.result(), model
+            except Exception as e:
+                print(f"  ✗ {motif_id}/{intent}: {e}")
+        if not answer and intent != 'history':
+            # Metadata-only answer; there is no history data to template from
+            answer, source = chatbot._get_fallback_response(question, motif_id), 'template'
+        if not answer:
+            continue
+        entries.setdefault(motif_id, {})[intent] = {
+            'answer': answer,
+            'hash': digest,
+            'source': source,
+        }
+        generated += 1
+        print(f"  Generated {motif_id}/{intent} ({source})")
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': TABLE_VERSION,
+            'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'intents': sorted(INTENT_QUESTIONS),
+            'entries': entries,
+        }, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+    return generated, kept
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-generate chatbot answers for every motif and intent")
+    parser.add_argument('--output', default=ANSWER_TABLE_PATH)
+    parser.add_argument('--force', action='store_true', help="regenerate entries that are still current")
+    parser.add_argument('--limit', type=int, default=None, help="generate at most this many entries")
+    args = parser.parse_args()
+
+    # The table is generated from scratch, not looked up
+    os.environ['CHATBOT_ANSWER_TABLE'] = ''
+    from .chatbot import BatikChatbot
+
+    print("📚 Building batik answer table")
+    print("=" * 40)
+    generated, kept = build_answer_table(BatikChatbot(), args.output, force=args.force, limit=args.limit)
+    print(f"✅ {generated} entries generated, {kept} unchanged, written to {args.output}")
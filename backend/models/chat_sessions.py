@@ -0,0 +1,102 @@
+import re
+import threading
+from collections import deque
+
+from utils.text_index import estimate_tokens
+from utils.ttl_cache import TTLCache
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def first_sentence(text, max_chars=160):
+    """Leading sentence of text, shortened to max_chars"""
+    sentence = _SENTENCE_END.split(text.strip(), maxsplit=1)[0]
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars - 1].rstrip() + "…"
+
+
+def truncate_tokens(text, max_tokens):
+    """text cut to about max_tokens (see estimate_tokens)"""
+    max_chars = max_tokens * 4
+    return text if len(text) <= max_chars else text[:max_chars - 1].rstrip() + "…"
+
+
+class ChatSession:
+    """
+    One conversation: the last `max_turns` exchanges, each side capped at
+    `turn_tokens`, plus an extractive summary of older ones capped at
+    `summary_tokens`.
+    """
+
+    def __init__(self, max_turns=6, summary_tokens=200, turn_tokens=200):
+        self.summary_tokens = summary_tokens
+        self.turn_tokens = turn_tokens
+        self.turns = deque(maxlen=max_turns)    # (question, answer)
+        self.summary = deque()                  # one line per folded-in turn
+        self.last_motif = None
+        self.lock = threading.Lock()
+
+    def record(self, question, answer, motif_id=None):
+        # Client payloads must not grow the session beyond its token budget
+        question = truncate_tokens(question, self.turn_tokens)
+        answer = truncate_tokens(answer, self.turn_tokens)
+        with self.lock:
+            if len(self.turns) == self.turns.maxlen:
+                old_question, old_answer = self.turns[0]
+                self.summary.append(f"- {first_sentence(old_question, 80)} → {first_sentence(old_answer)}")
+                while self.summary and estimate_tokens('\n'.join(self.summary)) > self.summary_tokens:
+                    self.summary.popleft()
+            self.turns.append((question, answer))
+            if motif_id:
+                self.last_motif = motif_id
+
+    def history(self, budget):
+        """
+        Summary text and the most recent turns as chat messages, newest
+        turns kept first, within `budget` tokens
+        """
+        with self.lock:
+            summary = '\n'.join(self.summary)
+            turns = list(self.turns)
+
+        if estimate_tokens(summary) > budget:
+            summary = ''
+        budget -= estimate_tokens(summary) if summary else 0
+
+        messages = []
+        for question, answer in reversed(turns):
+            cost = estimate_tokens(question) + estimate_tokens(answer)
+            if cost > budget:
+                break
+            messages[:0] = [
+                {"role": "user", "content": question},
+                {"role": "assistant", "content": answer},
+            ]
+            budget -= cost
+        return summary, messages
+
+
+class ChatSessionStore:
+    """Bounded, expiring map of session id to ChatSession"""
+
+    def __init__(self, max_sessions=1000, ttl=1800, max_turns=6, summary_tokens=200, turn_tokens=200):
+        self.max_turns = max_turns
+        self.summary_tokens = summary_tokens
+        self.turn_tokens = turn_tokens
+        self._sessions = TTLCache(max_entries=max_sessions, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        """Session for the id, started fresh if unknown or expired"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = ChatSession(self.max_turns, self.summary_tokens, self.turn_tokens)
+            # Every use pushes the idle expiry back
+            self._sessions.set(session_id, session)
+            return session
+
+    def drop(self, session_id):
+        self._sessions.pop(session_id)
+
+    def stats(self):
+        return self._sessions.stats()
@@ -1,45 +1,155 @@
 import json
 import os
 import sys
-from groq import Groq
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
 from dotenv import load_dotenv
-from .groq_models import get_best_available_model, get_model_max_tokens, list_active_models
+from .groq_models import choose_model, get_best_available_model, get_local_model, get_model_max_tokens, list_active_models
+from .local_llm import LOCAL_LLM_AVAILABLE, LocalLLMBusy, create_local_llm
+from .groq_client import get_groq_gateway
+from .hedging import RequestHedger
+from .chat_sessions import ChatSessionStore
+from .response_cache import ChatResponseCache, STOP_WORDS
+from .motif_matcher import MotifMatcher
+from .local_qa import LocalQAEngine
+from .answer_table import AnswerTable, ANSWER_TABLE_PATH
+from utils.text_index import BM25Index, estimate_tokens
 
 # Load environment variables
 load_dotenv()
 
+METADATA_PATHS = [
+    'data/batik_metadata.json',
+    '../data/batik_metadata.json',
+    'backend/data/batik_metadata.json'
+]
+
+_metadata_cache = None
+_metadata_lock = threading.Lock()
+
+def load_batik_metadata():
+    """Parse batik_metadata.json once per process (read-only view)"""
+    global _metadata_cache
+    with _metadata_lock:
+        if _metadata_cache is None:
+            data = None
+            for path in METADATA_PATHS:
+                if os.path.exists(path):
+                    try:
+                        with open(path, 'r', encoding='utf-8') as f:
+                            data = json.load(f)
+                        break
+                    except Exception as e:
+                        print(f"⚠ Error loading metadata from {path}: {e}")
+                        continue
+            if data is not None:
+                _metadata_cache = MappingProxyType(
+                    {motif_id: MappingProxyType(info) for motif_id, info in data.items()}
+                )
+        return _metadata_cache
+
 class BatikChatbot:
+    """
+    Batik Nitik assistant. Built once per worker and shared by every
+    request, so its state is thread-safe rather than frozen:
+
+    - metadata is a read-only MappingProxyType
+    - the matcher, local QA index and answer table are built in __init__
+      and only read afterwards (not enforced)
+    - the response cache, session store, hedger, gateway and lazily loaded
+      local LLM are mutable and guard themselves with their own locks
+    """
+    
     def __init__(self):
         # Initialize Groq API (free tier)
         self.groq_api_key = os.getenv("GROQ_API_KEY", "").strip()
         self.client = None
         self.model_name = get_best_available_model()
         
-        # Initialize Groq client if API key is available
+        # Rate-limited Groq gateway if API key is available
         if self.groq_api_key and self.groq_api_key != "your_groq_api_key_here":
             try:
-                self.client = Groq(api_key=self.groq_api_key)
+                self.client = get_groq_gateway(self.groq_api_key)
                 print(f"✓ Groq API initialized successfully")
                 print(f"✓ Using model: {self.model_name}")
                 print(f"✓ Available models: {list_active_models()}")
-                # Test the API connection
-                self._test_api_connection()
+                # No startup probe: the router's circuit breaker takes failing
+                # models out of rotation and probes them again after a cooldown
             except Exception as e:
                 print(f"✗ Failed to initialize Groq API: {e}")
                 self.client = None
         else:
             print("⚠ No Groq API key found. Using fallback responses.")
         
+        # Local CPU model for offline answers, loaded on first use (load_local_llm)
+        self.local_llm = None
+        self._local_llm_failed = False
+        self._local_llm_lock = threading.Lock()
+        
+        # Optional backup requests to a second model when the primary stalls
+        self.hedger = None
+        if self.client is not None and os.getenv("CHATBOT_HEDGING", "0") == "1":
+            self.hedger = RequestHedger(
+                self.client,
+                percentile=float(os.getenv("CHATBOT_HEDGE_PERCENTILE", "95")),
+                budget=float(os.getenv("CHATBOT_HEDGE_BUDGET", "0.1"))
+            )
+            print(f"✓ Hedged Groq requests enabled (p{self.hedger.percentile}, budget {self.hedger.budget:.0%})")
+        
         # Load batik metadata from JSON file
         self.batik_data = self._load_batik_metadata()
         print(f"✓ Loaded {len(self.batik_data)} batik motifs from metadata")
         
-        # Create motif names list for validation
-        self.valid_motifs = set()
-        for motif_id, info in self.batik_data.items():
-            self.valid_motifs.add(info['name'].lower())
-            self.valid_motifs.add(motif_id.lower())
-            self.valid_motifs.add(motif_id.replace('_', ' ').lower())
+        # Motif aliases and intent keywords compiled once for query routing
+        self.matcher = MotifMatcher(self.batik_data)
+        
+        # BM25 index over motif metadata; only the relevant entries go into the prompt
+        self.motif_ids = list(self.batik_data)
+        self.motif_index = BM25Index(
+            [self._motif_document(motif_id) for motif_id in self.motif_ids],
+            stop_words=STOP_WORDS | {'motif', 'batik', 'nitik'}
+        )
+        self.prompt_top_k = int(os.getenv("CHATBOT_PROMPT_TOP_K", "3"))
+        self.prompt_min_score = float(os.getenv("CHATBOT_PROMPT_MIN_SCORE", "2.0"))
+        self.context_token_limit = int(os.getenv("CHATBOT_CONTEXT_TOKENS", "600"))
+        
+        # Pre-generated motif × intent answers (python -m models.answer_table)
+        self.answer_table = None
+        table_path = os.getenv("CHATBOT_ANSWER_TABLE", ANSWER_TABLE_PATH)
+        if table_path:
+            self.answer_table = AnswerTable.load(self.batik_data, table_path)
+            if self.answer_table is not None:
+                print(f"✓ Answer table loaded with {len(self.answer_table)} entries")
+        
+        # Curated Q/A pairs answered offline, before any Groq call
+        self.local_qa = None
+        if os.getenv("CHATBOT_LOCAL_QA", "1") == "1":
+            self.local_qa = LocalQAEngine(
+                self.matcher, self.batik_data,
+                threshold=float(os.getenv("LOCAL_QA_THRESHOLD", "0.6"))
+            )
+            print(f"✓ Local QA engine loaded {len(self.local_qa)} Q/A pairs")
+        
+        # Answers to repeated questions (internally synchronized)
+        self.response_cache = None
+        if os.getenv("CHATBOT_RESPONSE_CACHE", "1") == "1":
+            self.response_cache = ChatResponseCache(
+                max_entries=int(os.getenv("CHATBOT_CACHE_SIZE", "1024")),
+                ttl=int(os.getenv("CHATBOT_CACHE_TTL", "3600")),
+                semantic_model=os.getenv("CHATBOT_SEMANTIC_MODEL") or None,
+                semantic_threshold=float(os.getenv("CHATBOT_SEMANTIC_THRESHOLD", "0.92"))
+            )
+        
+        # Multi-turn memory for clients that send a session_id
+        self.sessions = ChatSessionStore(
+            max_sessions=int(os.getenv("CHATBOT_MAX_SESSIONS", "1000")),
+            ttl=int(os.getenv("CHATBOT_SESSION_TTL", "1800")),
+            max_turns=int(os.getenv("CHATBOT_SESSION_TURNS", "6")),
+            summary_tokens=int(os.getenv("CHATBOT_SUMMARY_TOKENS", "200")),
+            turn_tokens=int(os.getenv("CHATBOT_TURN_TOKENS", "200"))
+        )
+        self.history_token_limit = int(os.getenv("CHATBOT_HISTORY_TOKENS", "800"))
         
         # System prompt yang sangat spesifik untuk Batik Nitik
         self.system_prompt = f"""Anda adalah asisten AI khusus yang HANYA membahas Batik Nitik dari Yogyakarta. Anda memiliki pengetahuan mendalam tentang {len(self.batik_data)} motif Batik Nitik yang tercatat dalam database.
@@ -48,9 +158,7 @@ ATURAN KETAT:
 1. HANYA menjawab pertanyaan tentang Batik Nitik dan motif-motifnya
 2. TIDAK menjawab pertanyaan tentang topik lain di luar batik
 3. Jika ditanya tentang motif yang tidak ada dalam database, sampaikan bahwa data tidak tersedia
-4. Berikan informasi akurat berdasarkan metadata yang tersedia
-
-MOTIF YANG TERSEDIA: {', '.join([info['name'] for info in self.batik_data.values()])}
+4. Berikan informasi akurat berdasarkan metadata motif yang disertakan di bawah
 
 RESPONS FORMAT:
 - Singkat dan informatif (maksimal 3-4 kalimat)
@@ -60,68 +168,14 @@ RESPONS FORMAT:
 
 Jika pertanyaan di luar konteks Batik Nitik, tolak dengan sopan dan arahkan kembali ke topik batik."""
 
-    def _test_api_connection(self):
-        """Test Groq API connection"""
-        if not self.client or not self.model_name:
-            return False
-            
-        try:
-            # Test with a simple query using best available model
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant."},
-                    {"role": "user", "content": "Test"}
-                ],
-                temperature=0.1,
-                max_tokens=10
-            )
-            print(f"✓ Groq API connection test successful with {self.model_name}")
-            return True
-        except Exception as e:
-            print(f"✗ Groq API connection test failed with {self.model_name}: {e}")
-            # Try fallback to different model
-            backup_models = ["llama3-8b-8192", "gemma-7b-it"]
-            for backup_model in backup_models:
-                try:
-                    response = self.client.chat.completions.create(
-                        model=backup_model,
-                        messages=[
-                            {"role": "system", "content": "You are a helpful assistant."},
-                            {"role": "user", "content": "Test"}
-                        ],
-                        temperature=0.1,
-                        max_tokens=10
-                    )
-                    self.model_name = backup_model
-                    print(f"✓ Switched to backup model: {backup_model}")
-                    return True
-                except Exception as backup_e:
-                    print(f"✗ Backup model {backup_model} also failed: {backup_e}")
-                    continue
-            
-            self.client = None
-            return False
-        
     def _load_batik_metadata(self):
-        """Load batik metadata from JSON file"""
-        metadata_paths = [
-            'data/batik_metadata.json',
-            '../data/batik_metadata.json',
-            'backend/data/batik_metadata.json'
-        ]
-        
-        for path in metadata_paths:
-            if os.path.exists(path):
-                try:
-                    with open(path, 'r', encoding='utf-8') as f:
-                        return json.load(f)
-                except Exception as e:
-                    print(f"⚠ Error loading metadata from {path}: {e}")
-                    continue
+        """Load batik metadata from JSON file (parsed once per process)"""
+        metadata = load_batik_metadata()
+        if metadata is not None:
+            return metadata
         
         print("⚠ Metadata file not found. Using built-in fallback data.")
-        return self._get_builtin_batik_data()
+        return MappingProxyType(self._get_builtin_batik_data())
 
     def _get_builtin_batik_data(self):
         """Fallback built-in batik data"""
@@ -148,80 +202,317 @@ Jika pertanyaan di luar konteks Batik Nitik, tolak dengan sopan dan arahkan kemb
 
     def _is_batik_related_query(self, query):
         """Check if query is related to batik or contains valid motif names"""
-        query_lower = query.lower()
+        return self.matcher.match(query).is_batik_related
+
+    def get_response(self, query, pattern_id=None):
+        """Get chatbot response for batik-related queries only"""
+        return self.answer(query, pattern_id)[0]
+
+    def _quick_answer(self, query, pattern_id=None, session=None):
+        """Answer without calling Groq (rejected, cache, table or local), or None"""
+        # First check if query is batik-related; short referential follow-ups
+        # ("kenapa begitu?") in a session already about a motif stay on topic
+        in_motif_session = session is not None and session.last_motif is not None
+        if not self._is_batik_related_query(query) and not (
+                in_motif_session and self.matcher.is_follow_up(query)):
+            return self._get_rejection_response(), 'rejected'
         
-        # Batik-related keywords
-        batik_keywords = [
-            'batik', 'nitik', 'motif', 'sekar', 'pattern', 'tradisional', 
-            'yogyakarta', 'jawa', 'filosofi', 'makna', 'ceplok', 'kawung'
-        ]
+        # Repeated questions are answered from the response cache
+        if self.response_cache is not None:
+            cached = self.response_cache.get(query, pattern_id)
+            if cached is not None:
+                return cached, 'cache'
         
-        # Check for batik keywords
-        if any(keyword in query_lower for keyword in batik_keywords):
-            return True
+        # Common motif × intent questions have pre-generated answers
+        if self.answer_table is not None:
+            table_answer = self.answer_table.lookup(self.matcher.match(query), pattern_id)
+            if table_answer is not None:
+                return table_answer, 'table'
         
-        # Check for valid motif names
-        if any(motif in query_lower for motif in self.valid_motifs):
-            return True
+        # Factual motif questions are answered from the curated Q/A pairs
+        local = self._local_answer(query, pattern_id)
+        if local is not None:
+            return local, 'local'
+        return None
+
+    def answer_batch(self, items):
+        """
+        Answer a list of (query, pattern_id) items, in input order.
+        Identical items (same cache key) are answered once; items that need
+        Groq run concurrently, bounded by the gateway's concurrency limit.
+        """
+        unique = {}
+        keys = []
+        for query, pattern_id in items:
+            key = ChatResponseCache.key(query, pattern_id)
+            keys.append(key)
+            unique.setdefault(key, (query, pattern_id))
         
-        # Check for general greetings that are acceptable
-        greetings = ['halo', 'hai', 'hello', 'selamat', 'terima kasih', 'thanks']
-        if any(greeting in query_lower for greeting in greetings):
-            return True
+        results = {}
+        pending = {}
+        for key, (query, pattern_id) in unique.items():
+            try:
+                quick = self._quick_answer(query, pattern_id)
+            except Exception as e:
+                print(f"✗ Chatbot error: {e}")
+                quick = self._get_fallback_response(query, pattern_id), 'fallback'
+            if quick is not None:
+                results[key] = quick
+            else:
+                pending[key] = (query, pattern_id)
+        
+        if pending:
+            workers = min(len(pending), self.client.max_concurrency if self.client else 1)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chatbot-batch") as executor:
+                futures = {key: executor.submit(self.answer, *item) for key, item in pending.items()}
+                for key, future in futures.items():
+                    results[key] = future.result()
         
-        return False
+        return [results[key] for key in keys]
 
-    def get_response(self, query, pattern_id=None):
-        """Get chatbot response for batik-related queries only"""
+    def answer(self, query, pattern_id=None, session_id=None):
+        """Get chatbot response and its source: rejected, cache, table, local, groq or fallback"""
+        session = self.sessions.get(session_id) if session_id else None
+        pattern_id = self._session_pattern(query, pattern_id, session)
+        
+        response, source = self._answer(query, pattern_id, session)
+        if session is not None and source != 'rejected':
+            session.record(query, response, self._motif_of(query, pattern_id))
+        return response, source
+
+    def _answer(self, query, pattern_id=None, session=None):
         try:
-            # First check if query is batik-related
-            if not self._is_batik_related_query(query):
-                return self._get_rejection_response()
-            
-            # Construct context message
-            context = self.system_prompt
+            quick = self._quick_answer(query, pattern_id, session)
+            if quick is not None:
+                return quick
             
-            # Add specific pattern info if provided
-            if pattern_id and pattern_id in self.batik_data:
-                pattern_info = self.batik_data[pattern_id]
-                context += f"\n\nKONTEKS MOTIF TERPILIH:\n"
-                context += f"Nama: {pattern_info.get('name', pattern_id)}\n"
-                context += f"Deskripsi: {pattern_info.get('description', 'Tidak ada deskripsi')}\n"
-                context += f"Makna: {pattern_info.get('meaning', 'Tidak ada informasi makna')}\n"
-                context += f"Visual: {pattern_info.get('visual', 'Tidak ada deskripsi visual')}\n"
-            
-            # Use Groq API if available
-            if self.client and self.model_name:
+            # Use Groq API if available, on the fastest healthy model
+            model = choose_model() if self.client else None
+            if model:
                 try:
-                    messages = [
-                        {"role": "system", "content": context},
-                        {"role": "user", "content": query}
-                    ]
+                    messages = self._build_messages(query, pattern_id, model, session)
                     
-                    max_tokens = min(300, get_model_max_tokens(self.model_name) // 4)
+                    max_tokens = self._completion_tokens(model)
                     
-                    response = self.client.chat.completions.create(
-                        model=self.model_name,
-                        messages=messages,
-                        temperature=0.7,
-                        max_tokens=max_tokens
-                    )
+                    if self.hedger is not None:
+                        ai_response, model = self.hedger.chat(
+                            model, messages,
+                            choose_backup=lambda: choose_model(exclude=(model,)),
+                            temperature=0.7,
+                            max_tokens=max_tokens
+                        )
+                    else:
+                        ai_response = self.client.chat(
+                            model=model,
+                            messages=messages,
+                            temperature=0.7,
+                            max_tokens=max_tokens
+                        )
                     
-                    ai_response = response.choices[0].message.content.strip()
-                    print(f"✓ Groq AI response generated successfully using {self.model_name}")
-                    return ai_response
+                    print(f"✓ Groq AI response generated successfully using {model}")
+                    # Answers shaped by earlier turns are not reusable for other users
+                    if self.response_cache is not None and ai_response and not (session and session.turns):
+                        self.response_cache.set(query, pattern_id, ai_response)
+                    return ai_response, 'groq'
                     
                 except Exception as e:
-                    print(f"✗ Groq API error with {self.model_name}: {e}")
+                    print(f"✗ Groq API error with {model}: {e}")
                     # Fall back to local response
-                    return self._get_fallback_response(query, pattern_id)
+                    return self._offline_answer(query, pattern_id, session)
             else:
                 # Use fallback response
-                return self._get_fallback_response(query, pattern_id)
+                return self._offline_answer(query, pattern_id, session)
                 
         except Exception as e:
             print(f"✗ Chatbot error: {e}")
-            return self._get_fallback_response(query, pattern_id)
+            return self._get_fallback_response(query, pattern_id), 'fallback'
+
+    def stream_answer(self, query, pattern_id=None, session_id=None):
+        """
+        Streaming variant of answer(). Yields ('token', text) events as the
+        completion arrives, ('reset', None) if a failed stream is replaced by
+        the fallback answer, and finally ('done', source).
+        """
+        session = self.sessions.get(session_id) if session_id else None
+        pattern_id = self._session_pattern(query, pattern_id, session)
+        
+        parts = []
+        for kind, value in self._stream_answer(query, pattern_id, session):
+            if kind == 'token':
+                parts.append(value)
+            elif kind == 'reset':
+                parts = []
+            elif session is not None and value != 'rejected':
+                session.record(query, ''.join(parts), self._motif_of(query, pattern_id))
+            yield kind, value
+
+    def _stream_answer(self, query, pattern_id=None, session=None):
+        quick = self._quick_answer(query, pattern_id, session)
+        if quick is not None:
+            yield 'token', quick[0]
+            yield 'done', quick[1]
+            return
+        
+        model = choose_model() if self.client else None
+        if model:
+            parts = []
+            try:
+                for delta in self.client.stream_chat(
+                    model=model,
+                    messages=self._build_messages(query, pattern_id, model, session),
+                    temperature=0.7,
+                    max_tokens=self._completion_tokens(model)
+                ):
+                    parts.append(delta)
+                    yield 'token', delta
+                
+                ai_response = ''.join(parts).strip()
+                if ai_response:
+                    print(f"✓ Groq AI response streamed successfully using {model}")
+                    if self.response_cache is not None and not (session and session.turns):
+                        self.response_cache.set(query, pattern_id, ai_response)
+                    yield 'done', 'groq'
+                    return
+                
+            except Exception as e:
+                print(f"✗ Groq API streaming error with {model}: {e}")
+            
+            # Partial output is discarded in favour of the complete fallback answer
+            if parts:
+                yield 'reset', None
+        
+        response, source = self._offline_answer(query, pattern_id, session)
+        yield 'token', response
+        yield 'done', source
+
+    def load_local_llm(self):
+        """Build the local CPU model on first use; None when disabled or unavailable"""
+        model = get_local_model()
+        if model is None or not LOCAL_LLM_AVAILABLE:
+            return None
+        with self._local_llm_lock:
+            if self.local_llm is None and not self._local_llm_failed:
+                try:
+                    self.local_llm = create_local_llm(model, self.system_prompt)
+                except Exception as e:
+                    print(f"✗ Failed to load local LLM {model}: {e}")
+                    self._local_llm_failed = True
+        return self.local_llm
+
+    def _offline_answer(self, query, pattern_id=None, session=None):
+        """Local LLM answer when enabled, keyword templates otherwise"""
+        local_llm = self.load_local_llm()
+        if local_llm is not None:
+            try:
+                response = local_llm.chat(self._local_llm_messages(query, pattern_id, session))
+                if response:
+                    return response, 'local_llm'
+            except LocalLLMBusy as e:
+                # Template answers beat queueing behind other generations
+                print(f"⚠ {e}; answering from templates")
+            except Exception as e:
+                print(f"✗ Local LLM error: {e}")
+        return self._get_fallback_response(query, pattern_id), 'fallback'
+
+    def _local_llm_messages(self, query, pattern_id=None, session=None):
+        """
+        Same context as the Groq prompt, but with the retrieved motif context
+        moved into the user turn so the system message stays byte-identical
+        to the one whose KV cache the local model keeps
+        """
+        messages = self._build_messages(query, pattern_id, get_local_model(), session)
+        context = messages[0]['content'][len(self.system_prompt):].strip()
+        messages[0] = {"role": "system", "content": self.system_prompt}
+        if context:
+            messages[-1] = {"role": "user", "content": f"{context}\n\nPERTANYAAN: {query}"}
+        return messages
+
+    def _session_pattern(self, query, pattern_id, session):
+        """Follow-ups that name no motif ("lalu maknanya?") continue with the session's last motif"""
+        if pattern_id or session is None or session.last_motif is None:
+            return pattern_id
+        if self.matcher.match(query).motif_ids:
+            return pattern_id
+        return session.last_motif
+
+    def _motif_of(self, query, pattern_id):
+        motif_ids = self.matcher.match(query).motif_ids
+        return motif_ids[0] if motif_ids else pattern_id
+
+    def _local_answer(self, query, pattern_id=None):
+        """Answer from the curated Q/A pairs when confident, otherwise None"""
+        if self.local_qa is None:
+            return None
+        result = self.local_qa.answer(query, pattern_id)
+        return result[0] if result else None
+
+    def _motif_document(self, motif_id):
+        """Searchable text of one motif"""
+        info = self.batik_data[motif_id]
+        return ' '.join([
+            info.get('name', ''), motif_id.replace('_', ' '),
+            info.get('description', ''), info.get('meaning', ''), info.get('visual', '')
+        ])
+
+    def _completion_tokens(self, model):
+        return min(300, get_model_max_tokens(model) // 4)
+
+    def _context_budget(self, query, model):
+        """Tokens left for motif context after the base prompt, query and answer"""
+        available = (get_model_max_tokens(model) - self._completion_tokens(model)
+                     - estimate_tokens(self.system_prompt) - estimate_tokens(query))
+        return max(0, min(self.context_token_limit, available))
+
+    def _relevant_motifs(self, query, pattern_id=None):
+        """Motifs named in the query first, then the best BM25 matches"""
+        named = [motif_id for motif_id in self.matcher.match(query).motif_ids if motif_id != pattern_id]
+        ranked = list(named)
+        for index, _ in self.motif_index.search(query, self.prompt_top_k + 1, self.prompt_min_score):
+            motif_id = self.motif_ids[index]
+            if motif_id != pattern_id and motif_id not in ranked:
+                ranked.append(motif_id)
+        return ranked[:max(self.prompt_top_k, len(named))]
+
+    def _build_messages(self, query, pattern_id=None, model=None, session=None):
+        """System prompt plus the selected and most relevant motifs, within the token budget"""
+        # Construct context message
+        context = self.system_prompt
+        budget = self._context_budget(query, model or self.model_name)
+        
+        # Add specific pattern info if provided
+        if pattern_id and pattern_id in self.batik_data:
+            pattern_info = self.batik_data[pattern_id]
+            selected = f"\n\nKONTEKS MOTIF TERPILIH:\n"
+            selected += f"Nama: {pattern_info.get('name', pattern_id)}\n"
+            selected += f"Deskripsi: {pattern_info.get('description', 'Tidak ada deskripsi')}\n"
+            selected += f"Makna: {pattern_info.get('meaning', 'Tidak ada informasi makna')}\n"
+            selected += f"Visual: {pattern_info.get('visual', 'Tidak ada deskripsi visual')}\n"
+            context += selected
+            budget -= estimate_tokens(selected)
+        
+        # Retrieved motifs are added best first until the budget runs out
+        entries = []
+        for motif_id in self._relevant_motifs(query, pattern_id):
+            info = self.batik_data[motif_id]
+            entry = f"- {info['name']}: {info.get('description', '')} Makna: {info.get('meaning', '-')}"
+            if estimate_tokens(entry) > budget:
+                break
+            entries.append(entry)
+            budget -= estimate_tokens(entry)
+        if entries:
+            context += "\n\nMOTIF RELEVAN:\n" + "\n".join(entries) + "\n"
+        
+        # Earlier turns of the conversation, trimmed to the history budget
+        history = []
+        if session is not None:
+            history_budget = min(self.history_token_limit, get_model_max_tokens(model or self.model_name) // 4)
+            summary, history = session.history(history_budget)
+            if summary:
+                context += "\n\nRINGKASAN PERCAKAPAN SEBELUMNYA:\n" + summary + "\n"
+        
+        return [{"role": "system", "content": context}] + history + [
+            {"role": "user", "content": query}
+        ]
 
     def _get_rejection_response(self):
         """Response for non-batik related queries"""
@@ -229,17 +520,18 @@ Jika pertanyaan di luar konteks Batik Nitik, tolak dengan sopan dan arahkan kemb
 
     def _get_fallback_response(self, query, pattern_id):
         """Enhanced fallback responses using metadata"""
-        query_lower = query.lower()
+        match = self.matcher.match(query)
+        intents = match.intents
         
         # Check if query is not batik-related
-        if not self._is_batik_related_query(query):
+        if not match.is_batik_related:
             return self._get_rejection_response()
         
         # Check if asking about specific pattern by ID first
         if pattern_id and pattern_id in self.batik_data:
             info = self.batik_data[pattern_id]
             
-            if any(word in query_lower for word in ["apa itu", "what is", "jelaskan", "ceritakan"]):
+            if 'definition' in intents:
                 response = f"Motif {info['name']} adalah {info['description']}."
                 if info.get('meaning'):
                     response += f" Makna filosofisnya: {info['meaning']}"
@@ -247,13 +539,13 @@ Jika pertanyaan di luar konteks Batik Nitik, tolak dengan sopan dan arahkan kemb
                     response += f" Karakteristik visualnya: {info['visual']}"
                 return response
             
-            elif any(word in query_lower for word in ["makna", "filosofi", "arti", "meaning"]):
+            elif 'meaning' in intents:
                 if info.get('meaning'):
                     return f"Makna filosofis motif {info['name']}: {info['meaning']}"
                 else:
                     return f"Maaf, data makna filosofis untuk motif {info['name']} belum tersedia dalam database kami."
             
-            elif any(word in query_lower for word in ["visual", "bentuk", "gambar", "tampilan"]):
+            elif 'visual' in intents:
                 if info.get('visual'):
                     return f"Karakteristik visual motif {info['name']}: {info['visual']}"
                 else:
@@ -266,48 +558,52 @@ Jika pertanyaan di luar konteks Batik Nitik, tolak dengan sopan dan arahkan kemb
                     response += f" Makna: {info['meaning']}"
                 return response
         
-        # Check if query contains any motif name from our database
-        for motif_id, info in self.batik_data.items():
-            motif_variations = [
-                info['name'].lower(),
-                motif_id.replace('_', ' '),
-                motif_id.replace('_', ''),
-                info['name'].lower().replace(' ', '')
-            ]
-            
-            if any(variation in query_lower for variation in motif_variations):
-                if any(word in query_lower for word in ["makna", "filosofi", "arti"]):
-                    if info.get('meaning'):
-                        return f"Makna filosofis motif {info['name']}: {info['meaning']}"
-                    else:
-                        return f"Maaf, data makna untuk motif {info['name']} belum tersedia dalam database kami."
+        # Motif named in the query (typos included)
+        if match.motif_ids:
+            info = self.batik_data[match.motif_ids[0]]
+            if 'meaning' in intents:
+                if info.get('meaning'):
+                    return f"Makna filosofis motif {info['name']}: {info['meaning']}"
                 else:
-                    response = f"Motif {info['name']}: {info['description']}."
-                    if info.get('meaning'):
-                        response += f" Makna: {info['meaning']}"
-                    return response
+                    return f"Maaf, data makna untuk motif {info['name']} belum tersedia dalam database kami."
+            else:
+                response = f"Motif {info['name']}: {info['description']}."
+                if info.get('meaning'):
+                    response += f" Makna: {info['meaning']}"
+                return response
         
         # General batik questions
-        if any(word in query_lower for word in ["sejarah", "asal usul", "history", "origin"]):
+        if 'history' in intents:
             return "Batik Nitik adalah batik klasik dari Yogyakarta dengan teknik yang sangat teliti. Nama 'nitik' berasal dari kata 'titik' yang menggambarkan motif-motif kecil dan detail. Batik ini memiliki 60 motif tradisional dengan makna filosofis mendalam."
         
-        elif any(word in query_lower for word in ["berapa", "jumlah", "how many"]):
+        elif 'count' in intents:
             return f"Batik Nitik memiliki 60 motif tradisional secara keseluruhan. Dalam database kami saat ini tersedia {len(self.batik_data)} motif dengan informasi lengkap mengenai deskripsi dan makna filosofisnya."
         
-        elif any(word in query_lower for word in ["motif", "pattern", "pola"]) and "daftar" in query_lower:
+        elif 'list' in intents and (match.keywords & {'motif', 'pattern'} or 'pola' in query.lower()):
             motif_names = [info['name'] for info in list(self.batik_data.values())[:10]]  # Show first 10
             return f"Beberapa motif Batik Nitik yang tersedia dalam database: {', '.join(motif_names)}. Silakan tanyakan tentang motif tertentu untuk informasi lebih detail."
         
-        elif "batik nitik" in query_lower or "batik" in query_lower:
+        elif 'batik' in match.keywords:
             return f'Batik Nitik adalah batik klasik dari Yogyakarta dengan {len(self.batik_data)} motif yang terdokumentasi dalam sistem kami. Setiap motif memiliki makna filosofis yang mencerminkan kebijaksanaan masyarakat Jawa. Silakan tanyakan tentang motif tertentu.'
         
-        elif any(word in query_lower for word in ["halo", "hai", "hello", "hi"]):
+        elif 'greeting' in intents:
             return f"Halo! Saya adalah asisten khusus Batik Nitik. Saya dapat membantu Anda mempelajari {len(self.batik_data)} motif Batik Nitik yang tersedia dalam database. Silakan tanyakan tentang motif tertentu, makna filosofis, atau aspek lain dari Batik Nitik."
         
         else:
             # Check if asking about motif not in our database
-            possible_motif_words = ['sekar', 'motif', 'pattern']
-            if any(word in query_lower for word in possible_motif_words):
+            if match.keywords & {'sekar', 'motif', 'pattern'}:
                 return f"Maaf, motif yang Anda tanyakan mungkin tidak tersedia dalam database kami yang berisi {len(self.batik_data)} motif Batik Nitik. Silakan cek daftar motif yang tersedia atau tanyakan tentang motif lain."
             
-            return f'Silakan tanyakan tentang motif-motif Batik Nitik yang tersedia dalam database kami. Anda dapat bertanya tentang makna filosofis, deskripsi, atau karakteristik visual dari {len(self.batik_data)} motif yang terdokumentasi.'
\ No newline at end of file
+            return f'Silakan tanyakan tentang motif-motif Batik Nitik yang tersedia dalam database kami. Anda dapat bertanya tentang makna filosofis, deskripsi, atau karakteristik visual dari {len(self.batik_data)} motif yang terdokumentasi.'
+
+# Global instance
+batik_chatbot = None
+_chatbot_lock = threading.Lock()
+
+def get_chatbot():
+    """Get or create the shared BatikChatbot instance"""
+    global batik_chatbot
+    with _chatbot_lock:
+        if batik_chatbot is None:
+            batik_chatbot = BatikChatbot()
+    return batik_chatbot
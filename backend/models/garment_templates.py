@@ -0,0 +1,295 @@
+"""
+Precomputed garment templates for IDM-VTON.
+
+A template only depends on the batik pattern, the backend that consumes it
+and the output size, so it is built once, stored as .npy on disk and kept
+in memory. Disk entries are keyed by the pattern file's mtime, so replacing
+a pattern image invalidates its templates. Run as a script to prebuild
+templates for the whole catalog:
+
+    python -m models.garment_templates --backend all
+"""
+
+import os
+import zlib
+import argparse
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Bump when the template construction changes so stale .npy files are ignored
+TEMPLATE_VERSION = 1
+
+# Output size (width, height) per backend
+GARMENT_SIZES = {
+    'api': (400, 600),
+    'local': (512, 768),
+}
+
+# Working size (width, height) of the person photo for local diffusion;
+# uploads are decoded near this size
+PERSON_SIZE = (768, 1024)
+
+
+def pattern_seed(pattern_id):
+    """Stable per-pattern seed so texture noise is reproducible and cacheable"""
+    return zlib.crc32(str(pattern_id).encode('utf-8'))
+
+
+@lru_cache(maxsize=8)
+def shirt_mask(height, width):
+    """Create detailed shirt-shaped mask (cached per size, read-only)"""
+    mask = np.zeros((height, width), dtype=np.float32)
+
+    # Main shirt body
+    body_top = int(height * 0.15)
+    body_bottom = int(height * 0.85)
+    body_left = int(width * 0.2)
+    body_right = int(width * 0.8)
+    cv2.rectangle(mask, (body_left, body_top), (body_right, body_bottom), 1.0, -1)
+
+    # Sleeves
+    sleeve_bottom = int(height * 0.45)
+    sleeve_width = int(width * 0.15)
+    cv2.rectangle(mask, (body_left - sleeve_width, body_top),
+                  (body_left, sleeve_bottom), 1.0, -1)
+    cv2.rectangle(mask, (body_right, body_top),
+                  (body_right + sleeve_width, sleeve_bottom), 1.0, -1)
+
+    # Neck opening
+    neck_width = int(width * 0.08)
+    neck_height = int(height * 0.06)
+    cv2.ellipse(mask, (width // 2, body_top),
+                (neck_width, neck_height), 0, 0, 180, 0.0, -1)
+
+    # Smooth the edges
+    mask = cv2.GaussianBlur(mask, (15, 15), 5)
+    mask.flags.writeable = False
+    return mask
+
+
+@lru_cache(maxsize=8)
+def shirt_shading(height, width):
+    """Lighting gradient restricted to the shirt area (cached per size, read-only)"""
+    y, x = np.ogrid[0:height, 0:width]
+    center_x, center_y = width // 2, height // 3
+
+    # Distance from light source
+    distance = np.sqrt((x - center_x) ** 2 + (y - center_y) ** 2)
+    max_distance = np.sqrt(center_x ** 2 + (height - center_y) ** 2)
+
+    gradient = np.clip(1 - (distance / max_distance) * 0.15, 0.85, 1.15)
+    shading = (gradient * (shirt_mask(height, width) > 0.1)).astype(np.float32)
+    shading.flags.writeable = False
+    return shading
+
+
+def build_shirt_template(pattern, size=GARMENT_SIZES['api'], seed=0):
+    """Shirt-shaped garment with shading and seeded fabric noise (API backend)"""
+    if isinstance(pattern, Image.Image):
+        pattern = np.asarray(pattern.convert('RGB'))
+
+    width, height = size
+    mask = shirt_mask(height, width)[:, :, None]
+
+    shirt = cv2.resize(pattern, (width, height)).astype(np.float32)
+    # Masking before truncation matches the original uint8 intermediate
+    shirt = np.floor(shirt * mask)
+    shirt *= shirt_shading(height, width)[:, :, None]
+
+    # Subtle texture, seeded so the template is deterministic
+    rng = np.random.default_rng(seed)
+    noise = rng.normal(0, 2, shirt.shape).astype(np.float32)
+    shirt += noise * mask * 0.3
+
+    return np.clip(shirt, 0, 255).astype(np.uint8)
+
+
+def build_local_template(pattern, size=GARMENT_SIZES['local']):
+    """Pattern resized to the local pipeline garment size"""
+    if isinstance(pattern, np.ndarray):
+        pattern = Image.fromarray(pattern)
+    if pattern.mode != 'RGB':
+        pattern = pattern.convert('RGB')
+    if pattern.size != tuple(size):
+        pattern = pattern.resize(tuple(size), Image.LANCZOS)
+    return np.asarray(pattern)
+
+
+def build_template(pattern, backend, size=None, seed=0):
+    """Build the template for one backend"""
+    size = tuple(size or GARMENT_SIZES[backend])
+    if backend == 'local':
+        return build_local_template(pattern, size)
+    return build_shirt_template(pattern, size, seed)
+
+
+class GarmentTemplateCache:
+    """Two-level (memory LRU + .npy on disk) cache of garment templates"""
+
+    def __init__(self, cache_dir='data/garment_templates', max_entries=128):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _prefix(self, pattern_id, backend, size):
+        width, height = size
+        return os.path.join(self.cache_dir, f"v{TEMPLATE_VERSION}_{backend}_{width}x{height}_{pattern_id}_")
+
+    def _path(self, pattern_id, backend, size, version):
+        return f"{self._prefix(pattern_id, backend, size)}{version}.npy"
+
+    def get(self, pattern_id, backend, pattern, size=None, force=False, version=None):
+        """
+        Return the template for (pattern_id, backend, size, version), building
+        it from `pattern` (PIL image, array or zero-argument callable) when
+        missing. `version` identifies the pattern source (its image file's
+        mtime); templates without one, e.g. built from a procedural fallback,
+        are kept in memory only and never written to disk.
+        """
+        size = tuple(size or GARMENT_SIZES[backend])
+        key = (pattern_id, backend, size, version)
+
+        if not force:
+            with self._lock:
+                template = self._memory.get(key)
+                if template is not None:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return template
+
+            template = self._load(key)
+            if template is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._remember(key, template)
+                return template
+
+        with self._lock:
+            self.misses += 1
+
+        if callable(pattern):
+            pattern = pattern()
+        template = build_template(pattern, backend, size, seed=pattern_seed(pattern_id))
+        template.flags.writeable = False
+        self._save(key, template)
+
+        with self._lock:
+            self._remember(key, template)
+        return template
+
+    def _load(self, key):
+        if key[3] is None:
+            return None
+        path = self._path(*key)
+        if not os.path.exists(path):
+            return None
+        try:
+            template = np.load(path, allow_pickle=False)
+        except Exception as e:
+            print(f"⚠ Ignoring unreadable garment template {path}: {e}")
+            return None
+        template.flags.writeable = False
+        return template
+
+    def _save(self, key, template):
+        if key[3] is None:
+            return
+        path = self._path(*key)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Write then rename so concurrent readers never see a partial file
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, template, allow_pickle=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠ Could not persist garment template {path}: {e}")
+            return
+
+        # Templates built from earlier versions of the pattern file are stale now
+        prefix = os.path.basename(self._prefix(*key[:3]))
+        for name in os.listdir(self.cache_dir):
+            stale_version = name[len(prefix):-len('.npy')]
+            if name.startswith(prefix) and name.endswith('.npy') and stale_version.isdigit() \
+                    and stale_version != str(key[3]):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+
+    def _remember(self, key, template):
+        # Drop other versions of the same template before adding this one
+        for stale in [k for k in self._memory if k[:3] == key[:3] and k != key]:
+            del self._memory[stale]
+        self._memory[key] = template
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._memory),
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+            }
+
+
+# Global instance
+garment_template_cache = None
+_garment_template_cache_lock = threading.Lock()
+
+
+def get_garment_template_cache():
+    """Get or create the shared garment template cache"""
+    global garment_template_cache
+    with _garment_template_cache_lock:
+        if garment_template_cache is None:
+            garment_template_cache = GarmentTemplateCache()
+    return garment_template_cache
+
+
+def prebuild_templates(backends, force=False):
+    """Build templates for every pattern in the catalog"""
+    from utils.pattern_catalog import PatternCatalog
+    from utils.pattern_cache import PatternCache
+
+    catalog = PatternCatalog()
+    patterns = PatternCache(catalog=catalog)
+    cache = get_garment_template_cache()
+
+    built = 0
+    for pattern_id in catalog.ids():
+        pattern, version = patterns.get_versioned(pattern_id)
+        if pattern is None:
+            print(f"  Skipped {pattern_id}: no pattern image")
+            continue
+        for backend in backends:
+            cache.get(pattern_id, backend, pattern, force=force, version=version)
+            built += 1
+        print(f"  Built {pattern_id}: {', '.join(backends)}")
+
+    return built
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prebuild IDM-VTON garment templates")
+    parser.add_argument('--backend', choices=['api', 'local', 'all'], default='all')
+    parser.add_argument('--force', action='store_true', help="rebuild templates that already exist")
+    args = parser.parse_args()
+
+    backends = list(GARMENT_SIZES) if args.backend == 'all' else [args.backend]
+    print("🎨 Prebuilding garment templates")
+    print("=" * 40)
+    count = prebuild_templates(backends, force=args.force)
+    print(f"✅ {count} templates ready in {get_garment_template_cache().cache_dir}")
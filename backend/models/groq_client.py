@@ -0,0 +1,299 @@
+import asyncio
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+import httpx
+from groq import AsyncGroq, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+from utils.text_index import estimate_tokens
+from .groq_models import get_model_rate_limits, record_failure, record_rate_limited, record_success
+
+# Failures worth another attempt; everything else is raised immediately
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute up to a burst of `capacity`"""
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = float(capacity or per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, amount):
+        """Take amount now and return how long to wait before it is covered"""
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        # Oversized requests cost at most one full bucket
+        self.level -= min(amount, self.capacity)
+        return max(0.0, -self.level / self.rate)
+
+    def penalize(self, seconds):
+        """Empty the bucket for the given time (after an upstream 429)"""
+        self.reserve(0)
+        self.level = min(self.level, -seconds * self.rate)
+
+
+class Dispatch:
+    """
+    Set when a submitted call leaves the local rate buckets and concurrency
+    queue and goes upstream (or finishes without doing so); `at` is the
+    monotonic time of the first dispatch
+    """
+
+    def __init__(self):
+        self.at = None
+        self._event = threading.Event()
+
+    def set(self):
+        if self.at is None:
+            self.at = time.monotonic()
+            self._event.set()
+
+    def is_set(self):
+        return self._event.is_set()
+
+    def wait(self, timeout=None):
+        return self._event.wait(timeout)
+
+
+class GroqGateway:
+    """
+    Rate-limited access to Groq from synchronous code.
+
+    Calls run on an AsyncGroq client inside one background event loop.
+    Each model has a request bucket and a token bucket sized from
+    AVAILABLE_MODELS, at most `max_concurrency` calls are in flight, and
+    retryable failures back off exponentially with full jitter (or for the
+    Retry-After time on a 429). The SDK's own retries are disabled so the
+    buckets see every attempt.
+    """
+
+    def __init__(self, api_key, base_url=None, max_concurrency=4, max_retries=3,
+                 base_delay=0.5, max_delay=8.0, timeout=30.0):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="groq-gateway", daemon=True)
+        self._thread.start()
+
+        self._buckets = {}
+        self._queue_delays = deque(maxlen=500)
+        self._in_flight = 0
+        self.counters = {'requests': 0, 'retries': 0, 'rate_limited': 0, 'failures': 0}
+
+        async def setup():
+            self._semaphore = asyncio.Semaphore(max_concurrency)
+            self.client = AsyncGroq(
+                api_key=api_key,
+                base_url=base_url,
+                max_retries=0,
+                http_client=httpx.AsyncClient(
+                    timeout=httpx.Timeout(timeout, connect=5.0),
+                    limits=httpx.Limits(
+                        max_connections=max_concurrency * 2,
+                        max_keepalive_connections=max_concurrency
+                    )
+                )
+            )
+        self._run(setup()).result()
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def submit(self, model, messages, temperature=0.7, max_tokens=300):
+        """
+        Start a completion and return a concurrent.futures.Future of its
+        text; its `dispatch` (a Dispatch) is set once the call goes upstream
+        """
+        dispatch = Dispatch()
+        future = self._run(self._complete(model, messages, temperature, max_tokens, dispatch))
+        future.dispatch = dispatch
+        future.add_done_callback(lambda _: dispatch.set())
+        return future
+
+    def chat(self, model, messages, temperature=0.7, max_tokens=300, timeout=None):
+        """Completion text for the messages (blocking)"""
+        future = self.submit(model, messages, temperature, max_tokens)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def stream_chat(self, model, messages, temperature=0.7, max_tokens=300):
+        """Yield completion text deltas as they arrive (blocking generator)"""
+        deltas = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for delta in self._stream(model, messages, temperature, max_tokens):
+                    deltas.put(delta)
+                deltas.put(done)
+            except BaseException as e:
+                deltas.put(e)
+                raise
+
+        future = self._run(pump())
+        try:
+            while True:
+                item = deltas.get()
+                if item is done:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # Stop the upstream stream if the consumer went away early
+            future.cancel()
+
+    async def _complete(self, model, messages, temperature, max_tokens, dispatch=None):
+        response = await self._with_retries(
+            model, messages, max_tokens,
+            lambda: self.client.chat.completions.create(
+                model=model, messages=messages, temperature=temperature, max_tokens=max_tokens
+            ),
+            dispatch=dispatch
+        )
+        return response.choices[0].message.content.strip()
+
+    async def _stream(self, model, messages, temperature, max_tokens):
+        # Retries only cover opening the stream; a stream that breaks midway is raised
+        stream = await self._with_retries(
+            model, messages, max_tokens,
+            lambda: self.client.chat.completions.create(
+                model=model, messages=messages, temperature=temperature,
+                max_tokens=max_tokens, stream=True
+            ),
+            hold_slot=True
+        )
+        try:
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    yield delta
+        finally:
+            self._release()
+            await stream.response.aclose()
+
+    async def _with_retries(self, model, messages, max_tokens, call, hold_slot=False, dispatch=None):
+        """
+        Run call() under the rate limits, retrying retryable failures. With
+        hold_slot the concurrency slot stays taken after success and the
+        caller must _release() it. dispatch is set when the first attempt
+        has cleared the local queues.
+        """
+        cost = sum(estimate_tokens(m['content']) for m in messages) + max_tokens
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(model, cost)
+            if dispatch is not None:
+                dispatch.set()
+            started = time.monotonic()
+            succeeded = False
+            try:
+                result = await call()
+                succeeded = True
+                record_success(model, time.monotonic() - started)
+                return result
+            except RETRYABLE_ERRORS as e:
+                if isinstance(e, RateLimitError):
+                    # Local quota pressure; must not eject a healthy model
+                    record_rate_limited(model)
+                else:
+                    record_failure(model, time.monotonic() - started)
+                if attempt == self.max_retries:
+                    self.counters['failures'] += 1
+                    raise
+                delay = self._backoff(attempt)
+                if isinstance(e, RateLimitError):
+                    self.counters['rate_limited'] += 1
+                    retry_after = _retry_after(e)
+                    if retry_after is not None:
+                        delay = retry_after + random.uniform(0, self.base_delay)
+                    self._bucket(model, 'requests').penalize(delay)
+                self.counters['retries'] += 1
+            except Exception:
+                record_failure(model, time.monotonic() - started)
+                self.counters['failures'] += 1
+                raise
+            finally:
+                if not (succeeded and hold_slot):
+                    self._release()
+            # Back off without holding a concurrency slot
+            await asyncio.sleep(delay)
+
+    async def _acquire(self, model, cost):
+        """Wait for both rate buckets, then for a concurrency slot"""
+        queued_at = time.monotonic()
+        wait = max(self._bucket(model, 'requests').reserve(1), self._bucket(model, 'tokens').reserve(cost))
+        if wait:
+            await asyncio.sleep(wait)
+        await self._semaphore.acquire()
+        self._in_flight += 1
+        self.counters['requests'] += 1
+        self._queue_delays.append(time.monotonic() - queued_at)
+
+    def _release(self):
+        self._in_flight -= 1
+        self._semaphore.release()
+
+    def _bucket(self, model, kind):
+        key = (model, kind)
+        if key not in self._buckets:
+            requests_per_minute, tokens_per_minute = get_model_rate_limits(model)
+            self._buckets[key] = TokenBucket(requests_per_minute if kind == 'requests' else tokens_per_minute)
+        return self._buckets[key]
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def stats(self):
+        """Call counters, in-flight calls and queueing delay for monitoring"""
+        delays = sorted(self._queue_delays)
+        return {
+            **self.counters,
+            'in_flight': self._in_flight,
+            'max_concurrency': self.max_concurrency,
+            'queue_delay_avg': round(sum(delays) / len(delays), 3) if delays else 0.0,
+            'queue_delay_p95': round(delays[int(0.95 * (len(delays) - 1))], 3) if delays else 0.0,
+            'buckets': {
+                f"{model}:{kind}": round(bucket.level, 1) for (model, kind), bucket in self._buckets.items()
+            },
+        }
+
+
+def _retry_after(error):
+    """Seconds from a 429's Retry-After header, if present"""
+    try:
+        return max(0.0, float(error.response.headers.get('retry-after')))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+# Global instance
+_gateway = None
+_gateway_lock = threading.Lock()
+
+def get_groq_gateway(api_key):
+    """Get or create the shared GroqGateway"""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = GroqGateway(
+                api_key=api_key,
+                base_url=os.getenv("GROQ_BASE_URL") or None,
+                max_concurrency=int(os.getenv("GROQ_MAX_CONCURRENCY", "4")),
+                max_retries=int(os.getenv("GROQ_MAX_RETRIES", "3")),
+                timeout=float(os.getenv("GROQ_TIMEOUT", "30"))
+            )
+    return _gateway
@@ -2,32 +2,58 @@
 Groq Models Configuration and Management
 """
 
+import os
+import threading
+import time
+
 # Available Groq models (updated as of January 2025)
 AVAILABLE_MODELS = {
     "llama3-8b-8192": {
         "name": "Llama 3 8B",
         "max_tokens": 8192,
         "recommended_for": "general chat, reasoning",
+        "quality": 2,
+        "requests_per_minute": 30,
+        "tokens_per_minute": 30000,
         "active": True
     },
     "llama3-70b-8192": {
         "name": "Llama 3 70B", 
         "max_tokens": 8192,
         "recommended_for": "complex reasoning, detailed responses",
+        "quality": 3,
+        "requests_per_minute": 30,
+        "tokens_per_minute": 6000,
         "active": True
     },
     "gemma-7b-it": {
         "name": "Gemma 7B IT",
         "max_tokens": 8192,
         "recommended_for": "instruction following",
+        "quality": 1,
+        "requests_per_minute": 30,
+        "tokens_per_minute": 15000,
         "active": True
     },
     "mixtral-8x7b-32768": {
         "name": "Mixtral 8x7B",
         "max_tokens": 32768,
         "recommended_for": "long context",
+        "quality": 2,
+        "requests_per_minute": 30,
+        "tokens_per_minute": 5000,
         "active": False,  # Decommissioned
         "replacement": "llama3-8b-8192"
+    },
+    # Runs on the local CPU through transformers (models/local_llm.py), not on Groq
+    "local-cpu-instruct": {
+        "name": "Local CPU instruct model",
+        "provider": "local",
+        "hf_model": os.getenv("LOCAL_LLM_MODEL", "Qwen/Qwen2.5-0.5B-Instruct"),
+        "max_tokens": 4096,
+        "recommended_for": "offline answers when Groq is unavailable",
+        "quality": 1,
+        "active": os.getenv("LOCAL_LLM", "0") == "1"
     }
 }
 
@@ -45,11 +71,8 @@ def get_best_available_model():
             return model
     
     # Fallback to first active model
-    for model, config in AVAILABLE_MODELS.items():
-        if config.get("active", False):
-            return model
-    
-    return None
+    active = list_active_models()
+    return active[0] if active else None
 
 def get_model_max_tokens(model_name):
     """Get max tokens for a specific model"""
@@ -57,7 +80,158 @@ def get_model_max_tokens(model_name):
         return AVAILABLE_MODELS[model_name].get("max_tokens", 4096)
     return 4096  # Default fallback
 
-def list_active_models():
-    """List all currently active models"""
+def get_model_rate_limits(model_name):
+    """Get (requests per minute, tokens per minute) for a specific model"""
+    config = AVAILABLE_MODELS.get(model_name, {})
+    return config.get("requests_per_minute", 30), config.get("tokens_per_minute", 6000)
+
+def list_active_models(provider="groq"):
+    """List all currently active models of a provider"""
     return [model for model, config in AVAILABLE_MODELS.items() 
-            if config.get("active", False)]
+            if config.get("active", False) and config.get("provider", "groq") == provider]
+
+def get_local_model():
+    """Name of the active local CPU model, or None"""
+    active = list_active_models(provider="local")
+    return active[0] if active else None
+
+class ModelRouter:
+    """
+    Live routing between the active Groq models.
+
+    Keeps an exponentially weighted latency and error rate per model and a
+    circuit breaker that opens after `failure_threshold` consecutive
+    failures. An open circuit lets one probe request through after
+    `cooldown` seconds; its outcome closes or re-opens it. Requests go to
+    the fastest model with a closed circuit whose quality tier meets the
+    floor; models without measurements yet are tried in priority order.
+    """
+
+    def __init__(self, quality_floor=1, failure_threshold=3, cooldown=30.0, alpha=0.2):
+        self.quality_floor = quality_floor
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._models = {}
+
+    def _state(self, model):
+        if model not in self._models:
+            self._models[model] = {
+                'latency_ewma': None,
+                'error_rate': 0.0,
+                'requests': 0,
+                'failures': 0,
+                'rate_limited': 0,
+                'consecutive_failures': 0,
+                'circuit': 'closed',
+                'opened_at': None,
+            }
+        return self._models[model]
+
+    def choose_model(self, quality_floor=None, exclude=()):
+        """Fastest healthy active model meeting the quality floor, or None"""
+        floor = self.quality_floor if quality_floor is None else quality_floor
+        priority = get_best_available_model()
+        now = time.monotonic()
+        with self._lock:
+            candidates = []
+            for model in list_active_models():
+                if model in exclude or AVAILABLE_MODELS[model].get("quality", 1) < floor:
+                    continue
+                state = self._state(model)
+                # Open circuits (and half-open ones with a probe in flight) wait out the cooldown
+                if state['circuit'] != 'closed' and now - state['opened_at'] < self.cooldown:
+                    continue
+                candidates.append(model)
+
+            if not candidates:
+                return None
+            unmeasured = [m for m in candidates if self._models[m]['latency_ewma'] is None]
+            if unmeasured:
+                chosen = priority if priority in unmeasured else unmeasured[0]
+            else:
+                chosen = min(candidates, key=lambda m: self._models[m]['latency_ewma'])
+
+            state = self._models[chosen]
+            if state['circuit'] != 'closed':
+                # This request is the probe
+                state['circuit'] = 'half_open'
+                state['opened_at'] = now
+            return chosen
+
+    def record_success(self, model, latency):
+        with self._lock:
+            state = self._state(model)
+            state['requests'] += 1
+            state['latency_ewma'] = latency if state['latency_ewma'] is None else (
+                self.alpha * latency + (1 - self.alpha) * state['latency_ewma'])
+            state['error_rate'] *= (1 - self.alpha)
+            state['consecutive_failures'] = 0
+            state['circuit'] = 'closed'
+            state['opened_at'] = None
+
+    def record_failure(self, model, latency=None):
+        with self._lock:
+            state = self._state(model)
+            state['requests'] += 1
+            state['failures'] += 1
+            state['error_rate'] = self.alpha + (1 - self.alpha) * state['error_rate']
+            state['consecutive_failures'] += 1
+            # Slow failures (timeouts) also count against the latency estimate
+            if latency is not None and state['latency_ewma'] is not None:
+                state['latency_ewma'] = self.alpha * latency + (1 - self.alpha) * state['latency_ewma']
+            if state['circuit'] == 'half_open' or state['consecutive_failures'] >= self.failure_threshold:
+                state['circuit'] = 'open'
+                state['opened_at'] = time.monotonic()
+
+    def record_rate_limited(self, model):
+        # A 429 is our own quota running out, not an unhealthy model: it is
+        # counted but leaves the error rate, latency and circuit alone
+        with self._lock:
+            self._state(model)['rate_limited'] += 1
+
+    def stats(self):
+        """Per-model latency, error rate and circuit state"""
+        with self._lock:
+            return {
+                'quality_floor': self.quality_floor,
+                'models': {
+                    model: {
+                        'latency_ewma': None if state['latency_ewma'] is None else round(state['latency_ewma'], 3),
+                        'error_rate': round(state['error_rate'], 3),
+                        'requests': state['requests'],
+                        'failures': state['failures'],
+                        'rate_limited': state['rate_limited'],
+                        'circuit': state['circuit'],
+                    }
+                    for model, state in self._models.items()
+                },
+            }
+
+# Process-wide router shared by every Groq call
+router = ModelRouter(
+    quality_floor=int(os.getenv("GROQ_QUALITY_FLOOR", "1")),
+    failure_threshold=int(os.getenv("GROQ_CIRCUIT_FAILURES", "3")),
+    cooldown=float(os.getenv("GROQ_CIRCUIT_COOLDOWN", "30"))
+)
+
+def choose_model(quality_floor=None, exclude=()):
+    """Fastest healthy active model meeting the quality floor, or None"""
+    return router.choose_model(quality_floor, exclude)
+
+def record_success(model_name, latency):
+    """Record a completed call and its latency in seconds"""
+    router.record_success(model_name, latency)
+
+def record_failure(model_name, latency=None):
+    """Record a failed call"""
+    router.record_failure(model_name, latency)
+
+def record_rate_limited(model_name):
+    """Record a 429, which does not count toward the circuit breaker"""
+    router.record_rate_limited(model_name)
+
+def get_routing_stats():
+    """Live routing state for monitoring"""
+    return router.stats()
@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+
+class RequestHedger:
+    """
+    Hedged Groq completions for tail-latency control.
+
+    The primary request gets until the `percentile` latency of recent
+    completions to answer. After that a backup request goes to a second
+    model; whichever finishes first wins and the other is cancelled.
+    Backups are capped at `budget` times the number of requests, so the
+    average cost only grows by that fraction.
+
+    Latency is measured from the moment the gateway dispatches a call, not
+    from submit: time spent in the gateway's own rate buckets and
+    concurrency queue is self-imposed, and hedging it would only push more
+    work into the same saturated queues.
+    """
+
+    def __init__(self, gateway, percentile=95, budget=0.1, min_delay=0.5,
+                 default_delay=2.0, min_samples=20, window=200):
+        self.gateway = gateway
+        self.percentile = percentile
+        self.budget = budget
+        self.min_delay = min_delay
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.counters = {
+            'requests': 0, 'hedged': 0, 'backup_wins': 0, 'primary_wins': 0,
+            'budget_denied': 0, 'no_backup': 0,
+        }
+
+    def deadline(self):
+        """Seconds to wait for the primary before hedging"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.default_delay
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(round(self.percentile / 100 * (len(ordered) - 1))))
+        return max(self.min_delay, ordered[index])
+
+    def chat(self, model, messages, choose_backup, temperature=0.7, max_tokens=300):
+        """
+        Completion text and the model that produced it. choose_backup is
+        called only when a hedge is needed and returns a model name or None.
+        """
+        with self._lock:
+            self.counters['requests'] += 1
+        primary = self.gateway.submit(model, messages, temperature, max_tokens)
+        # No hedge while the primary is still queued locally
+        primary.dispatch.wait()
+        remaining = self.deadline() - (time.monotonic() - primary.dispatch.at)
+        done, _ = wait([primary], timeout=max(0.0, remaining))
+        if done:
+            return self._finish(primary, model)
+
+        backup_model = self._reserve_hedge(choose_backup)
+        if backup_model is None:
+            return self._finish(primary, model)
+
+        backup = self.gateway.submit(backup_model, messages, temperature, max_tokens)
+        pending = {primary: model, backup: backup_model}
+        error = None
+        while pending:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                winner_model = pending.pop(future)
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                for loser in pending:
+                    loser.cancel()
+                with self._lock:
+                    self.counters['backup_wins' if future is backup else 'primary_wins'] += 1
+                return self._finish(future, winner_model)
+        raise error
+
+    def _reserve_hedge(self, choose_backup):
+        with self._lock:
+            if self.counters['hedged'] + 1 > self.budget * self.counters['requests']:
+                self.counters['budget_denied'] += 1
+                return None
+        backup_model = choose_backup()
+        with self._lock:
+            if backup_model is None:
+                self.counters['no_backup'] += 1
+            else:
+                self.counters['hedged'] += 1
+        return backup_model
+
+    def _finish(self, future, model):
+        text = future.result()
+        with self._lock:
+            self._latencies.append(time.monotonic() - future.dispatch.at)
+        return text, model
+
+    def stats(self):
+        """Hedge counts, win rates and the current deadline"""
+        with self._lock:
+            counters = dict(self.counters)
+        hedged = counters['hedged']
+        return {
+            **counters,
+            'hedge_rate': round(hedged / counters['requests'], 4) if counters['requests'] else 0.0,
+            'backup_win_rate': round(counters['backup_wins'] / hedged, 4) if hedged else 0.0,
+            'deadline': round(self.deadline(), 3),
+            'percentile': self.percentile,
+            'budget': self.budget,
+        }
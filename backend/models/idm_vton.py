@@ -25,11 +25,15 @@ except ImportError as e:
     LOCAL_IDMVTON_AVAILABLE = False
     logger.warning(f"⚠️ Local IDM-VTON not available: {e}")
 
+from .garment_templates import GARMENT_SIZES, build_shirt_template, get_garment_template_cache
+from utils.tiered_pipeline import analysis_frame, composite, upsample_mask
+
 class IDMVTONWrapper:
     def __init__(self):
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         self.model_id = "yisol/IDM-VTON"
         self.is_initialized = False
+        self.use_local = False
         
         # Hugging Face token
         self.hf_token = os.getenv("HUGGING_FACE_TOKEN", None)
@@ -109,12 +113,23 @@ class IDMVTONWrapper:
             logger.warning(f"Error testing endpoint {endpoint}: {e}")
             return False
     
-    def create_garment_from_pattern(self, pattern_image):
-        """Create garment template from batik pattern"""
+    def create_garment_from_pattern(self, pattern_image, pattern_id=None, pattern_version=None):
+        """
+        Create garment template from batik pattern; pattern_version (the
+        pattern file's mtime, None for a rendered fallback) keys the cache
+        """
         try:
             logger.info("🎨 Creating garment template from pattern")
             
-            if self.use_local and hasattr(self, 'local_model'):
+            use_local = self.use_local and hasattr(self, 'local_model')
+            
+            # Templates for known patterns are precomputed and cached
+            if pattern_id is not None:
+                backend = 'local' if use_local else 'api'
+                template = get_garment_template_cache().get(pattern_id, backend, pattern_image, version=pattern_version)
+                return Image.fromarray(template) if use_local else template
+            
+            if use_local:
                 return self.local_model.create_garment_from_pattern(pattern_image)
             else:
                 # Fallback to simple processing for API
@@ -124,109 +139,15 @@ class IDMVTONWrapper:
             logger.error(f"❌ Error creating garment from pattern: {e}")
             return pattern_image if isinstance(pattern_image, Image.Image) else Image.fromarray(pattern_image)
     
-    def _create_shirt_shaped_garment(self, pattern):
+    def _create_shirt_shaped_garment(self, pattern, seed=0):
         """Create shirt-shaped garment from pattern"""
         try:
             # Standard shirt dimensions (aspect ratio approximately 3:4)
-            if isinstance(pattern, Image.Image):
-                pattern = np.array(pattern)
-    
-            shirt_width = 400
-            shirt_height = 600
-            
-            # Resize pattern to shirt size
-            pattern_resized = cv2.resize(pattern, (shirt_width, shirt_height))
-            
-            # Create shirt mask
-            shirt_mask = self._create_detailed_shirt_mask(shirt_height, shirt_width)
-            
-            # Apply shirt mask to pattern
-            shirt_shaped = np.zeros_like(pattern_resized)
-            for c in range(3):  # RGB channels
-                shirt_shaped[:, :, c] = pattern_resized[:, :, c] * shirt_mask
-            
-            # Add some texture and depth
-            shirt_shaped = self._add_shirt_details(shirt_shaped, shirt_mask)
-            
-            return shirt_shaped
+            return build_shirt_template(pattern, GARMENT_SIZES['api'], seed)
             
         except Exception as e:
             logger.error(f"Error creating shirt shape: {e}")
             return pattern
-    
-    def _create_detailed_shirt_mask(self, height, width):
-        """Create detailed shirt-shaped mask"""
-        mask = np.zeros((height, width), dtype=np.float32)
-        
-        # Main shirt body
-        body_top = int(height * 0.15)
-        body_bottom = int(height * 0.85)
-        body_left = int(width * 0.2)
-        body_right = int(width * 0.8)
-        
-        # Create main body rectangle
-        cv2.rectangle(mask, (body_left, body_top), (body_right, body_bottom), 1.0, -1)
-        
-        # Add sleeves
-        sleeve_top = body_top
-        sleeve_bottom = int(height * 0.45)
-        sleeve_width = int(width * 0.15)
-        
-        # Left sleeve
-        cv2.rectangle(mask, (body_left - sleeve_width, sleeve_top), 
-                     (body_left, sleeve_bottom), 1.0, -1)
-        
-        # Right sleeve  
-        cv2.rectangle(mask, (body_right, sleeve_top), 
-                     (body_right + sleeve_width, sleeve_bottom), 1.0, -1)
-        
-        # Add neck opening
-        neck_center_x = width // 2
-        neck_top = body_top
-        neck_width = int(width * 0.08)
-        neck_height = int(height * 0.06)
-        
-        cv2.ellipse(mask, (neck_center_x, neck_top), 
-                   (neck_width, neck_height), 0, 0, 180, 0.0, -1)
-        
-        # Smooth the edges
-        mask = cv2.GaussianBlur(mask, (15, 15), 5)
-        
-        return mask
-    
-    def _add_shirt_details(self, shirt, mask):
-        """Add realistic shirt details"""
-        try:
-            # Add subtle shading for depth
-            h, w = shirt.shape[:2]
-            
-            # Create lighting gradient
-            y, x = np.mgrid[0:h, 0:w]
-            center_x, center_y = w // 2, h // 3
-            
-            # Distance from light source
-            distance = np.sqrt((x - center_x)**2 + (y - center_y)**2)
-            max_distance = np.sqrt(center_x**2 + (h - center_y)**2)
-            
-            # Normalize and create gradient
-            gradient = 1 - (distance / max_distance) * 0.15
-            gradient = np.clip(gradient, 0.85, 1.15)
-            
-            # Apply gradient only where mask exists
-            detailed_shirt = shirt.astype(np.float32)
-            for c in range(3):
-                detailed_shirt[:, :, c] *= gradient
-                detailed_shirt[:, :, c] *= (mask > 0.1)  # Only apply to shirt areas
-            
-            # Add subtle texture
-            noise = np.random.normal(0, 2, shirt.shape).astype(np.float32)
-            detailed_shirt += noise * np.stack([mask, mask, mask], axis=2) * 0.3
-            
-            return np.clip(detailed_shirt, 0, 255).astype(np.uint8)
-            
-        except Exception as e:
-            logger.error(f"Error adding shirt details: {e}")
-            return shirt
 
     def apply_garment(self, person_image, garment_template):
         """Apply garment to person image"""
@@ -388,8 +309,10 @@ class IDMVTONWrapper:
             
             h, w = person_np.shape[:2]
             
-            # 1. Advanced body segmentation using color and edge detection
-            body_mask = self._advanced_body_detection(person_np)
+            # 1. Advanced body segmentation using color and edge detection,
+            # on a fixed-size analysis copy with only the mask upsampled
+            body_mask = self._advanced_body_detection(analysis_frame(person_np))
+            body_mask = upsample_mask(body_mask, person_np)
             
             # 2. Create realistic garment with perspective and wrapping
             realistic_garment = self._create_realistic_garment_v2(garment_np, (w, h), person_np)
@@ -409,9 +332,10 @@ class IDMVTONWrapper:
             logger.error(f"AI-enhanced overlay failed: {e}")
             return self._simple_overlay_v2(person_image, garment_image)
     
-    def _advanced_body_detection(self, image):
-        """Advanced body detection using multiple techniques"""
+    def _advanced_body_detection(self, frame):
+        """Advanced body detection using multiple techniques, on an analysis frame"""
         try:
+            image = frame.image
             h, w = image.shape[:2]
             
             # Method 1: Color-based skin detection
@@ -446,18 +370,18 @@ class IDMVTONWrapper:
             clothing_mask = cv2.bitwise_and(clothing_mask, cv2.bitwise_not(edges))
             
             # Morphological operations
-            kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (15, 15))
+            kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (frame.ksize(15),) * 2)
             clothing_mask = cv2.morphologyEx(clothing_mask, cv2.MORPH_CLOSE, kernel)
             clothing_mask = cv2.morphologyEx(clothing_mask, cv2.MORPH_OPEN, kernel)
             
             # Smooth the mask
-            clothing_mask = cv2.GaussianBlur(clothing_mask, (21, 21), 8)
+            clothing_mask = cv2.GaussianBlur(clothing_mask, (frame.ksize(21),) * 2, frame.px(8))
             
             return clothing_mask.astype(np.float32) / 255.0
             
         except Exception as e:
             logger.error(f"Advanced body detection failed: {e}")
-            return self._simple_shirt_mask(image.shape[:2])
+            return self._simple_shirt_mask(frame.image.shape[:2])
     
     def _create_realistic_garment_v2(self, pattern, target_size, person_image):
         """Create realistic garment with advanced techniques"""
@@ -675,43 +599,15 @@ class IDMVTONWrapper:
     def _multi_layer_blending(self, person, garment, mask):
         """Multi-layer blending for realistic integration"""
         try:
-            # Create multiple mask levels
-            mask_3d = np.stack([mask, mask, mask], axis=2)
-            
-            # Different blending modes for different areas
-            strong_mask = (mask_3d > 0.9)
-            medium_mask = (mask_3d > 0.6) & (mask_3d <= 0.9)
-            weak_mask = (mask_3d > 0.3) & (mask_3d <= 0.6)
-            edge_mask = (mask_3d > 0.1) & (mask_3d <= 0.3)
-            
-            result = person.copy().astype(np.float32)
-            garment_f = garment.astype(np.float32)
-            
-            # Layer 1: Core garment area (replace)
-            result[strong_mask] = garment_f[strong_mask]
-            
-            # Layer 2: Medium blend
-            alpha = 0.8
-            result[medium_mask] = (
-                garment_f[medium_mask] * alpha + 
-                result[medium_mask] * (1 - alpha)
-            )
-            
-            # Layer 3: Soft blend
-            alpha = 0.6
-            result[weak_mask] = (
-                garment_f[weak_mask] * alpha + 
-                result[weak_mask] * (1 - alpha)
-            )
-            
-            # Layer 4: Edge feathering
-            alpha = 0.3
-            result[edge_mask] = (
-                garment_f[edge_mask] * alpha + 
-                result[edge_mask] * (1 - alpha)
-            )
-            
-            return np.clip(result, 0, 255).astype(np.uint8)
+            # Garment weight per mask level, from edge feathering up to
+            # full replacement in the core garment area
+            alpha = np.zeros(mask.shape, dtype=np.float32)
+            alpha[mask > 0.1] = 0.3     # Layer 4: Edge feathering
+            alpha[mask > 0.3] = 0.6     # Layer 3: Soft blend
+            alpha[mask > 0.6] = 0.8     # Layer 2: Medium blend
+            alpha[mask > 0.9] = 1.0     # Layer 1: Core garment area (replace)
+            
+            return composite(person, garment, alpha)
             
         except Exception as e:
             logger.error(f"Multi-layer blending failed: {e}")
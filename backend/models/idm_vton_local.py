@@ -4,6 +4,9 @@ import logging
 from PIL import Image
 import numpy as np
 
+from .garment_templates import GARMENT_SIZES, PERSON_SIZE
+from utils.image_codec import open_image_file
+
 # Disable xformers explicitly
 os.environ["XFORMERS_DISABLED"] = "1"
 
@@ -130,8 +133,10 @@ class IDMVTONLocal:
             if pattern_image.mode != 'RGB':
                 pattern_image = pattern_image.convert('RGB')
             
-            # Resize to standard garment size
-            target_size = (512, 768)
+            # Resize to standard garment size (templates from the cache already match)
+            target_size = GARMENT_SIZES['local']
+            if pattern_image.size == target_size:
+                return pattern_image
             pattern_resized = pattern_image.resize(target_size, Image.LANCZOS)
             
             logger.info("🎨 Created garment template from batik pattern")
@@ -147,15 +152,18 @@ class IDMVTONLocal:
             if not self.is_initialized:
                 raise Exception("IDM-VTON Local not initialized")
             
-            # Preprocess person image
+            # Preprocess person image (files are decoded near the working size)
+            target_size = PERSON_SIZE
             if isinstance(person_image, str):
-                person_image = Image.open(person_image)
+                person_image = open_image_file(person_image, target_size)
             elif isinstance(person_image, np.ndarray):
                 person_image = Image.fromarray(person_image)
             
-            person_image = person_image.convert('RGB')
-            target_size = (768, 1024)
-            person_resized = person_image.resize(target_size, Image.LANCZOS)
+            if person_image.mode != 'RGB':
+                person_image = person_image.convert('RGB')
+            person_resized = person_image
+            if person_image.size != target_size:
+                person_resized = person_image.resize(target_size, Image.LANCZOS)
             
             # Preprocess garment
             garment_processed = self.create_garment_from_pattern(garment_image)
@@ -0,0 +1,107 @@
+import copy
+import importlib.util
+import os
+import threading
+import time
+
+from .groq_models import AVAILABLE_MODELS
+
+# transformers/torch are optional; checked without importing them
+LOCAL_LLM_AVAILABLE = all(importlib.util.find_spec(name) for name in ('torch', 'transformers'))
+
+
+class LocalLLMBusy(RuntimeError):
+    """The model stayed busy with other requests for longer than wait_timeout"""
+
+
+class LocalLLM:
+    """
+    Small instruction model on the CPU for offline chatbot answers.
+
+    The constant system prompt is run through the model once and its KV
+    cache kept; every request starts from a copy of that cache, so only the
+    user turn (and any history) is prefilled per chat.
+
+    Generations run one at a time. A request waits at most `wait_timeout`
+    seconds for the model and raises LocalLLMBusy otherwise, and each
+    generation stops after `max_time` seconds, so concurrent users cannot
+    stack up N generation times on request threads.
+    """
+
+    def __init__(self, model_id, system_prompt, max_new_tokens=160, threads=None,
+                 wait_timeout=2.0, max_time=10.0):
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+
+        self.torch = torch
+        self.model_id = model_id
+        self.system_prompt = system_prompt
+        self.max_new_tokens = max_new_tokens
+        self.wait_timeout = wait_timeout
+        self.max_time = max_time
+        if threads:
+            torch.set_num_threads(threads)
+
+        started = time.perf_counter()
+        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+        self.model = AutoModelForCausalLM.from_pretrained(model_id, torch_dtype=torch.float32)
+        self.model.eval()
+        # One generation at a time; the CPU is saturated by a single one anyway
+        self._lock = threading.Lock()
+
+        # Prefill the system prompt once
+        self._prefix_ids = self._encode([{"role": "system", "content": system_prompt}], add_generation_prompt=False)
+        with torch.inference_mode():
+            output = self.model(input_ids=self._prefix_ids, use_cache=True)
+        self._prefix_cache = output.past_key_values
+        print(f"✓ Local LLM {model_id} ready in {time.perf_counter() - started:.1f}s "
+              f"({self._prefix_ids.shape[1]} system prompt tokens cached)")
+
+    def _encode(self, messages, add_generation_prompt=True):
+        return self.tokenizer.apply_chat_template(
+            messages, add_generation_prompt=add_generation_prompt, return_tensors='pt'
+        )
+
+    def chat(self, messages, max_new_tokens=None):
+        """
+        Answer for chat messages whose first message is the system prompt
+        given at construction
+        """
+        if not messages or messages[0] != {"role": "system", "content": self.system_prompt}:
+            raise ValueError("messages must start with the cached system prompt")
+
+        input_ids = self._encode(messages)
+        prefix_length = self._prefix_ids.shape[1]
+        reuse = (input_ids.shape[1] > prefix_length
+                 and self.torch.equal(input_ids[0, :prefix_length], self._prefix_ids[0]))
+
+        if not self._lock.acquire(timeout=self.wait_timeout):
+            raise LocalLLMBusy(f"local model busy for more than {self.wait_timeout}s")
+        try:
+            with self.torch.inference_mode():
+                output = self.model.generate(
+                    input_ids=input_ids,
+                    attention_mask=self.torch.ones_like(input_ids),
+                    # generate() extends the cache in place, so each request gets its own copy
+                    past_key_values=copy.deepcopy(self._prefix_cache) if reuse else None,
+                    max_new_tokens=max_new_tokens or self.max_new_tokens,
+                    max_time=self.max_time,
+                    do_sample=False,
+                    pad_token_id=self.tokenizer.pad_token_id or self.tokenizer.eos_token_id
+                )
+        finally:
+            self._lock.release()
+        return self.tokenizer.decode(output[0, input_ids.shape[1]:], skip_special_tokens=True).strip()
+
+
+def create_local_llm(model_name, system_prompt):
+    """Build the LocalLLM for a local entry of AVAILABLE_MODELS"""
+    config = AVAILABLE_MODELS[model_name]
+    return LocalLLM(
+        config["hf_model"],
+        system_prompt,
+        max_new_tokens=int(os.getenv("LOCAL_LLM_MAX_NEW_TOKENS", "160")),
+        threads=int(os.getenv("LOCAL_LLM_THREADS", "0")) or None,
+        wait_timeout=float(os.getenv("LOCAL_LLM_WAIT_TIMEOUT", "2")),
+        max_time=float(os.getenv("LOCAL_LLM_MAX_TIME", "10"))
+    )
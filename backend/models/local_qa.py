@@ -0,0 +1,118 @@
+import json
+import os
+from difflib import SequenceMatcher
+
+from utils.text_index import BM25Index, tokenize
+from .motif_matcher import INTENT_KEYWORDS
+from .response_cache import STOP_WORDS
+
+TRAINING_DATA_PATHS = [
+    '../fine_tuning/batik_training_data.jsonl',
+    'fine_tuning/batik_training_data.jsonl',
+]
+
+
+def load_training_pairs(paths=None):
+    """(question, answer) pairs from the first training jsonl found"""
+    for path in paths or TRAINING_DATA_PATHS:
+        if not os.path.exists(path):
+            continue
+        pairs = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                messages = json.loads(line).get('messages', [])
+                question = next((m['content'] for m in messages if m.get('role') == 'user'), None)
+                answer = next((m['content'] for m in messages if m.get('role') == 'assistant'), None)
+                if question and answer:
+                    pairs.append((question, answer))
+        return pairs
+    return []
+
+
+class LocalQAEngine:
+    """
+    Answers questions offline from the curated fine-tuning Q/A pairs.
+
+    Questions are indexed with BM25 together with the motif and intent tags
+    the motif matcher finds in them, so "apa makna sekar kemunig" still
+    lines up with "Apa makna dari motif Sekar Kemuning?". An answer is only
+    returned when it is about the same motif as the query and both sides
+    agree: the score relative to the stored question's own score, and the
+    share of the query's IDF weight found in the stored question, must
+    pass the threshold.
+    """
+
+    def __init__(self, matcher, batik_data, paths=None, threshold=0.6):
+        self.matcher = matcher
+        self.batik_data = batik_data
+        self.threshold = threshold
+
+        pairs = load_training_pairs(paths)
+        self.answers = [answer for _, answer in pairs]
+        self._motifs = []
+        self._terms = []
+        documents = []
+        for question, _ in pairs:
+            match = matcher.match(question)
+            self._motifs.append(match.motif_ids[:1])
+            documents.append(self._tagged(question, match))
+            self._terms.append(frozenset(tokenize(documents[-1], STOP_WORDS)))
+
+        self.index = BM25Index(documents, stop_words=STOP_WORDS)
+        # A stored question scored against itself is the best any query can do
+        self._self_scores = [float(self.index.scores(doc)[i]) for i, doc in enumerate(documents)]
+
+    def __len__(self):
+        return len(self.answers)
+
+    @staticmethod
+    def _tagged(text, match):
+        tags = [f"motif_{motif_id}" for motif_id in match.motif_ids]
+        tags += [f"intent_{intent}" for intent in sorted(match.intents)]
+        return ' '.join([text] + tags)
+
+    def answer(self, query, pattern_id=None):
+        """Return (answer, confidence) for a confident match, otherwise None"""
+        if not self.answers:
+            return None
+
+        match = self.matcher.match(query)
+        if match.fuzzy:
+            # A misspelt name may be a motif outside the catalog; leave it to Groq
+            return None
+        motifs = match.motif_ids[:1]
+        text = query
+        if not motifs and pattern_id in self.batik_data:
+            # "apa maknanya?" about the selected pattern
+            motifs = (pattern_id,)
+            text = f"{query} {self.batik_data[pattern_id]['name']}"
+            match = self.matcher.match(text)
+
+        tagged = self._tagged(text, match)
+        # Words the tags already stand for ("kemunig", "bentuknya") add no extra weight
+        anchors = [word for motif_id in match.motif_ids for word in self.batik_data[motif_id]['name'].lower().split()]
+        anchors += [keyword for intent in match.intents for keyword in INTENT_KEYWORDS[intent]]
+        weights = {
+            token: self.index.idf(token) for token in tokenize(tagged, STOP_WORDS)
+            if token in self.index or not any(_resembles(token, anchor) for anchor in anchors)
+        }
+        total_weight = sum(weights.values())
+        if not total_weight:
+            return None
+
+        for index, score in self.index.search(tagged, top_k=5):
+            # General answers only for general questions, motif answers only for that motif
+            if self._motifs[index] != motifs:
+                continue
+            coverage = sum(w for token, w in weights.items() if token in self._terms[index]) / total_weight
+            confidence = min(score / self._self_scores[index] if self._self_scores[index] else 0.0, coverage)
+            if confidence >= self.threshold:
+                return self.answers[index], round(min(confidence, 1.0), 3)
+            return None
+        return None
+
+
+def _resembles(token, anchor):
+    return token.startswith(anchor) or SequenceMatcher(None, token, anchor).ratio() >= 0.8
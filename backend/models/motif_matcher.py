@@ -0,0 +1,289 @@
+"""
+Query routing for the batik chatbot.
+
+Motif aliases and intent keywords are compiled once into an Aho-Corasick
+automaton, so a single pass over the query finds every exact hit. Motif
+names that are not found exactly are looked up in a trigram index to
+catch typos such as "kemunig".
+"""
+
+import re
+from collections import Counter, deque, defaultdict, namedtuple
+from difflib import SequenceMatcher
+from itertools import chain
+
+# Intent keywords, checked as substrings like the original keyword lists
+INTENT_KEYWORDS = {
+    'definition': ['apa itu', 'what is', 'jelaskan', 'ceritakan'],
+    'meaning': ['makna', 'filosofi', 'arti', 'meaning'],
+    'visual': ['visual', 'bentuk', 'gambar', 'tampilan'],
+    'history': ['sejarah', 'asal usul', 'history', 'origin'],
+    'count': ['berapa', 'jumlah', 'how many'],
+    'list': ['daftar'],
+    'greeting': ['halo', 'hai', 'hello', 'hi', 'selamat', 'terima kasih', 'thanks'],
+}
+
+# Words that make a query batik-related on their own
+DOMAIN_KEYWORDS = [
+    'batik', 'nitik', 'motif', 'sekar', 'pattern', 'tradisional',
+    'yogyakarta', 'jawa', 'filosofi', 'makna', 'ceplok', 'kawung'
+]
+
+# Greetings that are accepted even without a batik keyword
+ACCEPTED_GREETINGS = ['halo', 'hai', 'hello', 'selamat', 'terima kasih', 'thanks']
+
+# Keywords this short only count as whole words ("hi" must not match "pilihan")
+WHOLE_WORD_MAX_LENGTH = 3
+
+# Words too common across motif names to identify a motif by themselves
+GENERIC_NAME_WORDS = frozenset(['sekar', 'nitik', 'batik', 'motif'])
+
+# Similarity the distinctive part of a fuzzily matched name must reach
+DISTINCTIVE_MIN_RATIO = 0.8
+
+# Question, pronoun and filler words a referential follow-up ("lalu
+# maknanya?", "kenapa begitu?") is made of; any other word is content
+FOLLOW_UP_WORDS = frozenset([
+    'apa', 'apakah', 'kenapa', 'mengapa', 'bagaimana', 'gimana', 'kapan', 'mana', 'siapa',
+    'lalu', 'terus', 'trus', 'kalau', 'kalo', 'jadi', 'lagi', 'juga', 'lebih', 'lanjut',
+    'detail', 'contoh', 'contohnya', 'maksud', 'itu', 'ini', 'tersebut', 'begitu', 'gitu',
+    'dia', 'ia', 'yang', 'dan', 'atau', 'dari', 'di', 'ke', 'untuk', 'dengan', 'nya',
+    'sih', 'dong', 'ya', 'kah', 'deh', 'nih', 'tolong', 'coba', 'saya', 'aku', 'bisa', 'mau',
+    'why', 'how', 'what', 'more', 'it', 'that', 'this', 'and', 'then', 'so', 'tell', 'me',
+    'about', 'the', 'is',
+])
+FOLLOW_UP_MAX_WORDS = 6
+
+MotifMatch = namedtuple('MotifMatch', [
+    'motif_ids',        # matched motif ids, in order of appearance
+    'intents',          # frozenset of detected intents
+    'keywords',         # frozenset of domain keywords found
+    'is_batik_related',
+    'fuzzy',            # True when motifs were found through the trigram index
+])
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher built once, matching in one pass"""
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        for pattern, value in patterns:
+            state = 0
+            for char in pattern:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._output[state].append((pattern, value))
+
+        # Breadth-first construction of failure links
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                if self._fail[child] == child:
+                    self._fail[child] = 0
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find(self, text):
+        """Yield (start, pattern, value) for every occurrence in text"""
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for pattern, value in self._output[state]:
+                yield index - len(pattern) + 1, pattern, value
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class MotifMatcher:
+    """Finds motifs and intents in a chatbot query in one pass"""
+
+    def __init__(self, batik_data, fuzzy_threshold=0.7):
+        self.fuzzy_threshold = fuzzy_threshold
+        aliases = self._build_aliases(batik_data)
+
+        patterns = [(alias, ('motif', motif_id)) for alias, motif_id in aliases.items()]
+        for intent, keywords in INTENT_KEYWORDS.items():
+            patterns += [(keyword, ('intent', intent)) for keyword in keywords]
+        patterns += [(keyword, ('domain', keyword)) for keyword in DOMAIN_KEYWORDS]
+        patterns += [(greeting, ('accepted_greeting', greeting)) for greeting in ACCEPTED_GREETINGS]
+        self._automaton = AhoCorasick(patterns)
+        self._vocabulary = frozenset(word for pattern, _ in patterns for word in pattern.split())
+        self._follow_up_words = FOLLOW_UP_WORDS | frozenset(
+            word for intent, keywords in INTENT_KEYWORDS.items() if intent != 'greeting'
+            for keyword in keywords for word in keyword.split()
+        )
+
+        # Trigram index over multi-character aliases for typo tolerance
+        self._alias_list = list(aliases.items())
+        self._alias_trigrams = []
+        self._trigram_index = defaultdict(list)
+        for position, (alias, _) in enumerate(self._alias_list):
+            grams = _trigrams(alias)
+            self._alias_trigrams.append(len(grams))
+            for gram in grams:
+                self._trigram_index[gram].append(position)
+
+        # Distinctive part of each motif name ("jagung" for Sekar Jagung);
+        # a fuzzy hit must also resemble that part on its own
+        self._distinctive_names = {
+            motif_id: _distinctive(info['name'].lower())
+            for motif_id, info in batik_data.items()
+        }
+
+    @staticmethod
+    def _build_aliases(batik_data):
+        """Every spelling a motif may appear under, mapped to its id"""
+        aliases = {}
+        word_owners = defaultdict(set)
+        for motif_id, info in batik_data.items():
+            name = info['name'].lower()
+            for alias in (name, motif_id.lower(), motif_id.replace('_', ' ').lower(),
+                          motif_id.replace('_', '').lower(), name.replace(' ', '')):
+                aliases.setdefault(alias, motif_id)
+            for word in name.split():
+                word_owners[word].add(motif_id)
+
+        # Distinctive single words ("kemuning") identify a motif on their own
+        for word, owners in word_owners.items():
+            if len(owners) == 1 and len(word) >= 5 and word not in GENERIC_NAME_WORDS:
+                aliases.setdefault(word, next(iter(owners)))
+        return aliases
+
+    def match(self, query):
+        """Return the motifs, intents and domain keywords found in query"""
+        text = query.lower()
+        motifs = {}
+        intents = set()
+        keywords = set()
+        accepted_greeting = False
+
+        for start, pattern, (kind, value) in self._automaton.find(text):
+            if len(pattern) <= WHOLE_WORD_MAX_LENGTH and not _is_whole_word(text, start, len(pattern)):
+                continue
+            if kind == 'motif':
+                motifs.setdefault(value, start)
+            elif kind == 'intent':
+                intents.add(value)
+            elif kind == 'domain':
+                keywords.add(value)
+            else:
+                accepted_greeting = True
+
+        fuzzy = False
+        if not motifs:
+            motifs = self._fuzzy_motifs(text)
+            fuzzy = bool(motifs)
+
+        # "terima kasih, apa makna kawung?" is a motif question, not a greeting
+        if 'greeting' in intents and (motifs or len(intents) > 1):
+            intents.discard('greeting')
+
+        motif_ids = tuple(sorted(motifs, key=motifs.get))
+        return MotifMatch(
+            motif_ids=motif_ids,
+            intents=frozenset(intents),
+            keywords=frozenset(keywords),
+            is_batik_related=bool(keywords or motif_ids or accepted_greeting),
+            fuzzy=fuzzy,
+        )
+
+    def is_follow_up(self, query):
+        """
+        True for a short query made only of question, pronoun and intent
+        words ("lalu maknanya?"), which can only refer back to the topic
+        already under discussion
+        """
+        words = re.findall(r"\w+", query.lower())
+        if not words or len(words) > FOLLOW_UP_MAX_WORDS:
+            return False
+        for word in words:
+            # "-nya" refers back: "maknanya", "bentuknya"
+            stem = word[:-3] if word.endswith('nya') else word
+            if word not in self._follow_up_words and stem not in self._follow_up_words:
+                return False
+        return True
+
+    def _fuzzy_motifs(self, text):
+        """Motifs whose alias is within trigram distance of a query word or phrase"""
+        words = re.findall(r"\w+", text)
+        # Only phrases containing an unfamiliar word can hide a misspelt motif
+        unknown = [len(word) >= 4 and word not in self._vocabulary for word in words]
+        covered = [False] * len(words)
+        found = {}
+        for length in (3, 2, 1):
+            for start in range(len(words) - length + 1):
+                span = range(start, start + length)
+                if not any(unknown[i] for i in span) or any(covered[i] for i in span):
+                    continue
+                phrase_words = words[start:start + length]
+                for candidate in dict.fromkeys((' '.join(phrase_words), ''.join(phrase_words))):
+                    motif_id = self._closest_alias(candidate)
+                    if motif_id is not None:
+                        found.setdefault(motif_id, start)
+                        for i in span:
+                            covered[i] = True
+                        break
+        return found
+
+    def _closest_alias(self, candidate):
+        grams = _trigrams(candidate)
+        shared = Counter(chain.from_iterable(self._trigram_index.get(gram, ()) for gram in grams))
+
+        scored = []
+        for position, count in shared.items():
+            score = 2.0 * count / (len(grams) + self._alias_trigrams[position])
+            if score >= self.fuzzy_threshold:
+                scored.append((score, self._alias_list[position][1]))
+        if not scored:
+            return None
+
+        # Shared generic words ("sekar") must not carry the score: "sekar
+        # jagad" is close to "sekar jagung" overall but "jagad" is not "jagung"
+        distinctive = _distinctive(candidate)
+        if not distinctive:
+            return None
+        for score, motif_id in sorted(scored, reverse=True):
+            if SequenceMatcher(None, distinctive, self._distinctive_names[motif_id]).ratio() >= DISTINCTIVE_MIN_RATIO:
+                return motif_id
+        return None
+
+
+def _distinctive(text):
+    """text without generic name words, also where they are glued on ("sekarjagad")"""
+    words = []
+    for word in text.split():
+        if word in GENERIC_NAME_WORDS:
+            continue
+        for generic in GENERIC_NAME_WORDS:
+            if word.startswith(generic):
+                word = word[len(generic):]
+            elif word.endswith(generic):
+                word = word[:-len(generic)]
+        if word:
+            words.append(word)
+    return ' '.join(words)
+
+
+def _is_whole_word(text, start, length):
+    end = start + length
+    before = text[start - 1] if start > 0 else ' '
+    after = text[end] if end < len(text) else ' '
+    return not before.isalnum() and not after.isalnum()
@@ -0,0 +1,105 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """
+    Lazily constructed, process-wide model instances.
+
+    Each model is loaded at most once: concurrent first callers wait on the
+    same load instead of starting their own. Load state and timings are kept
+    for the readiness endpoint.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def register(self, name, loader, required=True):
+        """Register a zero-argument loader under name"""
+        with self._lock:
+            self._entries[name] = {
+                'loader': loader,
+                'required': required,
+                'lock': threading.Lock(),
+                'instance': None,
+                'state': 'not_loaded',
+                'load_seconds': None,
+                'error': None,
+            }
+
+    def get(self, name):
+        """Return the model, loading it on first use"""
+        entry = self._entries[name]
+        if entry['state'] == 'ready':
+            return entry['instance']
+
+        with entry['lock']:
+            # Another thread may have finished the load while we waited
+            if entry['state'] == 'ready':
+                return entry['instance']
+
+            entry['state'] = 'loading'
+            logger.info(f"🔄 Loading model '{name}'...")
+            started = time.perf_counter()
+            try:
+                instance = entry['loader']()
+            except Exception as e:
+                entry['state'] = 'failed'
+                entry['error'] = str(e)
+                entry['load_seconds'] = round(time.perf_counter() - started, 3)
+                logger.error(f"❌ Failed to load model '{name}': {e}")
+                raise
+
+            entry['instance'] = instance
+            entry['error'] = None
+            entry['load_seconds'] = round(time.perf_counter() - started, 3)
+            entry['state'] = 'ready'
+            logger.info(f"✅ Model '{name}' ready in {entry['load_seconds']}s")
+            return instance
+
+    def warm_up(self, names=None, background=True):
+        """Load the given models (all by default), optionally in a background thread"""
+        names = [name for name in (names if names is not None else list(self._entries))
+                 if name in self._entries]
+
+        def load_all():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception:
+                    # Already recorded in the status; the next get() retries
+                    pass
+
+        if not background:
+            load_all()
+            return None
+
+        thread = threading.Thread(target=load_all, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def is_ready(self, name):
+        entry = self._entries.get(name)
+        return entry is not None and entry['state'] == 'ready'
+
+    def status(self):
+        """Per-model state, load time and last error"""
+        return {
+            name: {
+                'state': entry['state'],
+                'required': entry['required'],
+                'load_seconds': entry['load_seconds'],
+                'error': entry['error'],
+            }
+            for name, entry in self._entries.items()
+        }
+
+    def all_required_ready(self):
+        return all(
+            entry['state'] == 'ready'
+            for entry in self._entries.values() if entry['required']
+        )
@@ -0,0 +1,104 @@
+import re
+import threading
+
+import numpy as np
+
+from utils.ttl_cache import TTLCache
+
+# Filler words that do not change what is being asked
+STOP_WORDS = frozenset([
+    'apa', 'itu', 'yang', 'dari', 'dan', 'di', 'ke', 'adalah', 'ini', 'tentang',
+    'dong', 'sih', 'ya', 'yah', 'kah', 'nya', 'tolong', 'mohon', 'coba', 'saya', 'aku',
+    'mau', 'ingin', 'tahu', 'bisa', 'kamu', 'anda', 'deh', 'nih', 'kak', 'min',
+    'the', 'a', 'an', 'of', 'is', 'what', 'about', 'please', 'me', 'tell',
+])
+
+_PUNCTUATION = re.compile(r"[^\w\s]+", re.UNICODE)
+
+
+def normalize_query(query):
+    """Lowercase, strip punctuation and stop words, collapse whitespace"""
+    words = _PUNCTUATION.sub(' ', query.lower()).split()
+    kept = [word for word in words if word not in STOP_WORDS]
+    # A query made only of stop words still needs a distinct key
+    return ' '.join(kept or words)
+
+
+class ChatResponseCache:
+    """
+    Cache of chatbot answers keyed by (normalized query, pattern_id).
+
+    With a sentence-embedding model configured, a miss falls back to the
+    most similar cached question for the same pattern_id above a cosine
+    threshold, so paraphrases are answered from the cache too.
+    """
+
+    def __init__(self, max_entries=1024, ttl=3600, semantic_model=None, semantic_threshold=0.92):
+        self._answers = TTLCache(max_entries=max_entries, ttl=ttl)
+        self.semantic_threshold = semantic_threshold
+        self._encoder = self._load_encoder(semantic_model) if semantic_model else None
+        self._lock = threading.Lock()
+        self._vectors = {}      # cache key -> unit embedding
+        self.semantic_hits = 0
+
+    def _load_encoder(self, model_name):
+        try:
+            from sentence_transformers import SentenceTransformer
+            encoder = SentenceTransformer(model_name, device='cpu')
+            print(f"✓ Semantic chat cache using {model_name}")
+            return encoder
+        except Exception as e:
+            print(f"⚠ Semantic chat cache disabled: {e}")
+            return None
+
+    @staticmethod
+    def key(query, pattern_id):
+        return (normalize_query(query), pattern_id or None)
+
+    def get(self, query, pattern_id=None):
+        """Cached answer for the query, or None"""
+        key = self.key(query, pattern_id)
+        answer = self._answers.get(key)
+        if answer is not None or self._encoder is None:
+            return answer
+        return self._semantic_get(key)
+
+    def set(self, query, pattern_id, answer):
+        key = self.key(query, pattern_id)
+        self._answers.set(key, answer)
+        if self._encoder is not None:
+            vector = self._embed(key[0])
+            with self._lock:
+                self._vectors[key] = vector
+                # Forget vectors whose answers were evicted or expired
+                if len(self._vectors) > 2 * self._answers.max_entries:
+                    live = {k for k, _ in self._answers.items()}
+                    self._vectors = {k: v for k, v in self._vectors.items() if k in live}
+
+    def _embed(self, text):
+        vector = self._encoder.encode([text], normalize_embeddings=True)[0]
+        return np.asarray(vector, dtype=np.float32)
+
+    def _semantic_get(self, key):
+        with self._lock:
+            candidates = [(k, v) for k, v in self._vectors.items() if k[1] == key[1]]
+        if not candidates:
+            return None
+
+        keys, vectors = zip(*candidates)
+        similarities = np.stack(vectors) @ self._embed(key[0])
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.semantic_threshold:
+            return None
+
+        answer = self._answers.get(keys[best])
+        if answer is not None:
+            with self._lock:
+                self.semantic_hits += 1
+        return answer
+
+    def stats(self):
+        stats = self._answers.stats()
+        stats['semantic'] = self._encoder is not None
+        stats['semantic_hits'] = self.semantic_hits
+        return stats
@@ -3,6 +3,8 @@ import numpy as np
 from PIL import Image
 import mediapipe as mp
 
+from utils.tiered_pipeline import analysis_frame, composite, upsample_mask
+
 class VirtualFitting:
     def __init__(self):
         # Initialize MediaPipe solutions
@@ -30,13 +32,19 @@ class VirtualFitting:
         if pattern_img is None:
             raise ValueError(f"Could not load pattern from {pattern_path}")
         
+        # Segmentation and clothing detection run on a fixed-size analysis copy
+        frame = analysis_frame(user_img)
+        
         # Get person segmentation
-        img_rgb = cv2.cvtColor(user_img, cv2.COLOR_BGR2RGB)
+        img_rgb = cv2.cvtColor(frame.image, cv2.COLOR_BGR2RGB)
         segmentation_results = self.selfie_segmentation.process(img_rgb)
         person_mask = segmentation_results.segmentation_mask
         
         # Detect clothing region using color-based segmentation
-        clothing_mask = self._detect_clothing_region(user_img, person_mask, pose_landmarks)
+        clothing_mask = self._detect_clothing_region(frame, person_mask, pose_landmarks)
+        
+        # Only the final mask is brought back to full resolution
+        clothing_mask = upsample_mask(clothing_mask, user_img, bgr=True)
         
         # Apply pattern to clothing
         result = self._apply_pattern_to_clothing(user_img, pattern_img, clothing_mask, pose_landmarks)
@@ -44,10 +52,13 @@ class VirtualFitting:
         # Convert back to PIL
         return Image.fromarray(cv2.cvtColor(result, cv2.COLOR_BGR2RGB))
     
-    def _detect_clothing_region(self, image, person_mask, pose_landmarks):
+    def _detect_clothing_region(self, frame, person_mask, pose_landmarks):
         """
         Detect clothing region using color segmentation and pose landmarks
+        on the analysis frame; pixel constants are rescaled with frame.px
         """
+        image = frame.image
+        px = frame.px
         height, width = image.shape[:2]
         
         # Convert pose landmarks to pixel coordinates
@@ -62,24 +73,24 @@ class VirtualFitting:
         right_hip = to_pixels(pose_landmarks['right_hip'])
         
         # Define region of interest (torso area)
-        roi_top = max(0, min(left_shoulder[1], right_shoulder[1]) - 20)
-        roi_bottom = min(height, max(left_hip[1], right_hip[1]) + 40)
-        roi_left = max(0, min(left_shoulder[0], left_hip[0]) - 40)
-        roi_right = min(width, max(right_shoulder[0], right_hip[0]) + 40)
+        roi_top = max(0, min(left_shoulder[1], right_shoulder[1]) - px(20))
+        roi_bottom = min(height, max(left_hip[1], right_hip[1]) + px(40))
+        roi_left = max(0, min(left_shoulder[0], left_hip[0]) - px(40))
+        roi_right = min(width, max(right_shoulder[0], right_hip[0]) + px(40))
         
         # Create base mask for torso area
         torso_mask = np.zeros((height, width), dtype=np.uint8)
         
         # Define torso polygon
         torso_points = np.array([
-            [left_shoulder[0], left_shoulder[1] - 10],
-            [left_shoulder[0] - 20, left_shoulder[1] + 20],
-            [left_hip[0] - 20, left_hip[1]],
-            [left_hip[0], left_hip[1] + 20],
-            [right_hip[0], right_hip[1] + 20],
-            [right_hip[0] + 20, right_hip[1]],
-            [right_shoulder[0] + 20, right_shoulder[1] + 20],
-            [right_shoulder[0], right_shoulder[1] - 10]
+            [left_shoulder[0], left_shoulder[1] - px(10)],
+            [left_shoulder[0] - px(20), left_shoulder[1] + px(20)],
+            [left_hip[0] - px(20), left_hip[1]],
+            [left_hip[0], left_hip[1] + px(20)],
+            [right_hip[0], right_hip[1] + px(20)],
+            [right_hip[0] + px(20), right_hip[1]],
+            [right_shoulder[0] + px(20), right_shoulder[1] + px(20)],
+            [right_shoulder[0], right_shoulder[1] - px(10)]
         ], dtype=np.int32)
         
         cv2.fillPoly(torso_mask, [torso_points], 255)
@@ -100,7 +111,7 @@ class VirtualFitting:
         clothing_roi = cv2.bitwise_not(skin_mask)
         
         # Apply morphological operations to clean up
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (15, 15))
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (frame.ksize(15),) * 2)
         clothing_roi = cv2.morphologyEx(clothing_roi, cv2.MORPH_CLOSE, kernel)
         clothing_roi = cv2.morphologyEx(clothing_roi, cv2.MORPH_OPEN, kernel)
         
@@ -113,7 +124,7 @@ class VirtualFitting:
         clothing_mask = cv2.bitwise_and(clothing_mask, (person_mask * 255).astype(np.uint8))
         
         # Smooth the mask
-        clothing_mask = cv2.GaussianBlur(clothing_mask, (21, 21), 10)
+        clothing_mask = cv2.GaussianBlur(clothing_mask, (frame.ksize(21),) * 2, px(10))
         
         return clothing_mask.astype(np.float32) / 255.0
     
@@ -173,11 +184,7 @@ class VirtualFitting:
         
         # Ensure dimensions match
         if clothing_region.shape[:2] == pattern_warped.shape[:2]:
-            for c in range(3):
-                result[y:y+h, x:x+w, c] = (
-                    image[y:y+h, x:x+w, c] * (1 - clothing_region) +
-                    pattern_warped[:, :, c] * clothing_region
-                )
+            result[y:y+h, x:x+w] = composite(image[y:y+h, x:x+w], pattern_warped, clothing_region)
         
         # Apply color matching to blend better
         result = self._match_colors(result, image, clothing_mask)
@@ -189,21 +196,19 @@ class VirtualFitting:
         Match the color tone of the pattern to the original image
         """
         # Calculate mean colors in clothing area
-        mask_bool = mask > 0.5
+        mask_bool = (mask > 0.5).astype(np.uint8)
         
-        if np.sum(mask_bool) > 0:
+        if cv2.countNonZero(mask_bool) > 0:
             # Get average color of original clothing
-            original_mean = np.mean(original[mask_bool], axis=0)
-            result_mean = np.mean(result[mask_bool], axis=0)
+            original_mean = np.array(cv2.mean(original, mask=mask_bool)[:3])
+            result_mean = np.array(cv2.mean(result, mask=mask_bool)[:3])
             
             # Calculate color shift
             color_shift = original_mean - result_mean
             
-            # Apply subtle color matching
-            mask_3d = np.stack([mask, mask, mask], axis=2)
-            result = result.astype(np.float32)
-            result += mask_3d * color_shift * 0.3  # Apply 30% color matching
-            result = np.clip(result, 0, 255).astype(np.uint8)
+            # Apply subtle color matching (30%), saturating at 0 and 255
+            offset = cv2.merge([mask * np.float32(shift * 0.3) for shift in color_shift])
+            result = cv2.add(result, offset, dtype=cv2.CV_8U)
         
         return result
     
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Tests import the backend the way app.py does (models.*, utils.*), from backend/
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
@@ -0,0 +1,169 @@
+"""Groq gateway, model router and hedger against benchmarks.fake_groq"""
+
+import time
+
+import pytest
+from groq import InternalServerError, RateLimitError
+
+from benchmarks.fake_groq import FakeGroqConfig, start_fake_groq
+from models import groq_client, groq_models
+from models.groq_client import GroqGateway
+from models.groq_models import ModelRouter
+from models.hedging import RequestHedger
+
+MESSAGES = [{"role": "user", "content": "Apa makna motif kawung?"}]
+
+
+@pytest.fixture
+def fake_groq():
+    server = start_fake_groq(config=FakeGroqConfig(latency=0.02, jitter=0.0))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def router(monkeypatch):
+    # A fresh router per test; the gateway reports to the module-level one
+    router = ModelRouter(failure_threshold=3, cooldown=0.2)
+    monkeypatch.setattr(groq_models, 'router', router)
+    return router
+
+
+@pytest.fixture(autouse=True)
+def fast_buckets(monkeypatch):
+    # Free-tier limits would make a 429-emptied bucket take seconds to refill
+    monkeypatch.setattr(groq_client, 'get_model_rate_limits', lambda model: (6000, 1_000_000))
+
+
+def gateway_for(server, **options):
+    options.setdefault('base_delay', 0.01)
+    return GroqGateway(api_key="test-key", base_url=server.base_url, **options)
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_completion_round_trip(fake_groq, router):
+    gateway = gateway_for(fake_groq)
+    text = gateway.chat('llama3-8b-8192', MESSAGES)
+
+    assert text.startswith("Jawaban uji")
+    assert router.stats()['models']['llama3-8b-8192']['circuit'] == 'closed'
+
+
+def test_rate_limits_are_retried_after_retry_after(fake_groq, router):
+    fake_groq.config.rate_limit_rate = 1.0
+    fake_groq.config.retry_after = 0.05
+    gateway = gateway_for(fake_groq, max_retries=2)
+
+    started = time.monotonic()
+    with pytest.raises(RateLimitError):
+        gateway.chat('llama3-8b-8192', MESSAGES)
+
+    assert fake_groq.stats()['rate_limited'] == 3
+    assert gateway.stats()['rate_limited'] == 2
+    # Each retry waited at least the Retry-After time
+    assert time.monotonic() - started >= 2 * 0.05
+
+
+def test_rate_limits_do_not_open_the_circuit(fake_groq, router):
+    fake_groq.config.rate_limit_rate = 1.0
+    fake_groq.config.retry_after = 0.0
+    gateway = gateway_for(fake_groq, max_retries=5)
+
+    with pytest.raises(RateLimitError):
+        gateway.chat('llama3-8b-8192', MESSAGES)
+
+    state = router.stats()['models']['llama3-8b-8192']
+    assert state['rate_limited'] == 6
+    assert state['failures'] == 0
+    assert state['circuit'] == 'closed'
+
+
+def test_server_errors_open_the_circuit_and_a_probe_closes_it(fake_groq, router):
+    fake_groq.config.error_rate = 1.0
+    gateway = gateway_for(fake_groq, max_retries=2)
+
+    with pytest.raises(InternalServerError):
+        gateway.chat('llama3-8b-8192', MESSAGES)
+    assert router.stats()['models']['llama3-8b-8192']['circuit'] == 'open'
+    assert 'llama3-8b-8192' not in [router.choose_model() for _ in range(3)]
+
+    # After the cooldown one request is let through as the probe
+    time.sleep(0.25)
+    assert router.choose_model(exclude=('llama3-70b-8192', 'gemma-7b-it')) == 'llama3-8b-8192'
+    assert router.stats()['models']['llama3-8b-8192']['circuit'] == 'half_open'
+    assert router.choose_model(exclude=('llama3-70b-8192', 'gemma-7b-it')) is None
+
+    fake_groq.config.error_rate = 0.0
+    gateway.chat('llama3-8b-8192', MESSAGES)
+    assert router.stats()['models']['llama3-8b-8192']['circuit'] == 'closed'
+
+
+def test_failed_probe_reopens_the_circuit(fake_groq, router):
+    fake_groq.config.error_rate = 1.0
+    gateway = gateway_for(fake_groq, max_retries=2)
+    with pytest.raises(InternalServerError):
+        gateway.chat('llama3-8b-8192', MESSAGES)
+
+    time.sleep(0.25)
+    router.choose_model(exclude=('llama3-70b-8192', 'gemma-7b-it'))
+    gateway.max_retries = 0
+    with pytest.raises(InternalServerError):
+        gateway.chat('llama3-8b-8192', MESSAGES)
+    assert router.stats()['models']['llama3-8b-8192']['circuit'] == 'open'
+
+
+def test_hedge_wins_and_cancels_the_stalled_primary(fake_groq, router):
+    fake_groq.config.stall_rate = 1.0
+    fake_groq.config.stall_latency = 2.0
+    gateway = gateway_for(fake_groq)
+    hedger = RequestHedger(gateway, budget=1.0, default_delay=0.1)
+
+    def choose_backup():
+        # Only the primary stalls
+        fake_groq.config.stall_rate = 0.0
+        return 'llama3-70b-8192'
+
+    started = time.monotonic()
+    text, model = hedger.chat('llama3-8b-8192', MESSAGES, choose_backup)
+
+    assert model == 'llama3-70b-8192'
+    assert text.startswith("Jawaban uji")
+    assert time.monotonic() - started < 1.0
+    assert hedger.stats()['backup_wins'] == 1
+    # The cancelled primary gave its concurrency slot back
+    assert wait_until(lambda: gateway.stats()['in_flight'] == 0)
+
+
+def test_no_hedge_while_the_primary_is_queued_locally(fake_groq, router):
+    fake_groq.config.latency = 0.15
+    gateway = gateway_for(fake_groq, max_concurrency=1)
+    hedger = RequestHedger(gateway, budget=1.0, default_delay=0.25)
+
+    # Occupy the only slot so the hedged request waits in the gateway first
+    blocker = gateway.submit('llama3-8b-8192', MESSAGES)
+    text, model = hedger.chat('llama3-8b-8192', MESSAGES, lambda: 'llama3-70b-8192')
+    blocker.result()
+
+    assert model == 'llama3-8b-8192'
+    assert hedger.stats()['hedged'] == 0
+
+
+def test_hedges_stay_within_budget(fake_groq, router):
+    fake_groq.config.stall_rate = 1.0
+    fake_groq.config.stall_latency = 0.2
+    gateway = gateway_for(fake_groq)
+    hedger = RequestHedger(gateway, budget=0.0, default_delay=0.05)
+
+    text, model = hedger.chat('llama3-8b-8192', MESSAGES, lambda: 'llama3-70b-8192')
+
+    assert model == 'llama3-8b-8192'
+    assert hedger.stats()['budget_denied'] == 1
@@ -0,0 +1,142 @@
+"""
+LocalLLM with stand-ins for torch and transformers.
+
+numpy arrays play the tensors; the fake model extends whatever KV cache it
+is given in place, as transformers' generate() does, so the tests can see
+whether the cached system prompt prefix survives requests.
+"""
+
+import contextlib
+import sys
+import threading
+import time
+import types
+
+import numpy as np
+import pytest
+
+from models.local_llm import LocalLLM, LocalLLMBusy
+
+SYSTEM_PROMPT = "Anda adalah asisten batik."
+GENERATION_PROMPT = 1
+
+
+class FakeTokenizer:
+    pad_token_id = 0
+    eos_token_id = 2
+
+    def apply_chat_template(self, messages, add_generation_prompt=True, return_tensors=None):
+        ids = []
+        for message in messages:
+            ids += [3 if message['role'] == 'system' else 4] + [ord(char) for char in message['content']]
+        if add_generation_prompt:
+            ids.append(GENERATION_PROMPT)
+        return np.array([ids])
+
+    def decode(self, ids, skip_special_tokens=True):
+        return ''.join(chr(i) for i in ids)
+
+
+class FakeCache:
+    def __init__(self, tokens):
+        self.tokens = list(tokens)
+
+
+class FakeModel:
+    def __init__(self, reply="ok", block=None):
+        self.reply = reply
+        self.block = block
+        self.calls = []
+
+    def eval(self):
+        return self
+
+    def __call__(self, input_ids, use_cache=True):
+        return types.SimpleNamespace(past_key_values=FakeCache(input_ids[0]))
+
+    def generate(self, input_ids, attention_mask, past_key_values, max_new_tokens, max_time,
+                 do_sample, pad_token_id):
+        if self.block is not None:
+            self.block.wait()
+        self.calls.append({'cache': past_key_values, 'cache_tokens': None if past_key_values is None
+                           else list(past_key_values.tokens), 'max_time': max_time})
+        new_ids = [ord(char) for char in self.reply]
+        if past_key_values is not None:
+            # generate() appends to the cache it was handed
+            past_key_values.tokens.extend(list(input_ids[0][len(past_key_values.tokens):]) + new_ids)
+        return np.array([list(input_ids[0]) + new_ids])
+
+
+@pytest.fixture
+def fake_stack(monkeypatch):
+    model = FakeModel()
+    torch = types.SimpleNamespace(
+        float32='float32',
+        set_num_threads=lambda n: None,
+        inference_mode=contextlib.nullcontext,
+        equal=np.array_equal,
+        ones_like=np.ones_like,
+    )
+    transformers = types.SimpleNamespace(
+        AutoTokenizer=types.SimpleNamespace(from_pretrained=lambda model_id: FakeTokenizer()),
+        AutoModelForCausalLM=types.SimpleNamespace(from_pretrained=lambda model_id, torch_dtype=None: model),
+    )
+    monkeypatch.setitem(sys.modules, 'torch', torch)
+    monkeypatch.setitem(sys.modules, 'transformers', transformers)
+    return model
+
+
+def chat_messages(question):
+    return [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": question}]
+
+
+def test_generate_starts_from_a_copy_of_the_system_prompt_cache(fake_stack):
+    llm = LocalLLM("fake/model", SYSTEM_PROMPT, max_time=5.0)
+    prefix_tokens = list(llm._prefix_cache.tokens)
+
+    assert llm.chat(chat_messages("apa itu kawung?")) == "ok"
+    assert llm.chat(chat_messages("apa makna truntum?")) == "ok"
+
+    for call in fake_stack.calls:
+        # Each request gets the prefilled prefix, in its own copy
+        assert call['cache'] is not llm._prefix_cache
+        assert call['cache_tokens'] == prefix_tokens
+        assert call['max_time'] == 5.0
+    assert llm._prefix_cache.tokens == prefix_tokens
+
+
+def test_messages_must_start_with_the_cached_system_prompt(fake_stack):
+    llm = LocalLLM("fake/model", SYSTEM_PROMPT)
+    with pytest.raises(ValueError):
+        llm.chat([{"role": "system", "content": "other"}, {"role": "user", "content": "hai"}])
+
+
+def test_busy_model_raises_after_wait_timeout(fake_stack):
+    llm = LocalLLM("fake/model", SYSTEM_PROMPT, wait_timeout=0.05)
+    release = threading.Event()
+    fake_stack.block = release
+    first = threading.Thread(target=llm.chat, args=(chat_messages("apa itu kawung?"),))
+    first.start()
+    try:
+        while not llm._lock.locked():
+            time.sleep(0.001)
+        with pytest.raises(LocalLLMBusy):
+            llm.chat(chat_messages("apa makna truntum?"))
+    finally:
+        release.set()
+        first.join()
+
+
+def test_chatbot_falls_back_to_templates_when_local_model_is_busy(monkeypatch):
+    from models.chatbot import BatikChatbot
+
+    class BusyLLM:
+        def chat(self, messages):
+            raise LocalLLMBusy("local model busy for more than 2.0s")
+
+    chatbot = BatikChatbot()
+    monkeypatch.setattr(chatbot, 'load_local_llm', lambda: BusyLLM())
+
+    response, source = chatbot._offline_answer("apa itu kawung?", 'kawung')
+    assert source == 'fallback'
+    assert response
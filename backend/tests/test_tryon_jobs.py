@@ -0,0 +1,118 @@
+"""Try-on job endpoints: 202 handoff, polling, coalescing and 429 backpressure"""
+
+import base64
+import io
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+import app as app_module
+from utils.job_queue import JobQueue
+from utils.ttl_cache import TTLCache
+
+
+@pytest.fixture
+def tryon(monkeypatch):
+    """App client whose try-on worker runs a stub pipeline gated by `release`"""
+    release = threading.Event()
+
+    def handler(payload):
+        release.wait(5)
+        return {"image": Image.new('RGB', (16, 16), 'red'), "method_used": "test"}
+
+    queue = JobQueue(handler, workers=1, max_queue=1, name="test-tryon")
+    monkeypatch.setattr(app_module, 'IDM_VTON_AVAILABLE', True)
+    monkeypatch.setattr(app_module, 'fitting_queue', queue)
+    monkeypatch.setattr(app_module, 'fitting_results', TTLCache(max_entries=8, ttl=60))
+    monkeypatch.setattr(app_module, 'TRYON_WAIT_TIMEOUT', 0.2)
+
+    client = app_module.app.test_client()
+    client.release = release
+    client.queue = queue
+    yield client
+    release.set()
+
+
+def photo(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), color).save(buffer, format='PNG')
+    return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def fitting_request(color='blue'):
+    return {"user_image": photo(color), "pattern_id": "kawung_nitik"}
+
+
+def wait_for_status(client, status_url, status, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        body = client.get(status_url).get_json()
+        if body['status'] == status:
+            return body
+        time.sleep(0.02)
+    raise AssertionError(f"job never reached {status}")
+
+
+def test_fast_try_on_answers_synchronously(tryon):
+    tryon.release.set()
+    response = tryon.post('/virtual_fitting', json=fitting_request())
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['method_used'] == 'test'
+    assert body['result_image'].startswith('data:image/')
+
+
+def test_slow_try_on_is_handed_back_as_a_job(tryon):
+    response = tryon.post('/virtual_fitting', json=fitting_request())
+
+    assert response.status_code == 202
+    job = response.get_json()
+    assert job['status'] == 'running'
+    assert job['status_url'] == f"/virtual_fitting/jobs/{job['job_id']}"
+    assert job['events_url'] == f"/virtual_fitting/jobs/{job['job_id']}/events"
+
+    tryon.release.set()
+    body = wait_for_status(tryon, job['status_url'], 'done')
+    assert body['method_used'] == 'test'
+    assert body['result_image'].startswith('data:image/')
+
+
+def test_identical_requests_share_one_job(tryon):
+    first = tryon.post('/virtual_fitting/jobs', json=fitting_request()).get_json()
+    second = tryon.post('/virtual_fitting/jobs', json=fitting_request()).get_json()
+
+    assert first['job_id'] == second['job_id']
+    assert tryon.queue.stats()['coalesced'] == 1
+
+
+def test_full_queue_answers_429_with_retry_after(tryon):
+    running = tryon.post('/virtual_fitting/jobs', json=fitting_request('red'))
+    assert running.status_code == 202
+    wait_for_status(tryon, running.get_json()['status_url'], 'running')
+
+    queued = tryon.post('/virtual_fitting/jobs', json=fitting_request('green'))
+    assert queued.status_code == 202
+    assert queued.get_json()['status'] == 'queued'
+
+    rejected = tryon.post('/virtual_fitting/jobs', json=fitting_request('blue'))
+    assert rejected.status_code == 429
+    assert int(rejected.headers['Retry-After']) >= 1
+    assert rejected.get_json()['retry_after'] >= 1
+
+    sync = tryon.post('/virtual_fitting', json=fitting_request('yellow'))
+    assert sync.status_code == 429
+
+
+def test_unknown_job_is_404(tryon):
+    assert tryon.get('/virtual_fitting/jobs/does-not-exist').status_code == 404
+
+
+def test_job_evicted_while_waiting_is_410(tryon, monkeypatch):
+    monkeypatch.setattr(tryon.queue, 'wait', lambda job_id, **options: None)
+    response = tryon.post('/virtual_fitting', json=fitting_request())
+
+    assert response.status_code == 410
+    assert response.get_json()['job_id']
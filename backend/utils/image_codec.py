@@ -0,0 +1,282 @@
+"""
+Single entry point for decoding uploaded images and encoding results.
+
+Decodes straight from the request bytes (base64 is unpacked with binascii
+into one buffer, raw bodies are read through a memoryview), lets libjpeg
+scale JPEGs down by 1/2, 1/4 or 1/8 while decoding when the caller only
+needs a smaller working size, applies the EXIF orientation and hands back
+the layout the next stage consumes: a PIL image, an RGB array or a BGR
+array for OpenCV.
+
+Results are encoded with cv2.imencode as baseline JPEG, progressive JPEG
+or WebP at a quality and maximum dimension taken from a named client
+profile, optionally overridden per request.
+"""
+
+import io
+import os
+import binascii
+from collections import namedtuple
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+LAYOUTS = ('pil', 'rgb', 'bgr')
+
+# EXIF orientation tag and the values that rotate the image by 90 degrees
+EXIF_ORIENTATION = 0x0112
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+# Output format -> (mime type, file extension for cv2.imencode)
+OUTPUT_FORMATS = {
+    'jpeg': ('image/jpeg', '.jpg'),
+    'pjpeg': ('image/jpeg', '.jpg'),    # progressive JPEG
+    'webp': ('image/webp', '.webp'),
+}
+
+EncodeProfile = namedtuple('EncodeProfile', ['format', 'quality', 'max_dim'])
+
+# Named client profiles; max_dim None keeps the result's size
+ENCODE_PROFILES = {
+    'default': EncodeProfile('jpeg', 85, None),
+    'desktop': EncodeProfile('pjpeg', 88, 2048),
+    'mobile': EncodeProfile('webp', 75, 1024),
+    'thumbnail': EncodeProfile('webp', 70, 384),
+}
+DEFAULT_PROFILE = os.getenv("IMAGE_ENCODE_PROFILE", "default")
+
+# Encodings worth keeping with a result: the named profiles and their JPEG
+# fallbacks. Ad-hoc quality/max_dim overrides are encoded per request, so
+# clients cannot grow a cached result without bound.
+CACHEABLE_PROFILES = frozenset(
+    list(ENCODE_PROFILES.values()) +
+    [profile._replace(format='jpeg') for profile in ENCODE_PROFILES.values()]
+)
+
+
+class _MemoryReader(io.RawIOBase):
+    """Seekable read-only file over a memoryview, without copying the buffer"""
+
+    def __init__(self, data):
+        self._view = memoryview(data).cast('B')
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, offset)
+        return self._pos
+
+    def readinto(self, buffer):
+        chunk = self._view[self._pos:self._pos + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+
+def _as_file(source):
+    """File object for bytes-like data or a binary stream"""
+    if isinstance(source, bytes):
+        # BytesIO shares an immutable bytes buffer instead of copying it
+        return io.BytesIO(source)
+    if isinstance(source, (bytearray, memoryview)):
+        return io.BufferedReader(_MemoryReader(source))
+    if hasattr(source, 'read'):
+        if getattr(source, 'seekable', lambda: False)():
+            return source
+        return io.BytesIO(source.read())
+    raise TypeError(f"Cannot decode image from {type(source).__name__}")
+
+
+def decode_image(source, target_size=None, layout='pil'):
+    """
+    Decode an image from bytes-like data or a binary stream
+
+    Args:
+        source: bytes, bytearray, memoryview or readable binary stream
+        target_size (tuple): (width, height) the next stage works at, or
+            None for full resolution. JPEGs are decoded at the smallest
+            scale that still covers it; other formats decode at full size.
+        layout (str): 'pil' (RGB PIL image), 'rgb' or 'bgr' (uint8 arrays)
+
+    Returns:
+        PIL.Image or numpy.ndarray: Upright decoded image
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout {layout!r}, expected one of {LAYOUTS}")
+
+    try:
+        image = Image.open(_as_file(source))
+
+        if image.size[0] == 0 or image.size[1] == 0:
+            raise ValueError("Invalid image dimensions")
+
+        if target_size is not None and image.format == 'JPEG':
+            width, height = target_size
+            # The target is upright; the stored pixels may still be rotated
+            if image.getexif().get(EXIF_ORIENTATION) in TRANSPOSED_ORIENTATIONS:
+                width, height = height, width
+            image.draft('RGB', (width, height))
+
+        image.load()
+        image = ImageOps.exif_transpose(image)
+
+        # Convert to RGB if necessary
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+
+    except Exception as e:
+        raise ValueError(f"Error decoding image: {e}")
+
+    if layout == 'pil':
+        return image
+    array = np.asarray(image)
+    if layout == 'bgr':
+        return cv2.cvtColor(array, cv2.COLOR_RGB2BGR)
+    return array
+
+
+def decode_base64_image(data, target_size=None, layout='pil'):
+    """
+    Decode a base64 string or data URL
+
+    Args:
+        data (str or bytes): Base64 payload, optionally with a data URL prefix
+        target_size (tuple): See decode_image
+        layout (str): See decode_image
+
+    Returns:
+        PIL.Image or numpy.ndarray: Decoded image
+    """
+    try:
+        # Remove data URL prefix if present
+        if isinstance(data, str):
+            if data.startswith('data:'):
+                data = data[data.index(',') + 1:]
+        else:
+            data = memoryview(data).cast('B')
+            if data[:5] == b'data:':
+                data = data[bytes(data[:256]).index(b',') + 1:]
+
+        image_data = binascii.a2b_base64(data)
+    except (ValueError, binascii.Error) as e:
+        raise ValueError(f"Error decoding base64 image: {e}")
+
+    if len(image_data) == 0:
+        raise ValueError("Error decoding base64 image: Empty image data")
+    return decode_image(image_data, target_size, layout)
+
+
+def open_image_file(path, target_size=None, layout='pil'):
+    """Decode an image file from disk; see decode_image"""
+    with open(path, 'rb') as f:
+        return decode_image(f, target_size, layout)
+
+
+def resolve_profile(name=None, format=None, quality=None, max_dim=None):
+    """
+    Encoding for a request: a named profile with optional overrides
+
+    Args:
+        name (str): Key of ENCODE_PROFILES, None for DEFAULT_PROFILE
+        format (str): Override, one of OUTPUT_FORMATS
+        quality (int or str): Override, 1-100
+        max_dim (int or str): Override for the longest side, 0 for no limit
+
+    Returns:
+        EncodeProfile: Validated profile
+    """
+    name = name or DEFAULT_PROFILE
+    if name not in ENCODE_PROFILES:
+        raise ValueError(f"Unknown image profile {name!r}, expected one of {sorted(ENCODE_PROFILES)}")
+    profile = ENCODE_PROFILES[name]
+
+    if format is not None:
+        format = str(format).lower()
+        if format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown image format {format!r}, expected one of {sorted(OUTPUT_FORMATS)}")
+        profile = profile._replace(format=format)
+    try:
+        if quality is not None:
+            profile = profile._replace(quality=min(100, max(1, int(quality))))
+        if max_dim is not None:
+            max_dim = int(max_dim)
+    except (TypeError, ValueError):
+        raise ValueError("image_quality and image_max_dim must be integers")
+    if max_dim is not None:
+        if max_dim < 0:
+            raise ValueError("image_max_dim must be 0 (no limit) or positive")
+        profile = profile._replace(max_dim=max_dim or None)
+    return profile
+
+
+def encode_image(image, profile=None):
+    """
+    Encode a result image
+
+    Args:
+        image (PIL.Image or numpy.ndarray): RGB image
+        profile (EncodeProfile): Output encoding, None for the default profile
+
+    Returns:
+        tuple: (encoded bytes, mime type)
+    """
+    profile = profile or resolve_profile()
+    try:
+        if isinstance(image, Image.Image):
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            image = np.asarray(image)
+        bgr = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+
+        height, width = bgr.shape[:2]
+        if profile.max_dim and max(height, width) > profile.max_dim:
+            scale = profile.max_dim / max(height, width)
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            bgr = cv2.resize(bgr, size, interpolation=cv2.INTER_AREA)
+
+        mime, extension = OUTPUT_FORMATS[profile.format]
+        if profile.format == 'webp':
+            params = [cv2.IMWRITE_WEBP_QUALITY, profile.quality]
+        else:
+            params = [cv2.IMWRITE_JPEG_QUALITY, profile.quality,
+                      cv2.IMWRITE_JPEG_PROGRESSIVE, int(profile.format == 'pjpeg')]
+        ok, buffer = cv2.imencode(extension, bgr, params)
+        if not ok:
+            raise ValueError(f"cv2.imencode failed for {profile.format}")
+        return buffer.tobytes(), mime
+
+    except Exception as e:
+        raise ValueError(f"Error encoding image: {e}")
+
+
+def encode_image_cached(cache, image, profile=None):
+    """
+    encode_image, memoized in `cache` (a dict kept alongside the image, so
+    repeated responses for the same result reuse the encoded bytes).
+    Only CACHEABLE_PROFILES are stored.
+    """
+    profile = profile or resolve_profile()
+    encoded = cache.get(profile)
+    if encoded is None:
+        encoded = encode_image(image, profile)
+        if profile in CACHEABLE_PROFILES:
+            cache[profile] = encoded
+    return encoded
+
+
+def to_data_url(data, mime):
+    """Base64 data URL for encoded bytes"""
+    return f"data:{mime};base64,{binascii.b2a_base64(data, newline=False).decode('ascii')}"
@@ -1,65 +1,59 @@
-import base64
-import io
 from PIL import Image
 import numpy as np
 
-def decode_base64_image(base64_string):
+from utils import image_codec
+
+def decode_base64_image(base64_string, target_size=None):
     """
     Decode base64 string to PIL Image
     
     Args:
         base64_string (str): Base64 encoded image string
+        target_size (tuple): Working size (width, height) to decode JPEGs near
         
     Returns:
         PIL.Image: Decoded image
     """
-    try:
-        # Remove data URL prefix if present
-        if ',' in base64_string:
-            base64_string = base64_string.split(',')[1]
-        
-        # Decode base64
-        image_data = base64.b64decode(base64_string)
-        
-        # Create PIL Image
-        image = Image.open(io.BytesIO(image_data))
+    return image_codec.decode_base64_image(base64_string, target_size)
+
+def open_image_stream(stream, target_size=None):
+    """
+    Decode an image straight from a file-like object (upload or request body)
+    
+    Args:
+        stream: Readable binary stream
+        target_size (tuple): Working size (width, height) to decode JPEGs near
         
-        # Convert to RGB if necessary
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-            
-        return image
+    Returns:
+        PIL.Image: Decoded RGB image
+    """
+    return image_codec.decode_image(stream, target_size)
+
+def encode_image_bytes(image, quality=85):
+    """
+    Encode PIL Image to JPEG bytes
+    
+    Args:
+        image (PIL.Image): Image to encode
+        quality (int): JPEG quality
         
-    except Exception as e:
-        raise ValueError(f"Error decoding base64 image: {e}")
+    Returns:
+        bytes: JPEG encoded image
+    """
+    return image_codec.encode_image(image, image_codec.resolve_profile('default', 'jpeg', quality))[0]
 
-def encode_image_base64(image):
+def encode_image_base64(image, profile=None):
     """
     Encode PIL Image to base64 string
     
     Args:
         image (PIL.Image): Image to encode
+        profile (EncodeProfile): Output encoding, None for the default profile
         
     Returns:
         str: Base64 encoded image string with data URL prefix
     """
-    try:
-        # Convert to RGB if necessary
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        # Save to bytes buffer
-        buffer = io.BytesIO()
-        image.save(buffer, format='JPEG', quality=85)
-        
-        # Encode to base64
-        img_str = base64.b64encode(buffer.getvalue()).decode('utf-8')
-        
-        # Return with data URL prefix
-        return f"data:image/jpeg;base64,{img_str}"
-        
-    except Exception as e:
-        raise ValueError(f"Error encoding image to base64: {e}")
+    return image_codec.to_data_url(*image_codec.encode_image(image, profile))
 
 def resize_image(image, target_size=(640, 480)):
     """
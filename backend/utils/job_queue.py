@@ -0,0 +1,220 @@
+import math
+import time
+import uuid
+import queue
+import threading
+from collections import deque
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue has no free slot"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Job queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class JobQueue:
+    """
+    Bounded job queue consumed by a fixed pool of worker threads.
+
+    The handler is called with the job payload and its return value becomes
+    the job result. Exceptions mark the job as failed; an exception carrying
+    `body` and `status_code` attributes keeps them for the client.
+    Jobs submitted with the same key while one is in flight share it.
+    """
+
+    FINISHED = ('done', 'failed')
+
+    def __init__(self, handler, workers=1, max_queue=8, result_ttl=600, name='jobs'):
+        self.handler = handler
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self.name = name
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = {}
+        self._inflight = {}     # key -> job id
+        self._changed = threading.Condition()
+        self._running = 0
+        self._wait_times = deque(maxlen=200)
+        self._run_times = deque(maxlen=200)
+        self.counters = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0, 'coalesced': 0}
+
+        for i in range(workers):
+            threading.Thread(target=self._worker, name=f"{name}-worker-{i}", daemon=True).start()
+
+    def submit(self, payload, key=None):
+        """
+        Queue a job and return its id, or raise QueueFullError.
+        If a job with the same key is still queued or running, its id is
+        returned instead and no new work is scheduled.
+        """
+        self._purge_expired()
+        job_id = uuid.uuid4().hex
+        job = _new_job(job_id, key)
+
+        with self._changed:
+            if key is not None and key in self._inflight:
+                self.counters['coalesced'] += 1
+                return self._inflight[key]
+            self._jobs[job_id] = job
+            if key is not None:
+                self._inflight[key] = job_id
+            try:
+                self._queue.put_nowait((job_id, payload))
+            except queue.Full:
+                self._jobs.pop(job_id, None)
+                self._inflight.pop(key, None)
+                self.counters['rejected'] += 1
+                raise QueueFullError(self._retry_after_locked())
+            self.counters['submitted'] += 1
+
+        return job_id
+
+    def complete(self, result):
+        """Register an already finished job (e.g. a cache hit) and return its id"""
+        self._purge_expired()
+        job_id = uuid.uuid4().hex
+        job = _new_job(job_id)
+        job.update({
+            'status': 'done',
+            'started_at': job['submitted_at'],
+            'finished_at': job['submitted_at'],
+            'result': result,
+            'status_code': 200,
+        })
+        with self._changed:
+            self._jobs[job_id] = job
+        return job_id
+
+    def get(self, job_id):
+        """Snapshot of a job, or None if unknown or expired"""
+        with self._changed:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def wait(self, job_id, last_status=None, timeout=None):
+        """
+        Block until the job leaves last_status (or finishes when last_status
+        is None) or the timeout expires. Returns the latest snapshot.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._changed:
+            while True:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    return None
+                if job['status'] in self.FINISHED or (
+                        last_status is not None and job['status'] != last_status):
+                    return dict(job)
+
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return dict(job)
+                self._changed.wait(remaining)
+
+    def position(self, job_id):
+        """Approximate number of jobs ahead of a queued job"""
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is None or job['status'] != 'queued':
+                return 0
+            return sum(
+                1 for other in self._jobs.values()
+                if other['status'] == 'queued' and other['submitted_at'] < job['submitted_at']
+            )
+
+    def retry_after(self):
+        """Seconds until a slot is likely to free up"""
+        with self._changed:
+            return self._retry_after_locked()
+
+    def _retry_after_locked(self):
+        run_time = _mean(self._run_times) or 30.0
+        backlog = self._queue.qsize() + self._running
+        return max(1, math.ceil(run_time * backlog / max(1, self.workers)))
+
+    def _worker(self):
+        while True:
+            job_id, payload = self._queue.get()
+            with self._changed:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    continue
+                job['status'] = 'running'
+                job['started_at'] = time.time()
+                self._wait_times.append(job['started_at'] - job['submitted_at'])
+                self._running += 1
+                self._changed.notify_all()
+
+            try:
+                result = self.handler(payload)
+                update = {'status': 'done', 'result': result, 'status_code': 200}
+            except Exception as e:
+                update = {
+                    'status': 'failed',
+                    'error': getattr(e, 'body', None) or {'error': str(e)},
+                    'status_code': getattr(e, 'status_code', 500),
+                }
+
+            with self._changed:
+                job.update(update)
+                job['finished_at'] = time.time()
+                self._run_times.append(job['finished_at'] - job['started_at'])
+                self._running -= 1
+                if job['key'] is not None:
+                    self._inflight.pop(job['key'], None)
+                self.counters['completed' if update['status'] == 'done' else 'failed'] += 1
+                self._changed.notify_all()
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.result_ttl
+        with self._changed:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job['finished_at'] is not None and job['finished_at'] < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def stats(self):
+        """Queue depth, wait time and run time for monitoring"""
+        with self._changed:
+            return {
+                'depth': self._queue.qsize(),
+                'max_depth': self._queue.maxsize,
+                'running': self._running,
+                'workers': self.workers,
+                'wait_time_avg': round(_mean(self._wait_times), 3),
+                'wait_time_p95': round(_percentile(self._wait_times, 95), 3),
+                'run_time_avg': round(_mean(self._run_times), 3),
+                'run_time_p95': round(_percentile(self._run_times, 95), 3),
+                **self.counters,
+            }
+
+
+def _new_job(job_id, key=None):
+    return {
+        'id': job_id,
+        'key': key,
+        'status': 'queued',
+        'submitted_at': time.time(),
+        'started_at': None,
+        'finished_at': None,
+        'result': None,
+        'error': None,
+        'status_code': None,
+    }
+
+
+def _mean(values):
+    return sum(values) / len(values) if values else 0.0
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
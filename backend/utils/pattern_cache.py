@@ -0,0 +1,143 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+PATTERN_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+class PatternCache:
+    """
+    Byte-budgeted LRU cache of decoded batik patterns.
+
+    Entries are RGB uint8 arrays keyed by (pattern_id, file mtime) and are
+    marked read-only so a single decoded copy can be shared between requests.
+    """
+
+    def __init__(self, catalog=None, pattern_dir='data/batik_patterns',
+                 max_bytes=256 * 1024 * 1024, revalidate_interval=5.0):
+        self.catalog = catalog
+        self.pattern_dir = pattern_dir
+        self.max_bytes = max_bytes
+        self.revalidate_interval = revalidate_interval
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # (pattern_id, mtime) -> ndarray
+        self._sources = {}              # pattern_id -> (path, mtime, checked_at)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, pattern_id):
+        """Return the decoded RGB pattern for pattern_id, or None if no image exists"""
+        return self.get_versioned(pattern_id)[0]
+
+    def get_versioned(self, pattern_id):
+        """
+        Return (pattern, version) where version is the image file's mtime,
+        or (None, None) if no readable image exists
+        """
+        source = self._resolve(pattern_id)
+        if source is None:
+            return None, None
+
+        path, mtime = source
+        key = (pattern_id, mtime)
+        with self._lock:
+            pattern = self._entries.get(key)
+            if pattern is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return pattern, mtime
+            self.misses += 1
+
+        pattern = self._decode(path)
+        if pattern is None:
+            return None, None
+
+        with self._lock:
+            self._store(key, pattern)
+        return pattern, mtime
+
+    def _resolve(self, pattern_id):
+        """Find the image file for a pattern, re-statting it at most once per interval"""
+        now = time.monotonic()
+        cached = self._sources.get(pattern_id)
+        if cached is not None and now - cached[2] < self.revalidate_interval:
+            return cached[:2]
+
+        path = self._find_path(pattern_id)
+        if path is None:
+            self._sources.pop(pattern_id, None)
+            return None
+
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+        self._sources[pattern_id] = (path, mtime, now)
+        return path, mtime
+
+    def _find_path(self, pattern_id):
+        """Flat pattern files take precedence over the organized catalog"""
+        for ext in PATTERN_EXTENSIONS:
+            path = os.path.join(self.pattern_dir, f"{pattern_id}{ext}")
+            if os.path.exists(path):
+                return path
+
+        if self.catalog is not None:
+            return self.catalog.image_path(pattern_id)
+        return None
+
+    def _decode(self, path):
+        try:
+            with Image.open(path) as image:
+                pattern = np.asarray(image.convert('RGB'))
+        except Exception as e:
+            print(f"⚠ Failed to decode pattern {path}: {e}")
+            return None
+
+        pattern.flags.writeable = False
+        return pattern
+
+    def _store(self, key, pattern):
+        # Drop stale versions of the same pattern before adding the new one
+        for stale in [k for k in self._entries if k[0] == key[0] and k != key]:
+            self._bytes -= self._entries.pop(stale).nbytes
+
+        if key in self._entries or pattern.nbytes > self.max_bytes:
+            return
+
+        self._entries[key] = pattern
+        self._bytes += pattern.nbytes
+
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def warm(self, pattern_ids, workers=8):
+        """Decode the given patterns in parallel; returns how many are cached"""
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(self.get, pattern_ids))
+        return sum(1 for pattern in results if pattern is not None)
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+# Fields a client may request through ?fields=
+CATALOG_FIELDS = ('id', 'name', 'filename', 'description', 'meaning', 'visual')
+DEFAULT_FIELDS = ('id', 'name', 'filename')
+
+
+class PatternCatalog:
+    """
+    In-memory index of the organized batik pattern folders joined with
+    batik_metadata.json. Built once, then refreshed incrementally.
+    """
+
+    def __init__(self, pattern_dir='data/batik_patterns/organized',
+                 metadata_path='data/batik_metadata.json', refresh_interval=5.0):
+        self.pattern_dir = pattern_dir
+        self.metadata_path = metadata_path
+        self.refresh_interval = refresh_interval
+
+        self._lock = threading.Lock()
+        self._entries = {}          # pattern_id -> entry dict
+        self._folder_mtimes = {}    # pattern_id -> folder mtime
+        self._dir_mtime = None
+        self._metadata_mtime = None
+        self._metadata = {}
+        self._ordered = []
+        self._version = ''
+        self._last_check = 0.0
+
+        self.refresh(force=True)
+
+    @property
+    def version(self):
+        """Opaque version string, changes whenever the catalog content changes"""
+        self._maybe_refresh()
+        return self._version
+
+    def _maybe_refresh(self):
+        """Refresh at most once per refresh_interval so hot reads never touch disk"""
+        if time.monotonic() - self._last_check >= self.refresh_interval:
+            self.refresh()
+
+    def refresh(self, force=False):
+        """Rescan only what changed since the last refresh"""
+        with self._lock:
+            self._last_check = time.monotonic()
+            changed = False
+
+            metadata_mtime = _safe_mtime(self.metadata_path)
+            if force or metadata_mtime != self._metadata_mtime:
+                self._metadata = self._load_metadata()
+                self._metadata_mtime = metadata_mtime
+                # Metadata joins into every entry
+                self._entries = {
+                    pattern_id: self._build_entry(pattern_id, entry['filename'])
+                    for pattern_id, entry in self._entries.items()
+                }
+                changed = True
+
+            dir_mtime = _safe_mtime(self.pattern_dir)
+            if force or dir_mtime != self._dir_mtime:
+                changed |= self._rescan_folders()
+                self._dir_mtime = dir_mtime
+            else:
+                # Folder set unchanged; pick up images replaced inside known folders
+                for pattern_id in list(self._folder_mtimes):
+                    changed |= self._rescan_folder(pattern_id)
+
+            if changed or force:
+                self._ordered = [self._entries[k] for k in sorted(self._entries)]
+                digest = hashlib.sha1()
+                for entry in self._ordered:
+                    digest.update(json.dumps(entry, sort_keys=True).encode('utf-8'))
+                self._version = digest.hexdigest()[:16]
+
+            return changed
+
+    def _rescan_folders(self):
+        """Sync the folder list, rescanning new or modified folders only"""
+        try:
+            folders = {
+                name for name in os.listdir(self.pattern_dir)
+                if os.path.isdir(os.path.join(self.pattern_dir, name))
+            }
+        except OSError:
+            folders = set()
+
+        changed = False
+        for pattern_id in set(self._folder_mtimes) - folders:
+            self._folder_mtimes.pop(pattern_id, None)
+            if self._entries.pop(pattern_id, None) is not None:
+                changed = True
+
+        for pattern_id in folders:
+            changed |= self._rescan_folder(pattern_id)
+
+        return changed
+
+    def _rescan_folder(self, pattern_id):
+        """Re-read one pattern folder if its mtime moved"""
+        folder_path = os.path.join(self.pattern_dir, pattern_id)
+        folder_mtime = _safe_mtime(folder_path)
+        if folder_mtime is not None and folder_mtime == self._folder_mtimes.get(pattern_id):
+            return False
+
+        self._folder_mtimes[pattern_id] = folder_mtime
+        filename = f"{pattern_id}.jpg"
+        had_entry = pattern_id in self._entries
+
+        if folder_mtime is not None and os.path.exists(os.path.join(folder_path, filename)):
+            self._entries[pattern_id] = self._build_entry(pattern_id, filename)
+            return True
+
+        self._entries.pop(pattern_id, None)
+        return had_entry
+
+    def _build_entry(self, pattern_id, filename):
+        """Join a folder with its metadata record"""
+        info = self._metadata.get(pattern_id, {})
+        return {
+            'id': pattern_id,
+            'name': info.get('name') or pattern_id.replace('_', ' ').title(),
+            'filename': filename,
+            'description': info.get('description'),
+            'meaning': info.get('meaning'),
+            'visual': info.get('visual'),
+        }
+
+    def _load_metadata(self):
+        """Load batik metadata, tolerating a missing or broken file"""
+        try:
+            with open(self.metadata_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"⚠ Pattern catalog could not load metadata from {self.metadata_path}: {e}")
+            return {}
+
+    def get(self, pattern_id):
+        """Return the catalog entry for a pattern id, or None"""
+        self._maybe_refresh()
+        return self._entries.get(pattern_id)
+
+    def image_path(self, pattern_id):
+        """Filesystem path of the main image for a pattern, or None"""
+        entry = self.get(pattern_id)
+        if entry is None:
+            return None
+        return os.path.join(self.pattern_dir, pattern_id, entry['filename'])
+
+    def ids(self):
+        """All pattern ids in catalog order"""
+        self._maybe_refresh()
+        return [entry['id'] for entry in self._ordered]
+
+    def query(self, page=None, per_page=None, fields=None):
+        """
+        Return (patterns, total) for one page of the catalog projected onto fields.
+        Without a page, every pattern is returned.
+        """
+        self._maybe_refresh()
+        ordered = self._ordered
+        fields = fields or DEFAULT_FIELDS
+        total = len(ordered)
+
+        if page is not None:
+            per_page = per_page or 20
+            start = (page - 1) * per_page
+            ordered = ordered[start:start + per_page]
+
+        patterns = [{field: entry[field] for field in fields} for entry in ordered]
+        return patterns, total
+
+
+def parse_fields(raw_fields):
+    """Parse a comma separated ?fields= value, raising ValueError on unknown fields"""
+    if not raw_fields:
+        return None
+
+    fields = tuple(f.strip() for f in raw_fields.split(',') if f.strip())
+    unknown = [f for f in fields if f not in CATALOG_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def _safe_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
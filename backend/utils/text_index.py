@@ -0,0 +1,98 @@
+import re
+
+import numpy as np
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text, stop_words=frozenset()):
+    """
+    Split text into lowercase word tokens
+
+    Args:
+        text: Input string
+        stop_words: Tokens to drop
+
+    Returns:
+        List of tokens
+    """
+    return [token for token in _TOKEN.findall(text.lower()) if token not in stop_words]
+
+
+def estimate_tokens(text):
+    """Rough LLM token count (about 4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed list of documents.
+
+    Postings are stored per term as numpy arrays of document indices and
+    precomputed term weights, so scoring a query is a handful of vectorized
+    additions into one score array.
+    """
+
+    def __init__(self, documents, k1=1.5, b=0.75, stop_words=frozenset()):
+        self.size = len(documents)
+        self.stop_words = stop_words
+        tokenized = [tokenize(doc, stop_words) for doc in documents]
+        lengths = np.array([len(tokens) for tokens in tokenized], dtype=np.float32)
+        avg_length = float(lengths.mean()) if self.size and lengths.sum() else 1.0
+
+        postings = {}
+        for doc_index, tokens in enumerate(tokenized):
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                postings.setdefault(token, ([], []))
+                postings[token][0].append(doc_index)
+                postings[token][1].append(count)
+
+        norm = k1 * (1 - b + b * lengths / avg_length)
+        self._postings = {}
+        self._idf = {}
+        for token, (doc_ids, counts) in postings.items():
+            doc_ids = np.array(doc_ids, dtype=np.int32)
+            tf = np.array(counts, dtype=np.float32)
+            idf = self._idf[token] = float(np.log(1 + (self.size - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5)))
+            weights = idf * tf * (k1 + 1) / (tf + norm[doc_ids])
+            self._postings[token] = (doc_ids, weights.astype(np.float32))
+
+    def __contains__(self, token):
+        return token in self._idf
+
+    def idf(self, token):
+        """Inverse document frequency; unseen tokens get the rarest possible weight"""
+        idf = self._idf.get(token)
+        return idf if idf is not None else float(np.log(1 + (self.size + 0.5) / 0.5))
+
+    def scores(self, query):
+        """BM25 score of every document for the query"""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for token in set(tokenize(query, self.stop_words)):
+            posting = self._postings.get(token)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+        return scores
+
+    def search(self, query, top_k=5, min_score=0.0):
+        """
+        Best matching documents for the query
+
+        Args:
+            query: Query text
+            top_k: Maximum number of results
+            min_score: Results scoring at or below this are dropped
+
+        Returns:
+            List of (document index, score), best first
+        """
+        scores = self.scores(query)
+        if not self.size:
+            return []
+        top_k = min(top_k, self.size)
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        ranked = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [(int(i), float(scores[i])) for i in ranked if scores[i] > max(min_score, 0.0)]
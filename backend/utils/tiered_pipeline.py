@@ -0,0 +1,129 @@
+"""
+Resolution tiers for the batik overlay paths.
+
+Segmentation, pose, colour analysis, blurs and morphology run on a copy of
+the photo scaled to a fixed long side (ANALYSIS_LONG_SIDE), so their cost
+does not grow with the camera resolution. Only the final soft mask is
+brought back to full size, with a guided filter that snaps its edges to the
+full-resolution photo, and the pattern is composited at output resolution.
+
+Pixel constants in the analysis stages (landmark offsets, kernel sizes)
+were tuned on REFERENCE_LONG_SIDE photos from the webcam; AnalysisFrame.px
+and AnalysisFrame.ksize rescale them to the analysis copy, so the mask keeps
+the same geometry relative to the person whatever the upload size, and a
+640x480 capture gets exactly its original mask.
+"""
+
+import os
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+ANALYSIS_LONG_SIDE = int(os.getenv("OVERLAY_ANALYSIS_SIZE", "512"))
+
+# Long side of the 640x480 webcam frames the pixel constants were tuned on
+REFERENCE_LONG_SIDE = 640
+
+
+class AnalysisFrame(namedtuple('AnalysisFrame', ['image', 'scale'])):
+    """Analysis copy of a photo and its scale relative to the original"""
+
+    __slots__ = ()
+
+    def px(self, value):
+        """A pixel distance tuned on a REFERENCE_LONG_SIDE photo, in this frame's pixels"""
+        return max(1, round(value * max(self.image.shape[:2]) / REFERENCE_LONG_SIDE))
+
+    def ksize(self, value):
+        """An odd kernel size tuned on a REFERENCE_LONG_SIDE photo, for this frame"""
+        return self.px(value) | 1
+
+
+def analysis_frame(image, long_side=ANALYSIS_LONG_SIDE):
+    """
+    Copy of image for the analysis stages
+
+    Args:
+        image (numpy.ndarray): Full-resolution image
+        long_side (int): Longest side of the analysis copy
+
+    Returns:
+        AnalysisFrame: Downscaled image (or the image itself when it is
+            already small enough) and its scale relative to the original
+    """
+    height, width = image.shape[:2]
+    scale = long_side / max(height, width)
+    if scale >= 1:
+        return AnalysisFrame(image, 1.0)
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return AnalysisFrame(cv2.resize(image, size, interpolation=cv2.INTER_AREA), scale)
+
+
+def _guided_coefficients(guide, src, radius, eps):
+    """Per-pixel linear coefficients (a, b) of a grey-guide guided filter, box-averaged"""
+    size = (2 * radius + 1, 2 * radius + 1)
+
+    def mean(x):
+        return cv2.boxFilter(x, cv2.CV_32F, size)
+
+    mean_i, mean_p = mean(guide), mean(src)
+    cov_ip = mean(guide * src) - mean_i * mean_p
+    var_i = mean(guide * guide) - mean_i * mean_i
+    a = cov_ip / (var_i + eps)
+    b = mean_p - a * mean_i
+    return mean(a), mean(b)
+
+
+def upsample_mask(mask, guide, radius=8, eps=1e-3, bgr=False):
+    """
+    Bring an analysis-resolution mask up to the guide's size, edge-aware.
+
+    Fast guided filter: the filter's linear coefficients are fitted at the
+    mask's resolution against a downscaled guide, then upsampled and
+    applied to the full-resolution guide, so mask edges follow the photo's
+    edges while the full-size work stays at a few resizes and one
+    multiply-add.
+
+    Args:
+        mask (numpy.ndarray): Float mask in [0, 1] from the analysis frame
+        guide (numpy.ndarray): Full-resolution image (RGB or grey)
+        radius (int): Filter radius in analysis-resolution pixels
+        eps (float): Regularisation; smaller follows the guide's edges harder
+        bgr (bool): The guide is a BGR (OpenCV) image rather than RGB
+
+    Returns:
+        numpy.ndarray: Float32 mask in [0, 1] with the guide's height and width
+    """
+    height, width = guide.shape[:2]
+    mask = mask.astype(np.float32, copy=False)
+    if mask.shape[:2] == (height, width):
+        return mask
+
+    if guide.ndim == 3:
+        gray = cv2.cvtColor(guide, cv2.COLOR_BGR2GRAY if bgr else cv2.COLOR_RGB2GRAY)
+    else:
+        gray = guide
+    small_gray = cv2.resize(gray, (mask.shape[1], mask.shape[0]), interpolation=cv2.INTER_AREA)
+    a, b = _guided_coefficients(small_gray.astype(np.float32) / 255.0, mask, radius, eps)
+
+    a = cv2.resize(a, (width, height), interpolation=cv2.INTER_LINEAR)
+    b = cv2.resize(b, (width, height), interpolation=cv2.INTER_LINEAR)
+    refined = cv2.scaleAdd(cv2.multiply(a, gray, dtype=cv2.CV_32F), 1.0 / 255.0, b)
+    return np.clip(refined, 0.0, 1.0, out=refined)
+
+
+def composite(image, overlay, alpha):
+    """
+    Blend overlay onto image at full resolution
+
+    Args:
+        image (numpy.ndarray): Base uint8 image
+        overlay (numpy.ndarray): uint8 image of the same size
+        alpha (numpy.ndarray): Float weight of the overlay per pixel, in [0, 1]
+
+    Returns:
+        numpy.ndarray: Blended uint8 image
+    """
+    alpha = alpha.astype(np.float32, copy=False)
+    return cv2.blendLinear(overlay, image, alpha, 1.0 - alpha)
@@ -6,6 +6,7 @@ import { Button } from "@/components/ui/button"
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card"
 import { Input } from "@/components/ui/input"
 import { ArrowLeft, Search, Download, Sparkles, MessageCircle } from "lucide-react"
+import { ApiService } from "@/app/utils/api"
 
 interface Pattern {
   id: string
@@ -20,6 +21,16 @@ interface ChatMessage {
   isUser: boolean
 }
 
+// crypto.randomUUID only exists in secure contexts (https or localhost), not on
+// plain-http LAN origins phones use to reach the dev server
+function newSessionId(): string {
+  if (typeof crypto.randomUUID === "function") {
+    return crypto.randomUUID()
+  }
+  const bytes = crypto.getRandomValues(new Uint8Array(16))
+  return Array.from(bytes, (byte) => byte.toString(16).padStart(2, "0")).join("")
+}
+
 export default function PatternsPage() {
   const [selectedPattern, setSelectedPattern] = useState<string | null>(null)
   const [searchTerm, setSearchTerm] = useState("")
@@ -33,6 +44,8 @@ export default function PatternsPage() {
   const [statusMessage, setStatusMessage] = useState<{ text: string; type: "success" | "error" | "loading" }>()
   const [batikPatterns, setBatikPatterns] = useState<Pattern[]>([])
   const [isLoadingPatterns, setIsLoadingPatterns] = useState(true)
+  // One chat session per page visit so follow-up questions keep their context
+  const [chatSessionId] = useState(newSessionId)
 
   const router = useRouter()
 
@@ -145,7 +158,12 @@ export default function PatternsPage() {
       })
 
       if (response.ok) {
-        const data = await response.json()
+        let data = await response.json()
+        if (response.status === 202) {
+          // Still running after the server's wait; follow the job until it finishes
+          showStatus("IDM-VTON masih memproses, menunggu hasil...", "loading")
+          data = await ApiService.waitForFittingJob(data)
+        }
         setResultImage(data.result_image)
         
         showStatus(`✅ Motif batik berhasil diterapkan dengan IDM-VTON!`, "success")
@@ -215,6 +233,7 @@ export default function PatternsPage() {
         body: JSON.stringify({
           query: userMessage,
           pattern_id: selectedPattern,
+          session_id: chatSessionId,
         }),
       })
 
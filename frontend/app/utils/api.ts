@@ -2,9 +2,13 @@ const API_BASE_URL = process.env.NODE_ENV === 'production'
   ? 'https://your-production-api.com' 
   : 'http://127.0.0.1:5000'
 
+// Output encodings the backend offers (see ENCODE_PROFILES in utils/image_codec.py)
+export type ImageProfile = 'default' | 'desktop' | 'mobile' | 'thumbnail'
+
 export interface VirtualFittingRequest {
   user_image: string
   pattern_id: string
+  image_profile?: ImageProfile
 }
 
 export interface VirtualFittingResponse {
@@ -12,9 +16,22 @@ export interface VirtualFittingResponse {
   method_used: string
 }
 
+// 202 body when a try-on outlives the synchronous wait and continues as a job
+export interface VirtualFittingJob {
+  job_id: string
+  status: string
+  status_url: string
+  events_url: string
+}
+
+const JOB_POLL_INTERVAL_MS = 2000
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms))
+
 export interface ChatbotRequest {
   query: string
   pattern_id?: string | null
+  session_id?: string
 }
 
 export interface ChatbotResponse {
@@ -23,6 +40,10 @@ export interface ChatbotResponse {
   api_used?: string
 }
 
+export interface ChatbotBatchResult extends Partial<ChatbotResponse> {
+  error?: string
+}
+
 export interface SavePhotoRequest {
   image: string
   pattern_id: string
@@ -41,9 +62,62 @@ export class ApiService {
       throw new Error(errorData.error || 'Virtual fitting failed')
     }
 
+    if (response.status === 202) {
+      return ApiService.waitForFittingJob(await response.json())
+    }
+
     return response.json()
   }
 
+  // Poll a try-on job until it finishes; resolves with its result or throws its error
+  static async waitForFittingJob(job: VirtualFittingJob): Promise<VirtualFittingResponse> {
+    while (true) {
+      const response = await fetch(`${API_BASE_URL}${job.status_url}`, {
+        headers: { 'Accept': 'application/json' }
+      })
+      const data = await response.json()
+
+      if (!response.ok) {
+        throw new Error(data.error || 'Virtual fitting job expired')
+      }
+      if (data.status === 'done') {
+        return data
+      }
+      if (data.status === 'failed') {
+        throw new Error(data.error || 'Virtual fitting failed')
+      }
+      await sleep(JOB_POLL_INTERVAL_MS)
+    }
+  }
+
+  static async virtualFittingBinary(image: Blob, patternId: string, profile?: ImageProfile): Promise<Blob> {
+    const form = new FormData()
+    form.append('user_image', image, 'photo.jpg')
+    form.append('pattern_id', patternId)
+
+    const response = await fetch(`${API_BASE_URL}/virtual_fitting`, {
+      method: 'POST',
+      headers: {
+        'Accept': 'image/webp, image/jpeg',
+        ...(profile ? { 'X-Client-Profile': profile } : {})
+      },
+      body: form
+    })
+
+    if (!response.ok) {
+      const errorData = await response.json()
+      throw new Error(errorData.error || 'Virtual fitting failed')
+    }
+
+    if (response.status === 202) {
+      const job: VirtualFittingJob = await response.json()
+      const result = await ApiService.waitForFittingJob(job)
+      return (await fetch(result.result_image)).blob()
+    }
+
+    return response.blob()
+  }
+
   static async chatbot(data: ChatbotRequest): Promise<ChatbotResponse> {
     const response = await fetch(`${API_BASE_URL}/chatbot`, {
       method: 'POST',
@@ -58,6 +132,72 @@ export class ApiService {
     return response.json()
   }
 
+  static async chatbotBatch(items: ChatbotRequest[]): Promise<ChatbotBatchResult[]> {
+    const response = await fetch(`${API_BASE_URL}/chatbot/batch`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ items })
+    })
+
+    if (!response.ok) {
+      throw new Error('Chatbot API not available')
+    }
+
+    const data = await response.json()
+    return data.results
+  }
+
+  static async chatbotStream(
+    data: ChatbotRequest,
+    onToken: (token: string) => void,
+    onReset?: () => void
+  ): Promise<string | undefined> {
+    const response = await fetch(`${API_BASE_URL}/chatbot/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+      body: JSON.stringify(data)
+    })
+
+    if (!response.ok || !response.body) {
+      throw new Error('Chatbot API not available')
+    }
+
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+    let apiUsed: string | undefined
+
+    while (true) {
+      const { done, value } = await reader.read()
+      if (done) break
+      buffer += decoder.decode(value, { stream: true })
+
+      // Server-sent events are separated by a blank line
+      let boundary = buffer.indexOf('\n\n')
+      while (boundary !== -1) {
+        const rawEvent = buffer.slice(0, boundary)
+        buffer = buffer.slice(boundary + 2)
+        boundary = buffer.indexOf('\n\n')
+
+        let eventName = 'message'
+        let payload = ''
+        for (const line of rawEvent.split('\n')) {
+          if (line.startsWith('event: ')) eventName = line.slice(7)
+          else if (line.startsWith('data: ')) payload += line.slice(6)
+        }
+        if (!payload) continue
+
+        const parsed = JSON.parse(payload)
+        if (eventName === 'message') onToken(parsed.token)
+        else if (eventName === 'reset') onReset?.()
+        else if (eventName === 'done') apiUsed = parsed.api_used
+        else if (eventName === 'error') throw new Error(parsed.error)
+      }
+    }
+
+    return apiUsed
+  }
+
   static async savePhoto(data: SavePhotoRequest): Promise<{ success: boolean; message: string }> {
     const response = await fetch(`${API_BASE_URL}/save_photo`, {
       method: 'POST',